@@ -0,0 +1,118 @@
+"""
+Speed benchmark for the Google Analytics report decoder
+
+Builds a synthetic 100,000 row batchGet page (3 dimensions, 8 metrics)
+and times googlewrapper.ga.report_columns() (used by
+GoogleAnalytics._create_df()) against the previous row by row decoder
+(two DataFrames from list comprehensions, astype per column and a merge).
+Also times a page with two date ranges, which the previous decoder
+could not read.
+
+No API access needed:
+    python benchmarks/ga_decode.py
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from googlewrapper.ga import report_columns
+
+ROWS = 100_000
+DIMENSIONS = ["ga:date", "ga:landingPagePath", "ga:deviceCategory"]
+METRICS = [
+    ("ga:sessions", "INTEGER"),
+    ("ga:users", "INTEGER"),
+    ("ga:pageviews", "INTEGER"),
+    ("ga:transactions", "INTEGER"),
+    ("ga:bounceRate", "PERCENT"),
+    ("ga:avgSessionDuration", "TIME"),
+    ("ga:transactionRevenue", "CURRENCY"),
+    ("ga:pageviewsPerSession", "FLOAT"),
+]
+
+rng = np.random.default_rng(42)
+
+
+def make_report(rows: int, date_ranges: int = 1) -> dict:
+    values = rng.integers(0, 5000, size=(rows, date_ranges, len(METRICS))).astype(str)
+    return {
+        "columnHeader": {
+            "dimensions": DIMENSIONS,
+            "metricHeader": {
+                "metricHeaderEntries": [
+                    {"name": name, "type": kind} for name, kind in METRICS
+                ]
+            },
+        },
+        "data": {
+            "rows": [
+                {
+                    "dimensions": [
+                        f"2022{(i % 12) + 1:02d}01",
+                        f"/blog/some-article-slug-{i}/",
+                        ("desktop", "mobile", "tablet")[i % 3],
+                    ],
+                    "metrics": [{"values": v} for v in values[i].tolist()],
+                }
+                for i in range(rows)
+            ],
+            "rowCount": rows,
+        },
+    }
+
+
+def previous_decoder(report_section: dict) -> pd.DataFrame:
+    """the decoder GoogleAnalytics._create_df() used before, for one report"""
+    met = []
+    cols = report_section.get("columnHeader")
+    dims = cols["dimensions"]
+    for header in cols["metricHeader"]["metricHeaderEntries"]:
+        met.append(header.get("name"))
+    row_data = report_section["data"].get("rows")
+    metric_df = pd.DataFrame([m["metrics"][0]["values"] for m in row_data], columns=met)
+    for col in cols["metricHeader"]["metricHeaderEntries"]:
+        col_name = col.get("name")
+        if col_name in metric_df.columns:
+            if col.get("type") in ["FLOAT", "PERCENT", "TIME", "CURRENCY"]:
+                metric_df[col_name] = metric_df[col_name].astype(float)
+            elif col.get("type") in ["INTEGER"]:
+                metric_df[col_name] = metric_df[col_name].astype(int)
+    dim_df = pd.DataFrame([d["dimensions"] for d in row_data], columns=dims)
+    metric_df.index.name = "idx"
+    dim_df.index.name = "idx"
+    dim_df = dim_df.merge(metric_df, on="idx")
+    dim_df.columns = [column.replace("ga:", "") for column in dim_df.columns]
+    return dim_df
+
+
+def current_decoder(report_section: dict) -> pd.DataFrame:
+    """what GoogleAnalytics._create_df() does for one report"""
+    return pd.DataFrame(report_columns(report_section), copy=False)
+
+
+def best_of(func, repeat: int = 5) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+if __name__ == "__main__":
+    report = make_report(ROWS)
+    two_ranges = make_report(ROWS, date_ranges=2)
+
+    previous = best_of(lambda: previous_decoder(report))
+    current = best_of(lambda: current_decoder(report))
+    both = best_of(lambda: current_decoder(two_ranges))
+
+    pd.testing.assert_frame_equal(
+        previous_decoder(report),
+        current_decoder(report),
+        check_dtype=False,
+        check_index_type=False,
+        check_names=False,
+    )
+    print(f"rows per page:         {ROWS:,}")
+    print(f"previous decoder:      {previous * 1000:8.1f} ms")
+    print(f"report_columns():      {current * 1000:8.1f} ms")
+    print(f"speedup:               {previous / current:8.1f}x")
+    print(f"two date ranges:       {both * 1000:8.1f} ms")
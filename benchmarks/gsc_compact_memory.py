@@ -0,0 +1,67 @@
+"""
+Memory benchmark for GoogleSearchConsole.set_compact()
+
+Builds a synthetic 1,000,000 row page/query/country/device pull
+(40 API pages of 25,000 rows, shaped like GoogleSearchConsole.clean_resp()
+output) and compares the memory used by the default and compact schemas.
+
+No API access needed:
+    python benchmarks/gsc_compact_memory.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from googlewrapper.gsc import compact_frame, concat_pages
+
+ROWS = 1_000_000
+PAGE_SIZE = 25_000
+N_PAGES = 40_000
+N_QUERIES = 250_000
+
+rng = np.random.default_rng(42)
+urls = np.array(
+    [
+        f"https://www.example.com/category-{i % 300}/some-long-product-slug-{i}/"
+        for i in range(N_PAGES)
+    ],
+    dtype=object,
+)
+queries = np.array(
+    [f"example product query number {i}" for i in range(N_QUERIES)], dtype=object
+)
+countries = np.array(["usa", "can", "gbr", "aus", "ind", "deu"], dtype=object)
+devices = np.array(["DESKTOP", "MOBILE", "TABLET"], dtype=object)
+
+
+def make_page(size: int) -> pd.DataFrame:
+    impressions = rng.integers(1, 500, size)
+    clicks = rng.binomial(impressions, 0.05)
+    return pd.DataFrame(
+        {
+            "Clicks": clicks.astype(int),
+            "Impressions": impressions.astype(int),
+            "Ctr": clicks / impressions,
+            "Position": rng.uniform(1, 60, size),
+            "Page": urls[rng.integers(0, N_PAGES, size)],
+            "Query": queries[rng.zipf(1.3, size) % N_QUERIES],
+            "Country": countries[rng.integers(0, len(countries), size)],
+            "Device": devices[rng.integers(0, len(devices), size)],
+        }
+    )
+
+
+def megabytes(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+
+if __name__ == "__main__":
+    pages = [make_page(PAGE_SIZE) for _ in range(ROWS // PAGE_SIZE)]
+    default = pd.concat(pages)
+    compact = concat_pages([compact_frame(page) for page in pages])
+
+    print(f"rows: {len(default):,}")
+    print(f"default schema: {megabytes(default):8.1f} MB")
+    print(f"compact schema: {megabytes(compact):8.1f} MB")
+    print(f"reduction:      {megabytes(default) / megabytes(compact):8.1f}x")
+    print(compact.dtypes)
@@ -0,0 +1,281 @@
+"""Apache Arrow decoding and Parquet export for Google API responses
+
+pyarrow is an optional dependency:
+    pip install googlewrapper[arrow]
+"""
+
+import json
+from typing import Any, Iterable, Optional, Union
+
+from .branded import BrandMatcher
+
+# GA metric types that decode as floats, everything else is an integer
+GA_FLOAT_TYPES = ["FLOAT", "PERCENT", "TIME", "CURRENCY"]
+
+# settings shared by every page, set once in each decode worker process
+# by init_gsc_decoder()
+_GSC_DECODER: dict[str, Any] = {}
+
+
+def import_pyarrow() -> Any:
+    """Imports pyarrow, with a helpful message if it is not installed"""
+    try:
+        import pyarrow
+    except ImportError as missing_arrow:
+        raise ImportError(
+            "Arrow output requires pyarrow. Install it with: "
+            "pip install googlewrapper[arrow]"
+        ) from missing_arrow
+    return pyarrow
+
+
+# output formats of GoogleSearchConsole and GoogleAnalytics
+OUTPUT_FORMATS = ["pandas", "arrow"]
+
+
+def check_output_format(output_format: str) -> str:
+    """
+    Checks an output format for .set_output_format(), pyarrow has to be
+    installed for "arrow"
+
+    Returns the format in lower case
+
+    :Params:
+    output_format: "pandas" or "arrow"
+        type: str
+    """
+    output_format = output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"{output_format} is not a valid output format."
+            f" Try one of the following: {OUTPUT_FORMATS}"
+        )
+    if output_format == "arrow":
+        import_pyarrow()
+    return output_format
+
+
+def gsc_record_batch(
+    rows: list[dict[str, Any]],
+    dimensions: list[str],
+    matcher: Optional[BrandMatcher] = None,
+    compact: bool = False,
+) -> Any:
+    """
+    Decodes the "rows" of a searchanalytics.query response
+    straight into a pyarrow.RecordBatch (no pandas involved)
+
+    Columns match GoogleSearchConsole.clean_resp():
+        Clicks, Impressions, Ctr, Position, <Dimensions>, Branded
+
+    :Params:
+    rows: response["rows"] from the GSC API
+        type: list of dicts
+    dimensions: the dimensions used in the request (in order)
+        type: list of strings
+    matcher: (optional) BrandMatcher to fill the "Branded" column,
+             only used when "query" is one of the dimensions
+    compact: (optional) dictionary encode dimensions, int32/float32 metrics
+        type: bool
+    """
+    pa = import_pyarrow()
+    int_type = pa.int32() if compact else pa.int64()
+    float_type = pa.float32() if compact else pa.float64()
+
+    columns = {
+        "Clicks": pa.array([r["clicks"] for r in rows], pa.float64()).cast(int_type),
+        "Impressions": pa.array([r["impressions"] for r in rows], pa.float64()).cast(
+            int_type
+        ),
+        "Ctr": pa.array([r["ctr"] for r in rows], float_type),
+        "Position": pa.array([r["position"] for r in rows], float_type),
+    }
+    for idx, dim in enumerate(dimensions):
+        values = [r["keys"][idx] for r in rows]
+        if dim == "date":
+            column = pa.array(values, pa.string()).cast(pa.date32())
+        else:
+            column = pa.array(values, pa.string())
+            if compact:
+                column = column.dictionary_encode()
+        columns[dim.capitalize()] = column
+
+    if "query" in dimensions:
+        queries = [r["keys"][dimensions.index("query")] for r in rows]
+        if matcher:
+            seen: dict[str, bool] = {}
+            branded = [
+                seen[q] if q in seen else seen.setdefault(q, matcher.contains(q))
+                for q in queries
+            ]
+        else:
+            branded = [False] * len(queries)
+        columns["Branded"] = pa.array(branded, pa.bool_())
+
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def gsc_ipc_page(
+    rows: list[dict[str, Any]],
+    dimensions: list[str],
+    matcher: Optional[BrandMatcher] = None,
+    compact: bool = False,
+) -> bytes:
+    """
+    gsc_record_batch(), serialized as an Arrow IPC stream
+
+    Meant to run in a worker process (see
+    GoogleSearchConsole.set_decode_workers), the parent only receives
+    the IPC bytes and reads them back with read_ipc_batch() without
+    unpickling any Python objects or DataFrames
+
+    Parameters match gsc_record_batch()
+    """
+    pa = import_pyarrow()
+    batch = gsc_record_batch(rows, dimensions, matcher, compact)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return bytes(sink.getvalue())
+
+
+def init_gsc_decoder(
+    dimensions: list[str], matchers: dict[str, BrandMatcher], compact: bool
+) -> None:
+    """
+    ProcessPoolExecutor initializer for the GoogleSearchConsole decode
+    workers (see .set_decode_workers), the dimensions and BrandMatchers
+    are sent once per worker instead of with every page
+
+    :Params:
+    dimensions: the dimensions used in the request (in order)
+        type: list of strings
+    matchers: site -> BrandMatcher
+        type: dict
+    compact: see gsc_record_batch()
+        type: bool
+    """
+    _GSC_DECODER.update(dimensions=dimensions, matchers=matchers, compact=compact)
+
+
+def gsc_ipc_from_json(content: bytes, site: str) -> bytes:
+    """
+    Decodes a raw searchanalytics.query response (the JSON bytes) into
+    gsc_ipc_page() bytes, run in a worker set up by init_gsc_decoder()
+    Only bytes cross the process boundary in both directions
+
+    :Params:
+    content: response body from the API
+        type: bytes
+    site: the site the page is for, picks the BrandMatcher
+        type: str
+    """
+    return gsc_ipc_page(
+        json.loads(content).get("rows", []),
+        _GSC_DECODER["dimensions"],
+        _GSC_DECODER["matchers"].get(site),
+        _GSC_DECODER["compact"],
+    )
+
+
+def read_ipc_batch(buffer: bytes) -> Any:
+    """
+    Reads one RecordBatch from Arrow IPC stream bytes
+    The batch points into buffer, nothing is copied
+
+    :Params:
+    buffer: bytes from gsc_ipc_page()
+    """
+    pa = import_pyarrow()
+    return pa.ipc.open_stream(pa.py_buffer(buffer)).read_next_batch()
+
+
+def ga_record_batch(report: dict[str, Any]) -> Any:
+    """
+    Decodes one report of a GA reports.batchGet response
+    straight into a pyarrow.RecordBatch (no pandas involved)
+
+    Dimension columns are strings, metric columns are typed from
+    the report's metricHeaderEntries. Uses the same NumPy decoder as
+    GoogleAnalytics (see googlewrapper.ga.report_columns), so the names,
+    date range suffixes and types match the pd.DataFrame output
+
+    :Params:
+    report: one item of response["reports"]
+        type: dict
+    """
+    # imported here, googlewrapper.ga imports this module
+    from .ga import report_columns
+
+    return numpy_record_batch(report_columns(report))
+
+
+def numpy_record_batch(columns: dict[str, Any]) -> Any:
+    """
+    pyarrow.RecordBatch from {name: np.ndarray}, object arrays become
+    string columns, numeric arrays are used without copying
+
+    :Params:
+    columns: column name to values
+        type: dict
+    """
+    pa = import_pyarrow()
+    return pa.RecordBatch.from_pydict(
+        {
+            name: pa.array(values, pa.string() if values.dtype == object else None)
+            for name, values in columns.items()
+        }
+    )
+
+
+def ga_table(response: dict[str, Any]) -> Any:
+    """
+    Decodes every report of a GA reports.batchGet response
+    into one pyarrow.Table
+
+    :Params:
+    response: raw batchGet response
+        type: dict
+    """
+    pa = import_pyarrow()
+    batches = [ga_record_batch(report) for report in response["reports"]]
+    if not batches:
+        return pa.table({})
+    return pa.Table.from_batches(batches)
+
+
+def write_parquet_dataset(
+    data: Union[Any, Iterable[Any]],
+    root_path: str,
+    partition_cols: Optional[list[str]] = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Writes Arrow data straight to a (hive partitioned) Parquet dataset
+
+    :Params:
+    data: a pyarrow.Table, RecordBatch or list of RecordBatches
+    root_path: folder to write the dataset into
+        type: str
+    partition_cols: (optional) columns to partition the files by
+        example: ["Date"] -> root_path/Date=2022-01-01/part-0.parquet
+        type: list of strings
+    kwargs: passed on to pyarrow.dataset.write_dataset()
+    """
+    pa = import_pyarrow()
+    import pyarrow.dataset as ds
+
+    if isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    elif not isinstance(data, pa.Table):
+        data = pa.Table.from_batches(list(data))
+
+    kwargs.setdefault("existing_data_behavior", "overwrite_or_ignore")
+    ds.write_dataset(
+        data,
+        root_path,
+        format="parquet",
+        partitioning=partition_cols,
+        partitioning_flavor="hive" if partition_cols else None,
+        **kwargs,
+    )
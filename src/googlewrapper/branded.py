@@ -0,0 +1,142 @@
+"""Multi-pattern branded query matching for Google Search Console"""
+
+from collections import deque
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+
+class BrandMatcher:
+    """
+    Aho-Corasick automaton over a list of branded terms
+
+    Built once (see GoogleSearchConsole.set_branded) and then used to
+    classify queries. Every query is scanned in a single pass no matter
+    how many branded terms there are, and terms are matched literally,
+    so regex metacharacters ('.', '+', '(' ...) are not special.
+
+    Parameters
+    terms: branded strings to look for inside of queries
+        type: iterable of strings
+    word_boundary: only match terms that are whole words in the query
+        type: bool
+        default: False (match anywhere, like a substring)
+    ignore_case: match regardless of upper/lower case
+        type: bool
+        default: False
+    """
+
+    def __init__(
+        self,
+        terms: Iterable[str],
+        word_boundary: bool = False,
+        ignore_case: bool = False,
+    ) -> None:
+        self.word_boundary = word_boundary
+        self.ignore_case = ignore_case
+        self.terms: list[str] = [t for t in dict.fromkeys(terms) if t]
+
+        # automaton tables, one entry per trie node
+        # _goto: char -> next node
+        # _fail: fallback node on a mismatch
+        # _out: lengths of the terms that end at this node
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        self.__build()
+
+    def __repr__(self) -> str:
+        return (
+            f"<BrandMatcher terms={len(self.terms)} "
+            f"word_boundary={self.word_boundary} ignore_case={self.ignore_case}>"
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def _normalize(self, text: str) -> str:
+        return text.casefold() if self.ignore_case else text
+
+    def __build(self) -> None:
+        """Builds the trie, then the failure links breadth first"""
+        out: list[set[int]] = [set()]
+        for term in self.terms:
+            node = 0
+            for char in self._normalize(term):
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    out.append(set())
+                node = nxt
+            out[node].add(len(self._normalize(term)))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                out[child] |= out[self._fail[child]]
+
+        self._out = [tuple(sorted(lengths)) for lengths in out]
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum() or char == "_"
+
+    def contains(self, query: str) -> bool:
+        """
+        returns True if any branded term is found in the query
+
+        :Params:
+        query: search query from GSC
+            type: str
+        """
+        if not isinstance(query, str) or not self.terms:
+            return False
+        text = self._normalize(query)
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for idx, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not out[node]:
+                continue
+            if not self.word_boundary:
+                return True
+            # the term ends at idx, make sure it is not inside of a word
+            if idx + 1 < len(text) and self._is_word_char(text[idx + 1]):
+                continue
+            for length in out[node]:
+                start = idx - length + 1
+                if start == 0 or not self._is_word_char(text[start - 1]):
+                    return True
+        return False
+
+    def classify(self, queries: pd.Series) -> pd.Series:
+        """
+        returns a boolean pd.Series, True where the query is branded
+
+        Queries repeat a lot in GSC data (every date/page/device),
+        so each distinct query is only scanned once
+
+        :Params:
+        queries: 'Query' column from GSC data
+            type: pd.Series
+        """
+        queries = pd.Series(queries)
+        codes, uniques = pd.factorize(queries)
+        is_branded = np.fromiter(
+            (self.contains(q) for q in uniques), dtype=bool, count=len(uniques)
+        )
+        # factorize gives missing values a code of -1, those are never branded
+        is_branded = np.append(is_branded, False)
+        return pd.Series(is_branded[codes], index=queries.index, name=queries.name)
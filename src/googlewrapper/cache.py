@@ -0,0 +1,185 @@
+"""Small caches shared by the API wrappers"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from .arrow import import_pyarrow
+
+
+def user_cache_dir() -> Path:
+    """
+    Folder googlewrapper keeps its caches in
+        $XDG_CACHE_HOME/googlewrapper (default ~/.cache/googlewrapper)
+        %LOCALAPPDATA%\\googlewrapper on Windows
+    """
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "googlewrapper"
+    root = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(root) / "googlewrapper"
+
+
+class TTLCache:
+    """
+    Key/value cache kept in memory and in a JSON file on disk
+    Entries expire ttl seconds after they were saved
+
+    The in memory copy is shared by every TTLCache using the same
+    file in this process, the file is shared between processes
+
+    Parameters
+    path: JSON file the cache is saved to
+        type: str
+    ttl: seconds an entry stays valid, 0 or less turns caching off
+        type: float
+    """
+
+    _memory: dict[str, dict[str, Any]] = {}
+
+    def __init__(self, path: str, ttl: float) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"<TTLCache {self.path} ttl={self.ttl}>"
+
+    def _entries(self) -> dict[str, Any]:
+        """entries in memory, loaded from disk the first time"""
+        key = str(self.path.resolve())
+        if key not in self._memory:
+            try:
+                self._memory[key] = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self._memory[key] = {}
+        return self._memory[key]
+
+    def _fresh(self, entry: Optional[dict[str, Any]]) -> bool:
+        return entry is not None and time.time() - entry["saved"] < self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value, or None if missing/expired
+        Checks memory first, then re-reads the file in case
+        another process saved a newer value
+        """
+        if self.ttl <= 0:
+            return None
+        entry = self._entries().get(key)
+        if not self._fresh(entry):
+            self._memory.pop(str(self.path.resolve()), None)
+            entry = self._entries().get(key)
+        if self._fresh(entry):
+            return entry["value"]  # type: ignore[index]
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        """Saves value under key, in memory and on disk"""
+        if self.ttl <= 0:
+            return
+        entries = self._entries()
+        entries[key] = {"saved": time.time(), "value": value}
+        self._write(entries)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Removes key from the cache
+        if key is None every entry is removed
+        """
+        entries = self._entries()
+        if key is None:
+            entries.clear()
+        else:
+            entries.pop(key, None)
+        self._write(entries)
+
+    def _write(self, entries: dict[str, Any]) -> None:
+        """writes to a temp file first, so readers never see half a file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(entries))
+        os.replace(temp_path, self.path)
+
+
+class ParquetCache:
+    """
+    Arrow tables saved as compressed Parquet files in a folder, one
+    file per key, least recently used files are removed once the folder
+    is over max_bytes
+    Requires pyarrow (pip install googlewrapper[arrow])
+
+    Parameters
+    path: folder the files are saved in
+        type: str
+    max_bytes: size of the folder before old files are evicted
+        type: int
+    compression: Parquet compression codec
+        type: str
+        default: "zstd"
+    """
+
+    def __init__(self, path: str, max_bytes: int, compression: str = "zstd") -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.compression = compression
+
+    def __repr__(self) -> str:
+        return f"<ParquetCache {self.path} max_bytes={self.max_bytes}>"
+
+    def _file(self, key: str) -> Path:
+        return self.path / f"{key}.parquet"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached pyarrow.Table, or None if missing"""
+        import_pyarrow()
+        import pyarrow.parquet as pq
+
+        file = self._file(key)
+        try:
+            table = pq.read_table(file)
+        except OSError:
+            return None
+        # the modified time is the last use, see ._evict()
+        os.utime(file)
+        return table
+
+    def set(self, key: str, table: Any) -> None:
+        """Saves a pyarrow.Table under key, then evicts old files"""
+        import_pyarrow()
+        import pyarrow.parquet as pq
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self._file(key)
+        temp_path = file.with_name(f".{file.name}.{os.getpid()}.tmp")
+        pq.write_table(table, temp_path, compression=self.compression)
+        os.replace(temp_path, file)
+        self._evict(keep=file)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Removes key from the cache
+        if key is None every file is removed
+        """
+        files = [self._file(key)] if key else self.path.glob("*.parquet")
+        for file in files:
+            file.unlink(missing_ok=True)
+
+    def size(self) -> int:
+        """bytes used by the cached files"""
+        return sum(file.stat().st_size for file in self.path.glob("*.parquet"))
+
+    def _evict(self, keep: Path) -> None:
+        """removes the least recently used files until under max_bytes"""
+        files = sorted(
+            ((file.stat(), file) for file in self.path.glob("*.parquet")),
+            key=lambda item: item[0].st_mtime,
+        )
+        used = sum(stat.st_size for stat, _ in files)
+        for stat, file in files:
+            if used <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            file.unlink(missing_ok=True)
+            used -= stat.st_size
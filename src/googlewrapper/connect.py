@@ -1,7 +1,9 @@
 """API Wrapper for Google Authentication"""
 
 import argparse
+import threading
 from pathlib import Path
+from typing import Any, Optional
 
 from oauth2client import client, tools, file
 import httplib2
@@ -33,13 +35,18 @@ class Connection:
     def __init__(self, file_path="client_secret.json") -> None:
         self.file_path = file_path
         self.__dir_check()
+        # assigned in ._authenticate()
+        self.credentials: Optional[Any] = None
+        self.token_path: Optional[Path] = None
 
     def __dir_check(self) -> None:
         # if there isn't a crednetials folder, create one
         if not Path("./credentials/").is_dir():
             Path("./credentials/").mkdir()
 
-    def _authenticate(self, scope: list, token_name: str, http_return: bool = True):
+    def _authenticate(
+        self, scope: list[str], token_name: str, http_return: bool = True
+    ):
         """
         Authenticates Google Product using oauth2
         Saves the credentials in the ./credentials folder
@@ -81,17 +88,30 @@ class Connection:
         # run through the native client flow.
         # The Storage object will ensure that if successful the good
         # credentials will get written back to a file.
-        storage = file.Storage(f"./credentials/{token_name}.dat")
+        self.token_path = Path(f"./credentials/{token_name}.dat").resolve()
+        storage = file.Storage(str(self.token_path))
         credentials = storage.get()
 
         if credentials is None or credentials.invalid:
             credentials = tools.run_flow(flow, storage, flags)
+        self.credentials = credentials
 
         if http_return:
             return credentials.authorize(http=httplib2.Http())
 
         return credentials
 
+    def thread_http(self) -> "ThreadLocalHttp":
+        """
+        Returns a ThreadLocalHttp for the last authenticated product
+        use it to make requests from several threads at once
+        """
+        if self.credentials is None:
+            raise AttributeError(
+                "Please authenticate (ex. .gsc(), .ga()) before calling .thread_http()"
+            )
+        return ThreadLocalHttp(self.credentials)
+
     def gsc(self):
         """Google Search Console Connection Method"""
         scope_list = ["https://www.googleapis.com/auth/webmasters.readonly"]
@@ -144,3 +164,29 @@ class Connection:
         """Google Docs Connection Method"""
         scope_list = ["https://www.googleapis.com/auth/drive.readonly"]
         return build("docs", "v1", http=self._authenticate(scope_list, "docs"))
+
+
+class ThreadLocalHttp:
+    """
+    Gives every thread its own authorized httplib2.Http
+
+    httplib2 (used by the googleapiclient resource objects) is not
+    thread safe, so requests made from several threads should pass
+    .get() as the http of the request:
+        request.execute(http=thread_http.get())
+
+    Parameters
+    credentials: oauth2client credentials, see Connection.credentials
+    """
+
+    def __init__(self, credentials) -> None:
+        self.credentials = credentials
+        self._local = threading.local()
+
+    def get(self) -> httplib2.Http:
+        """authorized httplib2.Http for the current thread"""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self.credentials.authorize(http=httplib2.Http())
+            self._local.http = http
+        return http
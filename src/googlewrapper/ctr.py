@@ -0,0 +1,219 @@
+"""Streaming click curve (CTR by position) calculations for Search Console data"""
+
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+# columns of GSC data we keep separate curves for
+SEGMENTS = ("Device", "Country", "Branded")
+
+
+class CTRAccumulator:
+    """
+    Accumulates clicks and impressions by rounded position
+
+    Every call to .add() folds one GSC DataFrame (a page of an API
+    response, a site or a whole pull) into per position arrays, so the
+    raw rows can be thrown away afterwards. Totals are kept per
+    Device/Country/Branded combination (whichever columns are present),
+    which lets .curve() return an overall curve or any segment of it.
+
+    Accumulators can be combined with .merge() or "+" across
+    sites, days and runs, and saved with .to_dict() / .from_dict()
+
+    Parameters
+    max_position: highest rounded position to keep, positions
+        below 1 or above this are ignored
+        type: int
+        default: 100
+    """
+
+    def __init__(self, max_position: int = 100) -> None:
+        self.max_position = max_position
+        # keys: (Device, Country, Branded) with None for missing columns
+        # values: arrays indexed by rounded position
+        self._clicks: dict[tuple[Any, ...], np.ndarray] = {}
+        self._impressions: dict[tuple[Any, ...], np.ndarray] = {}
+
+    def __repr__(self) -> str:
+        return (
+            f"<CTRAccumulator segments={len(self._impressions)} "
+            f"impressions={self.impressions}>"
+        )
+
+    def __bool__(self) -> bool:
+        return self.impressions > 0
+
+    def __add__(self, other: "CTRAccumulator") -> "CTRAccumulator":
+        combined = CTRAccumulator(max(self.max_position, other.max_position))
+        combined.merge(self)
+        combined.merge(other)
+        return combined
+
+    @property
+    def impressions(self) -> int:
+        """total impressions accumulated"""
+        return int(sum(i.sum() for i in self._impressions.values()))
+
+    def _bins(self) -> int:
+        return self.max_position + 1
+
+    def _fold(self, key: tuple[Any, ...], clicks: np.ndarray, imps: np.ndarray) -> None:
+        """Adds position arrays into the totals for one segment key"""
+        size = self._bins()
+        clicks, imps = clicks[:size], imps[:size]
+        if key not in self._impressions:
+            self._clicks[key] = np.zeros(size, dtype=np.int64)
+            self._impressions[key] = np.zeros(size, dtype=np.int64)
+        self._clicks[key][: len(clicks)] += clicks
+        self._impressions[key][: len(imps)] += imps
+
+    def add(self, gsc_df: pd.DataFrame) -> None:
+        """
+        Folds a GSC DataFrame into the accumulator
+
+        :Params:
+        gsc_df: cleaned GSC data, needs "Clicks", "Impressions" and "Position"
+            type: pd.DataFrame (or pyarrow RecordBatch/Table)
+        """
+        if gsc_df is None or len(gsc_df) == 0:
+            return
+        if isinstance(gsc_df, pd.DataFrame):
+            present = list(gsc_df.columns)
+        else:
+            present = gsc_df.schema.names
+
+        pos = np.rint(np.asarray(gsc_df["Position"], dtype=np.float64))
+        keep = (pos >= 1) & (pos <= self.max_position)
+        pos = pos[keep].astype(np.int64)
+        clicks = np.asarray(gsc_df["Clicks"], dtype=np.float64)[keep]
+        imps = np.asarray(gsc_df["Impressions"], dtype=np.float64)[keep]
+
+        # give every row a segment id by combining the codes of each column
+        seg_id = np.zeros(len(pos), dtype=np.int64)
+        seg_values: list[Any] = []
+        for col in SEGMENTS:
+            if col in present:
+                codes, uniques = pd.factorize(np.asarray(gsc_df[col])[keep])
+                codes = np.where(codes < 0, len(uniques), codes)
+                uniques = [_plain(u) for u in uniques] + [None]
+            else:
+                codes, uniques = np.zeros(len(pos), dtype=np.int64), [None]
+            seg_id = seg_id * len(uniques) + codes
+            seg_values.append(uniques)
+
+        segments, seg_idx = np.unique(seg_id, return_inverse=True)
+        size = self._bins()
+        flat = seg_idx.reshape(-1) * size + pos
+        length = len(segments) * size
+        click_bins = np.bincount(flat, weights=clicks, minlength=length)
+        imp_bins = np.bincount(flat, weights=imps, minlength=length)
+        click_bins = np.rint(click_bins).astype(np.int64).reshape(-1, size)
+        imp_bins = np.rint(imp_bins).astype(np.int64).reshape(-1, size)
+
+        for row, segment in enumerate(segments):
+            key = []
+            for uniques in reversed(seg_values):
+                segment, code = divmod(segment, len(uniques))
+                key.append(uniques[code])
+            self._fold(tuple(reversed(key)), click_bins[row], imp_bins[row])
+
+    def merge(self, other: "CTRAccumulator") -> "CTRAccumulator":
+        """
+        Adds the totals of another accumulator into this one (in place)
+
+        Returns self so calls can be chained
+        """
+        if other.max_position > self.max_position:
+            self.max_position = other.max_position
+            for key, imps in self._impressions.items():
+                extra = (0, self._bins() - len(imps))
+                self._clicks[key] = np.pad(self._clicks[key], extra)
+                self._impressions[key] = np.pad(imps, extra)
+        for key, imps in other._impressions.items():
+            self._fold(key, other._clicks[key], imps)
+        return self
+
+    def curve(
+        self,
+        device: Optional[str] = None,
+        country: Optional[str] = None,
+        branded: Optional[bool] = None,
+    ) -> pd.DataFrame:
+        """
+        Returns the click curve for the selected segment
+        Any parameter left as None includes all of its values
+
+        Returns a pd.DataFrame
+            index: "Pos" (rounded position)
+            columns: ["Clicks", "Impressions", "CTR"]
+
+        :Params:
+        device: (optional) only include this device
+        country: (optional) only include this country
+        branded: (optional) True for branded, False for non-branded queries
+        """
+        wanted = (device, country, branded)
+        clicks = np.zeros(self._bins(), dtype=np.int64)
+        imps = np.zeros(self._bins(), dtype=np.int64)
+        for key, seg_imps in self._impressions.items():
+            if all(w is None or w == k for w, k in zip(wanted, key)):
+                clicks += self._clicks[key]
+                imps += seg_imps
+
+        ctr = pd.DataFrame(
+            {"Clicks": clicks, "Impressions": imps},
+            index=pd.Index(np.arange(self._bins()), name="Pos"),
+        )
+        ctr = ctr.loc[ctr["Impressions"] > 0].copy()
+        ctr["CTR"] = ctr["Clicks"] / ctr["Impressions"]
+        return ctr
+
+    def curves(self, by: str) -> dict[Any, pd.DataFrame]:
+        """
+        Returns a click curve for every value of one segment column
+
+        :Params:
+        by: segment column name
+            options: ["Device", "Country", "Branded"]
+        """
+        idx = SEGMENTS.index(by.capitalize())
+        values = dict.fromkeys(k[idx] for k in self._impressions if k[idx] is not None)
+        curves = {}
+        for value in values:
+            selected: list[Any] = [None, None, None]
+            selected[idx] = value
+            curves[value] = self.curve(*selected)
+        return curves
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON serializable copy of the accumulator"""
+        return {
+            "max_position": self.max_position,
+            "segments": [
+                {
+                    "key": list(key),
+                    "clicks": self._clicks[key].tolist(),
+                    "impressions": imps.tolist(),
+                }
+                for key, imps in self._impressions.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "CTRAccumulator":
+        """Rebuilds an accumulator saved with .to_dict()"""
+        acc = cls(data["max_position"])
+        for seg in data["segments"]:
+            acc._fold(
+                tuple(seg["key"]),
+                np.asarray(seg["clicks"], dtype=np.int64),
+                np.asarray(seg["impressions"], dtype=np.int64),
+            )
+        return acc
+
+
+def _plain(value: Any) -> Any:
+    """numpy scalars -> python scalars, so keys compare and serialize cleanly"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,158 @@
+"""Local rollups of Search Console data"""
+
+from typing import Any, Optional
+
+import pandas as pd
+
+# dimensions that can not be rolled up exactly, and why
+INEXACT_DIMENSIONS = {
+    "query": (
+        "GSC leaves anonymized queries out of query level data,"
+        " so totals without 'query' would be too low"
+    ),
+    "page": (
+        "GSC counts impressions and position per page when 'page' is a dimension,"
+        " so totals without 'page' would not match the API"
+    ),
+    "searchAppearance": (
+        "one result can have several search appearances,"
+        " so totals without 'searchAppearance' would be double counted"
+    ),
+}
+
+# metric columns a GSCCube is built from
+CUBE_METRICS = ["Clicks", "Impressions", "Position"]
+
+
+def missing_columns(columns: list[str], dimensions: list[str]) -> list[str]:
+    """
+    Columns a GSCCube needs (dimensions and CUBE_METRICS) that are
+    not in columns, ex. after .get_data(columns=[...])
+
+    :Params:
+    columns: column names of the data
+        type: list of strings
+    dimensions: the dimensions the data was pulled with
+        type: list of strings
+    """
+    needed = [d.capitalize() for d in dimensions] + CUBE_METRICS
+    return [column for column in needed if column not in columns]
+
+
+def rollup_error(source_dimensions: list[str], dimensions: list[str]) -> Optional[str]:
+    """
+    Checks if data pulled with source_dimensions can be rolled up
+    to dimensions exactly (matching what the API would return)
+
+    Returns None if it can, otherwise the reason it can not
+
+    :Params:
+    source_dimensions: dimensions of the original (fine grained) pull
+        type: list of strings
+    dimensions: dimensions we want to roll up to
+        type: list of strings
+    """
+    missing = [d for d in dimensions if d not in source_dimensions]
+    if missing:
+        return f"{missing} not in the original pull {source_dimensions}"
+    for dim, reason in INEXACT_DIMENSIONS.items():
+        if dim in source_dimensions and dim not in dimensions:
+            return reason
+    return None
+
+
+class GSCCube:
+    """
+    Answers coarser views of a fine grained GSC pull locally
+
+    Pull once with every dimension you need (ex. ["page","query","date"])
+    then call .rollup(["page"]), .rollup(["query","date"])... instead of
+    making a new API pull for each combination.
+
+    Clicks and Impressions are summed, Position is the impression
+    weighted average and Ctr is recalculated as Clicks / Impressions
+
+    Parameters
+    gsc_df: data from GoogleSearchConsole.get_data() for one site
+        type: pd.DataFrame (or pyarrow.Table)
+    dimensions: the dimensions gsc_df was pulled with
+        type: list of strings
+    """
+
+    def __init__(self, gsc_df: Any, dimensions: list[str]) -> None:
+        if not isinstance(gsc_df, pd.DataFrame):
+            gsc_df = gsc_df.to_pandas()
+        missing = missing_columns(list(gsc_df.columns), dimensions)
+        if missing:
+            raise ValueError(f"gsc_df is missing the columns {missing}")
+        self.dimensions = list(dimensions)
+        columns = [d.capitalize() for d in self.dimensions]
+        self._columns = dict(zip(self.dimensions, columns))
+
+        self._data = gsc_df[columns].copy()
+        self._data["Clicks"] = gsc_df["Clicks"].astype("int64")
+        self._data["Impressions"] = gsc_df["Impressions"].astype("int64")
+        self._data["_weighted_position"] = (
+            gsc_df["Position"].astype("float64") * self._data["Impressions"]
+        )
+        self._branded = gsc_df["Branded"] if "Branded" in gsc_df.columns else None
+
+    def __repr__(self) -> str:
+        return f"<GSCCube dimensions={self.dimensions} rows={len(self._data)}>"
+
+    def rollup_error(self, dimensions: list[str]) -> Optional[str]:
+        """
+        Returns None if .rollup(dimensions) is exact,
+        otherwise the reason it is not
+        """
+        return rollup_error(self.dimensions, dimensions)
+
+    def can_rollup(self, dimensions: list[str]) -> bool:
+        """True if .rollup(dimensions) matches what the API would return"""
+        return self.rollup_error(dimensions) is None
+
+    def rollup(self, dimensions: list[str], strict: bool = True) -> pd.DataFrame:
+        """
+        Aggregates the cube to the given dimensions
+
+        Returns a pd.DataFrame shaped like GoogleSearchConsole.clean_resp()
+            columns: Clicks, Impressions, Ctr, Position, <Dimensions>
+
+        :Params:
+        dimensions: dimensions to aggregate by, must be in the original pull
+            type: list of strings
+        strict: raise a ValueError when the rollup is not exact
+            type: bool
+            default: True
+        """
+        missing = [d for d in dimensions if d not in self.dimensions]
+        reason = self.rollup_error(dimensions)
+        if reason is not None and (strict or missing):
+            raise ValueError(f"Can not roll up to {dimensions}: {reason}")
+
+        data = self._data
+        group_cols = [self._columns[d] for d in dimensions]
+        metrics = ["Clicks", "Impressions", "_weighted_position"]
+        if group_cols:
+            rolled = (
+                data.groupby(group_cols, observed=True, sort=False)[metrics]
+                .sum()
+                .reset_index()
+            )
+        else:
+            rolled = data[metrics].sum().to_frame().T
+
+        rolled["Ctr"] = rolled["Clicks"] / rolled["Impressions"]
+        rolled["Position"] = rolled["_weighted_position"] / rolled["Impressions"]
+        rolled = rolled[["Clicks", "Impressions", "Ctr", "Position"] + group_cols]
+
+        # branded is decided by the query, so it survives any rollup keeping it
+        if self._branded is not None and "query" in dimensions:
+            branded = pd.Series(self._branded.values, index=data["Query"].values)
+            branded = branded[~branded.index.duplicated()]
+            rolled["Branded"] = rolled["Query"].map(branded).astype(bool)
+
+        rolled[["Clicks", "Impressions"]] = rolled[["Clicks", "Impressions"]].astype(
+            "int64"
+        )
+        return rolled
@@ -1,10 +1,304 @@
 """API Wrapper for Google Analytics"""
 
+import copy
 import datetime as dt
-from typing import Optional, Any
+import json
+import re
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Any
+import numpy as np
 import pandas as pd
 
-from .connect import Connection
+from .connect import Connection, ThreadLocalHttp
+from .arrow import (
+    GA_FLOAT_TYPES,
+    check_output_format,
+    ga_table,
+    import_pyarrow,
+    numpy_record_batch,
+)
+
+# batchGet takes at most 5 reportRequests, and they all need
+# the same viewId, dateRanges, samplingLevel, segments and cohortGroup
+MAX_BATCH_REPORTS = 5
+BATCH_KEYS = ["viewId", "dateRanges", "samplingLevel", "segments", "cohortGroup"]
+# added to the metric columns of the previous period, see set_comparison()
+PREVIOUS_SUFFIX = "_previous"
+# most metrics and dimensions one reportRequest can have
+MAX_METRICS = 10
+MAX_DIMENSIONS = 7
+
+# counts of unique visitors, they can not be added up across date ranges
+NON_ADDITIVE_METRICS = {
+    "users",
+    "1dayUsers",
+    "7dayUsers",
+    "14dayUsers",
+    "28dayUsers",
+    "30dayUsers",
+}
+# CURRENCY and INTEGER ratios that don't have "Per" in their name
+# (ex. costPerTransaction, revenuePerUser are caught by the name)
+RATIO_METRICS = {"CPC", "CPM", "RPC", "ROAS", "pageValue"}
+
+
+def report_columns(
+    report: dict[str, Any], suffixes: Optional[list[str]] = None
+) -> dict[str, np.ndarray]:
+    """
+    Decodes one report of a GA reports.batchGet response into
+    typed NumPy columns, in one pass over the rows
+
+    The dimension values and the metric values of every row are
+    gathered into two flat lists, then read into arrays sized from the
+    header: object arrays for dimensions, and one float64 block for all
+    metrics of all date ranges (INTEGER metrics are cast to int64).
+    The "ga:" prefix is removed from the column names
+
+    Returns {column name: np.ndarray}, dimensions first, then the
+    metrics of each date range
+
+    :Params:
+    report: one item of response["reports"]
+        type: dict
+    suffixes: added to the metric names of each date range
+        type: list of str, one per date range
+        default: no suffix for the first date range, "_1", "_2"...
+                 for the others
+    """
+    header = report.get("columnHeader", {})
+    dims = [_column_name(d) for d in header.get("dimensions", [])]
+    entries = header.get("metricHeader", {}).get("metricHeaderEntries", [])
+    rows = report.get("data", {}).get("rows") or []
+
+    n_ranges = len(rows[0]["metrics"]) if rows else 1
+    if suffixes is None:
+        suffixes = [""] + [f"_{i}" for i in range(1, n_ranges)]
+    if len(suffixes) < n_ranges:
+        raise ValueError(
+            f"The report has {n_ranges} date ranges, but only {len(suffixes)} suffixes"
+        )
+
+    dim_flat: list[str] = []
+    metric_flat: list[str] = []
+    for row in rows:
+        dim_flat.extend(row["dimensions"])
+        for date_range in row["metrics"]:
+            metric_flat.extend(date_range["values"])
+
+    dim_values = np.empty((len(rows), len(dims)), dtype=object)
+    dim_values.flat[:] = dim_flat
+    metric_values = np.fromiter(
+        metric_flat, dtype=np.float64, count=len(metric_flat)
+    ).reshape(len(rows), n_ranges, len(entries))
+
+    columns: dict[str, np.ndarray] = {
+        name: dim_values[:, idx] for idx, name in enumerate(dims)
+    }
+    for range_idx in range(n_ranges):
+        for idx, entry in enumerate(entries):
+            values = metric_values[:, range_idx, idx]
+            if entry.get("type") not in GA_FLOAT_TYPES:
+                values = values.astype(np.int64)
+            name = _column_name(entry.get("name")) + suffixes[range_idx]
+            columns[name] = values
+    return columns
+
+
+def comparison_columns(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Puts the current and previous period of every metric side by side,
+    with the change between them
+
+    For every metric with a <metric>_previous column the columns are
+        <metric>, <metric>_previous, <metric>_change, <metric>_pct_change
+    pct_change is NaN when the previous value is 0
+
+    :Params:
+    columns: output of report_columns(report, ["", "_previous"])
+        type: dict of np.ndarray
+    """
+    compared: dict[str, np.ndarray] = {}
+    for name, values in columns.items():
+        if name.endswith(PREVIOUS_SUFFIX):
+            continue
+        compared[name] = values
+        previous = columns.get(name + PREVIOUS_SUFFIX)
+        if previous is None:
+            continue
+        change = values - previous
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change = np.where(previous != 0, change / previous, np.nan)
+        compared[name + PREVIOUS_SUFFIX] = previous
+        compared[f"{name}_change"] = change
+        compared[f"{name}_pct_change"] = pct_change
+    return compared
+
+
+def merge_reports(reports: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merges reports of the same request pulled for different date ranges
+    (ex. the pieces of a sampled report) into one report
+
+    Rows are matched on their dimension values. A row found in only one
+    report keeps its values (ex. when "date" is a dimension). When a row
+    is in several reports its additive metrics (counts, sums) are added
+    up, and metrics that can not be added (rates, averages, users) are
+    set to NaN with a warning
+
+    :Params:
+    reports: reports with the same columnHeader
+        type: list of dict
+    """
+    header = copy.deepcopy(reports[0]["columnHeader"])
+    entries = header.get("metricHeader", {}).get("metricHeaderEntries", [])
+    additive = [_is_additive(entry) for entry in entries]
+
+    merged: dict[tuple[str, ...], list[str]] = {}
+    repeated = False
+    for report in reports:
+        for row in report.get("data", {}).get("rows") or []:
+            key = tuple(row["dimensions"])
+            values = row["metrics"][0]["values"]
+            if key not in merged:
+                merged[key] = list(values)
+                continue
+            repeated = True
+            merged[key] = [
+                str(float(old) + float(new)) if add else "nan"
+                for old, new, add in zip(merged[key], values, additive)
+            ]
+
+    if repeated and not all(additive):
+        dropped = [e["name"] for e, add in zip(entries, additive) if not add]
+        warnings.warn(
+            f"{dropped} can not be added up across date ranges, they are NaN"
+            " for rows found in more than one date range."
+            " Add a date dimension to keep them"
+        )
+        for entry, add in zip(entries, additive):
+            if not add:
+                entry["type"] = "FLOAT"
+
+    rows = [
+        {"dimensions": list(key), "metrics": [{"values": values}]}
+        for key, values in merged.items()
+    ]
+    return {"columnHeader": header, "data": {"rows": rows, "rowCount": len(rows)}}
+
+
+def join_reports(reports: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Joins reports of the same request pulled with different metrics
+    (ex. a request split into 10 metric pieces) into one report with
+    every metric, matching rows on their dimension values
+
+    GA leaves out rows where every requested metric is 0, so a row
+    missing from one piece has 0 for that piece's metrics
+
+    :Params:
+    reports: reports with the same dimensions and date ranges
+        type: list of dict
+    """
+    if len(reports) == 1:
+        return reports[0]
+    header = copy.deepcopy(reports[0]["columnHeader"])
+    header["metricHeader"]["metricHeaderEntries"] = [
+        entry
+        for report in reports
+        for entry in report["columnHeader"]["metricHeader"]["metricHeaderEntries"]
+    ]
+
+    found: dict[tuple[str, ...], dict[int, list[list[str]]]] = {}
+    n_ranges = 1
+    for idx, report in enumerate(reports):
+        for row in report.get("data", {}).get("rows") or []:
+            n_ranges = len(row["metrics"])
+            found.setdefault(tuple(row["dimensions"]), {})[idx] = [
+                r["values"] for r in row["metrics"]
+            ]
+
+    # rows a piece left out are all 0
+    zeros = [
+        [["0"] * len(r["columnHeader"]["metricHeader"]["metricHeaderEntries"])]
+        * n_ranges
+        for r in reports
+    ]
+    rows = []
+    for key, pieces in found.items():
+        values = [pieces.get(idx, zeros[idx]) for idx in range(len(reports))]
+        rows.append(
+            {
+                "dimensions": list(key),
+                "metrics": [
+                    {"values": [v for piece in values for v in piece[range_idx]]}
+                    for range_idx in range(n_ranges)
+                ],
+            }
+        )
+    return {"columnHeader": header, "data": {"rows": rows, "rowCount": len(rows)}}
+
+
+def _split_by_metrics(report_requests: list[dict[str, Any]]) -> bool:
+    """if the reportRequests are one request split into metric pieces"""
+    if len(report_requests) < 2:
+        return False
+    first = {k: v for k, v in report_requests[0].items() if k != "metrics"}
+    return all(
+        {k: v for k, v in r.items() if k != "metrics"} == first
+        for r in report_requests[1:]
+    )
+
+
+def _chunks(items: list[Any], size: int) -> list[list[Any]]:
+    """splits items into lists of at most size items"""
+    chunks = []
+    for start in range(0, len(items), size):
+        end = start + size
+        chunks.append(items[start:end])
+    return chunks
+
+
+def _is_additive(entry: dict[str, Any]) -> bool:
+    """if a metric can be summed across date ranges"""
+    name = _column_name(entry.get("name", ""))
+    if entry.get("type") in ["PERCENT", "FLOAT"] or name.startswith("avg"):
+        return False
+    # rates per session, transaction, user...
+    if re.search("Per[A-Z]", name) or name.endswith(("CPC", "CPM", "RPC")):
+        return False
+    return name not in NON_ADDITIVE_METRICS and name not in RATIO_METRICS
+
+
+def _is_sampled(report: dict[str, Any]) -> bool:
+    """if GA sampled the data of a report"""
+    return bool(report.get("data", {}).get("samplesReadCounts"))
+
+
+def _split_date_range(date_range: dict[str, str]) -> Optional[list[dict[str, str]]]:
+    """two halves of a date range, None if it is one day (or not a date)"""
+    try:
+        start = dt.date.fromisoformat(date_range["startDate"])
+        end = dt.date.fromisoformat(date_range["endDate"])
+    except ValueError:
+        return None
+    if end <= start:
+        return None
+    middle = start + (end - start) // 2
+    return [
+        {"startDate": start.isoformat(), "endDate": middle.isoformat()},
+        {
+            "startDate": (middle + dt.timedelta(days=1)).isoformat(),
+            "endDate": end.isoformat(),
+        },
+    ]
+
+
+def _column_name(name: str) -> str:
+    """GA header name without the ga: prefix"""
+    return name[3:] if name.startswith("ga:") else name
 
 
 class GoogleAnalytics:
@@ -27,7 +321,13 @@ class GoogleAnalytics:
 
     def __init__(self, view: str, default_view: str = "df") -> None:
 
+        # assigned in .__auth()
+        self._connection: Optional[Connection] = None
         self.auth = self.__auth()
+        # one authorized http per thread, for concurrent requests
+        self._thread_http: Optional[ThreadLocalHttp] = (
+            self._connection.thread_http() if self._connection is not None else None
+        )
         self.set_view(view)
         self.make_df = bool(default_view)
 
@@ -44,10 +344,23 @@ class GoogleAnalytics:
         self._s_date: dt.date = dt.date.today() - dt.timedelta(days=8)
         self._e_date: dt.date = dt.date.today() - dt.timedelta(days=1)
         self.raw_data: dict[Any, Any] = {}
+        self._output_format: str = "pandas"
+        # assigned using .set_request_workers()
+        self._request_workers: int = 8
+        self._request_slots = threading.BoundedSemaphore(self._request_workers)
+        # assigned using .set_sampling_split()
+        self._split_sampled: bool = True
+        # assigned using .set_comparison()
+        self._comparison_dates: Optional[
+            tuple[Optional[dt.date], Optional[dt.date]]
+        ] = None
+        # assigned using .queue_request()
+        self._queued_requests: dict[str, list[dict[str, Any]]] = {}
 
     def __auth(self):
         """Authenticates to Google"""
-        return Connection().ga()
+        self._connection = Connection()
+        return self._connection.ga()
 
     def set_view(self, view_id: str) -> None:
         """
@@ -166,6 +479,90 @@ class GoogleAnalytics:
         """
         self._metric_filter_grouping = enum
 
+    def set_output_format(self, output_format: str = "pandas") -> None:
+        """
+        Parameters
+        output_format: what self.pull() returns when the class
+            was initialized with a default_view
+          options: "pandas" (pd.DataFrame from self._create_df())
+                   "arrow" (pyarrow.Table decoded straight from the response,
+                            requires pip install googlewrapper[arrow])
+          type: str
+        """
+        self._output_format = check_output_format(output_format)
+
+    def set_request_workers(self, workers: int = 8) -> None:
+        """
+        Parameters
+        workers: how many API calls can run at the same time
+            (ex. the remaining pages of a report over 100,000 rows)
+            this is the limit for the whole pull, pages of several views
+            or date ranges share it
+            1 sends them one at a time
+          type: int
+          default: 8
+        """
+        if workers < 1:
+            raise ValueError("workers needs to be 1 or more")
+        self._request_workers = workers
+        self._request_slots = threading.BoundedSemaphore(workers)
+
+    def set_sampling_split(self, split: bool = True) -> None:
+        """
+        Parameters
+        split: when a report comes back sampled, split its date range in
+            half and pull both halves at the same time, until every piece
+            is unsampled (or a single day), then merge them back together
+            Rows with the same dimensions in several pieces (ex. no date
+            dimension) have their additive metrics summed, see merge_reports()
+          type: bool
+          default: True
+        """
+        self._split_sampled = split
+
+    def set_comparison(
+        self,
+        start_date: Optional[dt.date] = None,
+        end_date: Optional[dt.date] = None,
+    ) -> None:
+        """
+        Turns on comparison mode: every request also asks for a previous
+        period in the same API call (a second date range), and the data
+        comes back with these columns side by side for every metric
+            <metric>: current period (self._s_date to self._e_date)
+            <metric>_previous: previous period
+            <metric>_change: current - previous
+            <metric>_pct_change: change / previous (NaN when previous is 0)
+
+        Parameters
+        start_date: first day of the previous period
+          type: datetime.date
+          default: None, the same number of days right before self._s_date
+        end_date: last day of the previous period
+          type: datetime.date
+          default: None, the day before self._s_date
+        """
+        if (start_date is None) != (end_date is None):
+            raise ValueError("Please pass both start_date and end_date, or neither")
+        if start_date is not None and end_date is not None and end_date < start_date:
+            raise ValueError("end_date needs to be on or after start_date")
+        self._comparison_dates = (start_date, end_date)
+
+    def clear_comparison(self) -> None:
+        """Turns comparison mode (see self.set_comparison()) off"""
+        self._comparison_dates = None
+
+    @property
+    def _comparison(self) -> Optional[tuple[dt.date, dt.date]]:
+        """the (start, end) of the previous period, None when not comparing"""
+        if self._comparison_dates is None:
+            return None
+        start_date, end_date = self._comparison_dates
+        if start_date is None or end_date is None:
+            end_date = self._s_date - dt.timedelta(days=1)
+            start_date = end_date - (self._e_date - self._s_date)
+        return start_date, end_date
+
     def set_start_date(self, start_date: dt.date) -> None:
         """
         Parameters
@@ -226,26 +623,43 @@ class GoogleAnalytics:
 
         """
         req_obj = {
-            "reportRequests": [
+            "reportRequests": self._report_requests(size, page_token, hide_totals)
+        }
+
+        if pull:
+            ga_data: dict[str, Any] = self.pull(req_obj)
+            return ga_data
+
+        return req_obj
+
+    def _report_request(
+        self,
+        size: int = 100000,
+        page_token: Optional[str] = None,
+        hide_totals: bool = True,
+    ) -> dict[str, Any]:
+        """
+        Builds one entry of "reportRequests" from the
+        currently assigned view, dates, metrics, dimensions and filters
+        see self.build_request() for the parameters
+        """
+        report_request: dict[str, Any] = {
+            "viewId": str(self.view_id),
+            "dateRanges": [
                 {
-                    "viewId": str(self.view_id),
-                    "dateRanges": [
-                        {
-                            "startDate": self._s_date.strftime("%Y-%m-%d"),
-                            "endDate": self._e_date.strftime("%Y-%m-%d"),
-                        }
-                    ],
-                    "metrics": [{"expression": f"ga:{x}"} for x in self._metrics],
-                    "dimensions": [{"name": f"ga:{x}"} for x in self._dims],
-                    "pageSize": size,
-                    "pageToken": page_token,
-                    "hideTotals": hide_totals,
+                    "startDate": self._s_date.strftime("%Y-%m-%d"),
+                    "endDate": self._e_date.strftime("%Y-%m-%d"),
                 }
-            ]
+            ],
+            "metrics": [{"expression": f"ga:{x}"} for x in self._metrics],
+            "dimensions": [{"name": f"ga:{x}"} for x in self._dims],
+            "pageSize": size,
+            "pageToken": page_token,
+            "hideTotals": hide_totals,
         }
 
         if self._dim_filter is not None:
-            req_obj["reportRequests"][0]["dimensionFilterClauses"] = [
+            report_request["dimensionFilterClauses"] = [
                 {
                     "operator": self._dim_filter_grouping,
                     "filters": [
@@ -261,7 +675,7 @@ class GoogleAnalytics:
                 }
             ]
         if self._metric_filter is not None:
-            req_obj["reportRequests"][0]["metricFilterClauses"] = [
+            report_request["metricFilterClauses"] = [
                 {
                     "operator": self._metric_filter_grouping,
                     "filters": [
@@ -275,12 +689,167 @@ class GoogleAnalytics:
                     ],
                 }
             ]
+        if self._comparison is not None:
+            report_request["dateRanges"].append(
+                {
+                    "startDate": self._comparison[0].strftime("%Y-%m-%d"),
+                    "endDate": self._comparison[1].strftime("%Y-%m-%d"),
+                }
+            )
+        return report_request
 
-        if pull:
-            ga_data: dict[str, Any] = self.pull(req_obj)
-            return ga_data
+    def _report_requests(
+        self,
+        size: int = 100000,
+        page_token: Optional[str] = None,
+        hide_totals: bool = True,
+    ) -> list[dict[str, Any]]:
+        """
+        Plans the reportRequests for the current settings
 
-        return req_obj
+        A reportRequest takes at most 10 metrics and 7 dimensions.
+        More than 10 metrics are split into several reportRequests with
+        the same dimensions, dates and filters (10 metrics each), which
+        are pulled together and joined back on the dimensions.
+        Dimensions can not be split that way, so more than 7 raise a
+        ValueError
+        """
+        if len(self._dims) > MAX_DIMENSIONS:
+            raise ValueError(
+                f"GA allows at most {MAX_DIMENSIONS} dimensions per request,"
+                f" {len(self._dims)} were given: {self._dims}"
+            )
+        report_request = self._report_request(size, page_token, hide_totals)
+        metrics = report_request["metrics"]
+        return [
+            {**report_request, "metrics": piece}
+            for piece in _chunks(metrics, MAX_METRICS) or [metrics]
+        ]
+
+    def queue_request(self, name: str, size: int = 100000) -> None:
+        """
+        Saves a report request built from the current view, dates,
+        metrics, dimensions and filters under name, to be pulled
+        later with the other queued reports by self.batch_pull()
+
+        Change the settings and call this again to queue the next report
+
+        Parameters
+        name: key of this report in the dictionary from self.batch_pull()
+          type: str
+        size: max number of rows to return
+          type: int
+          default: 100,000 (max allowed by GA)
+        """
+        self._queued_requests[name] = self._report_requests(size)
+
+    def multi_view(
+        self,
+        view_ids: list[str],
+        combine: bool = False,
+        view_column: str = "view",
+        size: int = 100000,
+    ) -> Any:
+        """
+        Pulls the current request (dates, metrics, dimensions and filters)
+        for every view in view_ids at the same time, over this connection
+        (see self.set_request_workers()). self.view_id is not changed
+
+        Each view is paged, split when sampled and decoded the same way
+        as self.build_request()
+
+        Parameters
+        view_ids: Google Analytics view IDs
+          type: list of str
+        combine: return one pd.DataFrame (or pyarrow.Table)
+            with a view_column instead of a dictionary
+          type: bool
+          default: False
+        view_column: name of the view ID column when combine=True
+          type: str
+          default: "view"
+        size: max number of rows per page
+          type: int
+          default: 100,000 (max allowed by GA)
+
+        returns a dictionary of {view_id: report}
+        or one combined report if combine=True
+        """
+        report_requests = self._report_requests(size)
+        responses = self._map_requests(
+            lambda view_id: self._fetch_report(
+                [{**r, "viewId": str(view_id)} for r in report_requests]
+            ),
+            list(view_ids),
+        )
+        reports = {
+            view_id: self._decode_report(report)
+            for view_id, report in zip(view_ids, responses)
+        }
+        if not combine:
+            return reports
+        if not self.make_df:
+            raise ValueError("combine=True needs the class initialized with a df view")
+
+        if self._output_format == "arrow":
+            pa = import_pyarrow()
+            return pa.concat_tables(
+                table.append_column(
+                    view_column, pa.array([str(view_id)] * len(table), pa.string())
+                )
+                for view_id, table in reports.items()
+            )
+        return pd.concat(
+            [
+                df.assign(**{view_column: str(view_id)})
+                for view_id, df in reports.items()
+            ],
+            ignore_index=True,
+        )
+
+    def batch_pull(self) -> dict[str, Any]:
+        """
+        Pulls every report saved with self.queue_request()
+        batchGet accepts up to 5 reports that share a view, date ranges,
+        sampling level and segments, so the queued reports are grouped
+        by those and packed 5 at a time into as few calls as possible
+
+        The queue is emptied afterwards
+
+        returns a dictionary of {name: report}, each report decoded on its
+        own the same way as self.pull() (pd.DataFrame, pyarrow.Table or
+        the raw report dictionary)
+        """
+        groups: dict[str, list[tuple[str, dict[str, Any]]]] = {}
+        for name, report_requests in self._queued_requests.items():
+            for report_request in report_requests:
+                key = json.dumps(
+                    [report_request.get(k) for k in BATCH_KEYS], sort_keys=True
+                )
+                groups.setdefault(key, []).append((name, report_request))
+
+        batches = [
+            batch
+            for group in groups.values()
+            for batch in _chunks(group, MAX_BATCH_REPORTS)
+        ]
+        responses = self._map_requests(
+            lambda batch: self._batch_get({"reportRequests": [r for _, r in batch]}),
+            batches,
+        )
+        # a report split by metrics comes back in several pieces
+        pieces: dict[str, list[dict[str, Any]]] = {}
+        for batch, response in zip(batches, responses):
+            for (name, _), report in zip(batch, response["reports"]):
+                pieces.setdefault(name, []).append(report)
+
+        # same order the reports were queued in
+        reports = {
+            name: self._decode_report(join_reports(pieces[name]))
+            for name in self._queued_requests
+        }
+        self._queued_requests = {}
+        return reports
 
     def pull(self, request_body: dict[str, Any]) -> pd.DataFrame:
         """
@@ -298,50 +867,187 @@ class GoogleAnalytics:
         that will change this return
 
         1) a created pd.DataFrame
+           (or pyarrow.Table, see self.set_output_format())
         2) a raw response body (dictionary)
+
+        reports with more rows than fit on one page are completed
+        automatically, the remaining pages are requested at the same time
+        (see self.set_request_workers()) and added to the first page
+
+        reportRequests that only differ in their metrics (a request split
+        by self.build_request() because it had more than 10 metrics) are
+        pulled together and joined back into one report
         """
-        self.raw_data = self.auth.reports().batchGet(body=request_body).execute()
+        report_requests = request_body["reportRequests"]
+        if _split_by_metrics(report_requests):
+            self.raw_data = {"reports": [self._fetch_report(report_requests)]}
+        else:
+            self.raw_data = self._batch_get(request_body)
+        if self.make_df and self._output_format == "arrow":
+            if self._comparison is None:
+                return ga_table(self.raw_data)
+            pa = import_pyarrow()
+            return pa.concat_tables(
+                [self._decode_report(report) for report in self.raw_data["reports"]]
+            )
         if self.make_df:
             return self._create_df()
 
         return self.raw_data
 
-    def _create_df(self) -> pd.DataFrame:
+    def _execute(self, body: dict[str, Any]) -> dict[str, Any]:
         """
-        Loops through the Google Analytics batchGet()
-        response json to create a pd.DataFrame
+        calls reports().batchGet(), safe to use from several threads
+        at most self._request_workers calls run at the same time
+        """
+        request = self.auth.reports().batchGet(body=body)
+        http = self._thread_http.get() if self._thread_http is not None else None
+        with self._request_slots:
+            response: dict[str, Any] = request.execute(http=http)
+        return response
+
+    def _fetch_report(self, report_requests: list[dict[str, Any]]) -> dict[str, Any]:
+        """
+        Pulls the pieces of one report (see self._report_requests()),
+        5 per batchGet call, and joins them into one report
+        """
+        bodies = [
+            {"reportRequests": batch}
+            for batch in _chunks(report_requests, MAX_BATCH_REPORTS)
+        ]
+        responses = self._map_requests(self._batch_get, bodies)
+        return join_reports([r for response in responses for r in response["reports"]])
+
+    def _map_requests(self, func: Callable[[Any], Any], items: list[Any]) -> list[Any]:
+        """
+        func(item) for every item, in order, running self._request_workers
+        at a time when each thread can have its own http
 
-        Assigns variable types to columns
+        func can call _map_requests() again (views -> date ranges -> pages),
+        the API calls of every level share self._request_slots so the
+        nested pools don't multiply the number of calls running
         """
-        final_df = pd.DataFrame()
-        for report_section in self.raw_data["reports"]:
-            met = []
-            cols = report_section.get("columnHeader")
-            dims = cols["dimensions"]
+        workers = self._request_workers if self._thread_http is not None else 1
+        if workers == 1 or len(items) < 2:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            return list(pool.map(func, items))
 
-            for header in cols["metricHeader"]["metricHeaderEntries"]:
-                met.append(header.get("name"))
+    def _batch_get(self, body: dict[str, Any]) -> dict[str, Any]:
+        """
+        calls reports().batchGet() and follows nextPageToken,
+        returning the response with every page's rows in its reports
+
+        sampling is checked on the first page, a sampled report is split
+        before any of its other pages are requested
+        """
+        response = self._execute(body)
+        for idx, report_request in enumerate(body["reportRequests"]):
+            report = response["reports"][idx]
+            if self._split_sampled and _is_sampled(report):
+                unsampled = self._unsampled(report_request, report)
+                if unsampled is not report:
+                    response["reports"][idx] = unsampled
+                    continue
+            # not sampled, or it can't be split (the sampled data is kept)
+            self._add_pages(report_request, report)
+        return response
 
-            row_data = report_section["data"].get("rows")
-            metric_df = pd.DataFrame(
-                [m["metrics"][0]["values"] for m in row_data], columns=met
+    def _unsampled(
+        self, report_request: dict[str, Any], report: dict[str, Any]
+    ) -> dict[str, Any]:
+        """
+        Replaces a sampled report by splitting its date range in two,
+        pulling both halves at the same time (each one split again if it
+        is still sampled) and merging them with merge_reports()
+        """
+        date_ranges = report_request["dateRanges"]
+        halves = _split_date_range(date_ranges[0]) if len(date_ranges) == 1 else None
+        if halves is None:
+            warnings.warn(
+                f"The report for {date_ranges} is sampled and can not be"
+                " split into smaller date ranges, returning sampled data"
             )
+            return report
+        requests = [{**report_request, "dateRanges": [half]} for half in halves]
+        reports = self._map_requests(
+            lambda request: self._batch_get({"reportRequests": [request]})["reports"][
+                0
+            ],
+            requests,
+        )
+        return merge_reports(reports)
+
+    def _add_pages(
+        self, report_request: dict[str, Any], report: dict[str, Any]
+    ) -> None:
+        """
+        Requests the rest of a report's pages and adds their rows to report
+
+        v4 page tokens are row offsets and the first page has the rowCount,
+        so every remaining page is known up front and they are requested
+        at the same time, up to 5 pages per batchGet call
+        """
+        token = report.pop("nextPageToken", None)
+        if token is None:
+            return
+        rows = report["data"].setdefault("rows", [])
+        page_size = len(rows)
+        row_count = report["data"].get("rowCount", 0)
+        if not str(token).isdigit() or not page_size:
+            # not an offset, follow the tokens one page at a time
+            while token is not None:
+                page = self._execute(
+                    {"reportRequests": [{**report_request, "pageToken": token}]}
+                )["reports"][0]
+                rows.extend(page["data"].get("rows", []))
+                token = page.get("nextPageToken")
+            return
+
+        page_requests = [
+            {**report_request, "pageToken": str(offset)}
+            for offset in range(int(token), row_count, page_size)
+        ]
+        batches = _chunks(page_requests, MAX_BATCH_REPORTS)
+        responses = self._map_requests(
+            lambda batch: self._execute({"reportRequests": batch}), batches
+        )
+        for response in responses:
+            for page in response["reports"]:
+                rows.extend(page["data"].get("rows", []))
 
-            # assign the variable types
-            for col in cols["metricHeader"]["metricHeaderEntries"]:
-                col_name = col.get("name")
-                if col_name in metric_df.columns:
-                    if col.get("type") in ["FLOAT", "PERCENT", "TIME", "CURRENCY"]:
-                        metric_df[col_name] = metric_df[col_name].astype(float)
-                    elif col.get("type") in ["INTEGER"]:
-                        metric_df[col_name] = metric_df[col_name].astype(int)
-
-            dim_df = pd.DataFrame([d["dimensions"] for d in row_data], columns=dims)
-            # format dfs for simple merge
-            metric_df.index.name = "idx"
-            dim_df.index.name = "idx"
-            dim_df = dim_df.merge(metric_df, on="idx")
-            dim_df.columns = [column.replace("ga:", "") for column in dim_df.columns]
-            final_df = final_df.append(dim_df)
-
-        return final_df
+    def _decode_report(self, report: dict[str, Any]) -> Any:
+        """
+        Decodes one report of a batchGet response
+        the same way self.pull() decodes a whole response
+        """
+        if not self.make_df:
+            return report
+        columns = self._report_columns(report)
+        if self._output_format == "arrow":
+            pa = import_pyarrow()
+            return pa.Table.from_batches([numpy_record_batch(columns)])
+        return pd.DataFrame(columns, copy=False)
+
+    def _report_columns(self, report: dict[str, Any]) -> dict[str, np.ndarray]:
+        """
+        report_columns(), with the previous period and change columns
+        when comparison mode is on (see self.set_comparison())
+        """
+        if self._comparison is None:
+            return report_columns(report)
+        columns = report_columns(report, ["", PREVIOUS_SUFFIX])
+        return comparison_columns(columns)
+
+    def _create_df(self) -> pd.DataFrame:
+        """
+        Loops through the Google Analytics batchGet()
+        response json to create a pd.DataFrame
+        """
+        frames = [
+            pd.DataFrame(self._report_columns(report), copy=False)
+            for report in self.raw_data["reports"]
+        ]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames)
@@ -1,11 +1,179 @@
 """API Wrapper for Google Big Query"""
 
-from datetime import date
-from typing import Optional
+import hashlib
+import io
+import queue
+import re
+import threading
+import time
+import uuid
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterator, Optional
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 import pandas as pd
 
 from .connect import Connection
+from .arrow import import_pyarrow
+from .cache import ParquetCache, user_cache_dir
+
+# send() behavior -> load job write disposition
+WRITE_DISPOSITIONS = {
+    "append": bigquery.WriteDisposition.WRITE_APPEND,
+    "replace": bigquery.WriteDisposition.WRITE_TRUNCATE,
+    "fail": bigquery.WriteDisposition.WRITE_EMPTY,
+}
+
+# GoogleSearchConsole output, Site is added when sites are combined
+GSC_SCHEMA = [
+    bigquery.SchemaField("Date", "DATE"),
+    bigquery.SchemaField("Site", "STRING"),
+    bigquery.SchemaField("Page", "STRING"),
+    bigquery.SchemaField("Query", "STRING"),
+    bigquery.SchemaField("Country", "STRING"),
+    bigquery.SchemaField("Device", "STRING"),
+    bigquery.SchemaField("Searchappearance", "STRING"),
+    bigquery.SchemaField("Clicks", "INT64"),
+    bigquery.SchemaField("Impressions", "INT64"),
+    bigquery.SchemaField("Ctr", "FLOAT64"),
+    bigquery.SchemaField("Position", "FLOAT64"),
+    bigquery.SchemaField("Branded", "BOOL"),
+]
+
+# known output shapes for GoogleBigQuery.create_table()
+# GA columns depend on the request, the rest of its schema comes from data
+# clustering None -> view and the first dimensions of the data
+TABLE_SHAPES: dict[str, dict[str, Any]] = {
+    "gsc": {
+        "schema": GSC_SCHEMA,
+        "date_field": "Date",
+        "clustering": ["Site", "Page", "Query"],
+    },
+    "ga": {
+        "schema": [
+            bigquery.SchemaField("date", "DATE"),
+            bigquery.SchemaField("view", "STRING"),
+        ],
+        "date_field": "date",
+        "clustering": None,
+    },
+}
+
+# the API reports legacy SQL type names
+_LEGACY_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+
+# on-demand query price (US multi-region), used by GoogleBigQuery.estimate()
+ON_DEMAND_USD_PER_TIB = 6.25
+
+# queries that give a different answer on every run are never cached
+_NON_DETERMINISTIC = re.compile(
+    r"\b(CURRENT_(DATE|DATETIME|TIME|TIMESTAMP)|NOW|RAND|GENERATE_UUID"
+    r"|SESSION_USER)\b",
+    re.IGNORECASE,
+)
+
+# quoted strings and identifiers, kept as is by normalize_sql()
+_QUOTED = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+
+# marks the end of one read stream in GoogleBigQuery.read_stream()
+_STREAM_DONE = object()
+
+
+def _import_bigquery_storage() -> Any:
+    """Imports the BigQuery Storage client, with a helpful message if missing"""
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError as missing_storage:
+        raise ImportError(
+            "Streaming reads require google-cloud-bigquery-storage. Install it with: "
+            "pip install googlewrapper[storage]"
+        ) from missing_storage
+    return bigquery_storage
+
+
+def _field_type(arrow_type: Any) -> str:
+    """BigQuery column type for an Arrow type"""
+    pa = import_pyarrow()
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_boolean(arrow_type):
+        return "BOOL"
+    if pa.types.is_integer(arrow_type):
+        return "INT64"
+    if pa.types.is_floating(arrow_type):
+        return "FLOAT64"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    return "STRING"
+
+
+def _arrow_type(field_type: str) -> Any:
+    """Arrow type for a BigQuery column type"""
+    pa = import_pyarrow()
+    return {
+        "STRING": pa.string(),
+        "INT64": pa.int64(),
+        "FLOAT64": pa.float64(),
+        "BOOL": pa.bool_(),
+        "DATE": pa.date32(),
+        "TIMESTAMP": pa.timestamp("us"),
+    }[_LEGACY_TYPES.get(field_type, field_type)]
+
+
+def table_schema(shape: str, data: Any = None) -> list[bigquery.SchemaField]:
+    """
+    BigQuery schema for one of the TABLE_SHAPES
+    Columns of data that are not part of the shape are added
+    with a type matching the data
+
+    :Params:
+    shape: "gsc" or "ga"
+        type: str
+    data: (optional, needed for "ga") output of the wrapper
+        type: pd.DataFrame or pyarrow.Table
+    """
+    if shape not in TABLE_SHAPES:
+        raise ValueError(
+            f"{shape} is not a valid shape. Try one of the following:"
+            f" {list(TABLE_SHAPES)}"
+        )
+    schema = list(TABLE_SHAPES[shape]["schema"])
+    if data is None:
+        if shape == "ga":
+            raise ValueError("the ga shape needs data to build its schema from")
+        return schema
+    known = {field.name for field in schema}
+    for field in GoogleBigQuery._arrow_table(data).schema:
+        if field.name not in known:
+            schema.append(bigquery.SchemaField(field.name, _field_type(field.type)))
+    return schema
+
+
+def normalize_sql(query_string: str) -> str:
+    """
+    Collapses whitespace outside of quotes and drops a trailing ;
+    so reformatted copies of a query share one cache entry
+    """
+    parts = _QUOTED.split(query_string.strip().rstrip(";"))
+    return "".join(
+        part if idx % 2 else re.sub(r"\s+", " ", part) for idx, part in enumerate(parts)
+    ).strip()
+
+
+def _put(out_queue: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    """puts item on the queue unless the reader stopped, returns False if it did"""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
 
 
 class GoogleBigQuery:
@@ -25,6 +193,18 @@ class GoogleBigQuery:
         self._project: str = self.auth.project_id
         self._dataset: Optional[str] = None
         self._table: Optional[str] = None
+        # assigned in .create_table(), loads are cast to it
+        self._schema: Optional[list[bigquery.SchemaField]] = None
+        self._date_field = "Date"
+        # assigned in .load()
+        self.last_load: Optional[dict[str, Any]] = None
+        # see .set_read_cache()
+        self._read_cache: Optional[ParquetCache] = None
+        # see .set_byte_budget(), every estimate is added to the query_log
+        self._max_bytes: Optional[int] = None
+        self._max_bytes_billed: Optional[int] = None
+        self._budget_action = "raise"
+        self.query_log: deque[dict[str, Any]] = deque(maxlen=1000)
 
     def __auth(self, file):
         """Authenticates to Google"""
@@ -43,6 +223,8 @@ class GoogleBigQuery:
         GBQ table name -> self._table
         """
         self._table = table_name
+        self._schema = None
+        self._date_field = "Date"
 
     def full_table_name(self) -> str:
         """
@@ -59,12 +241,142 @@ class GoogleBigQuery:
         """
         return [x.dataset_id for x in list(self._client.list_datasets())]
 
+    def create_table(
+        self,
+        shape: str = "gsc",
+        data: Any = None,
+        schema: Optional[list[bigquery.SchemaField]] = None,
+        clustering_fields: Optional[list[str]] = None,
+    ) -> Any:
+        """
+        Creates the active table (self._dataset, self._table) with a
+        declared schema, partitioned by day on Date and clustered, so
+        queries filtering on a date range and Site/Page/Query only read
+        what they need. If the table already exists it is checked with
+        self.validate_table() instead, and a ValueError lists any problem.
+
+        Afterwards .load() and .replace_day() cast the data to the schema
+        (ex. a datetime Date becomes a DATE)
+        Requires pyarrow (pip install googlewrapper[arrow])
+
+        Returns the bigquery.Table
+
+        :Params:
+        shape: which wrapper output the table holds
+            __OPTIONS__
+            gsc: (default) GoogleSearchConsole, clustered on Site, Page, Query
+            ga: GoogleAnalytics, clustered on view and the first
+                dimensions, needs data (the schema depends on the request)
+        data: (optional) a sample of the output, extra columns are added
+            to the schema
+            type: pd.DataFrame or pyarrow.Table
+        schema: (optional) use this schema instead
+            type: list of bigquery.SchemaField
+        clustering_fields: (optional) up to 4 columns to cluster on
+            type: list of strings
+        """
+        schema = schema or table_schema(shape, data)
+        date_field = TABLE_SHAPES[shape]["date_field"]
+        clustering_fields = clustering_fields or self._clustering(shape, schema)
+
+        table = bigquery.Table(
+            f"{self._project}.{self.full_table_name()}", schema=schema
+        )
+        table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY, field=date_field
+        )
+        table.clustering_fields = clustering_fields
+        try:
+            existing = self._client.get_table(table.reference)
+        except NotFound:
+            existing = None
+
+        if existing is None:
+            table = self._client.create_table(table)
+        else:
+            problems = self._table_problems(
+                existing, schema, date_field, clustering_fields
+            )
+            if problems:
+                raise ValueError(
+                    f"{self.full_table_name()} does not match: {'; '.join(problems)}"
+                )
+            table = existing
+        self._schema = schema
+        self._date_field = date_field
+        return table
+
+    def validate_table(
+        self,
+        shape: str = "gsc",
+        data: Any = None,
+        schema: Optional[list[bigquery.SchemaField]] = None,
+        clustering_fields: Optional[list[str]] = None,
+    ) -> list[str]:
+        """
+        Checks the active table against a shape (see self.create_table())
+
+        Returns a list of problems (missing or mistyped columns,
+        partitioning, clustering), empty when the table matches
+
+        Parameters match self.create_table()
+        """
+        schema = schema or table_schema(shape, data)
+        existing = self._client.get_table(f"{self._project}.{self.full_table_name()}")
+        return self._table_problems(
+            existing,
+            schema,
+            TABLE_SHAPES[shape]["date_field"],
+            clustering_fields or self._clustering(shape, schema),
+        )
+
+    @staticmethod
+    def _clustering(shape: str, schema: list[bigquery.SchemaField]) -> list[str]:
+        """clustering columns of a shape, GA uses view and its first dimensions"""
+        if TABLE_SHAPES[shape]["clustering"]:
+            return list(TABLE_SHAPES[shape]["clustering"])
+        return [field.name for field in schema if field.field_type == "STRING"][:4]
+
+    @staticmethod
+    def _table_problems(
+        table: Any,
+        schema: list[bigquery.SchemaField],
+        date_field: str,
+        clustering_fields: list[str],
+    ) -> list[str]:
+        """differences between an existing bigquery.Table and the declared one"""
+        problems = []
+        partitioning = table.time_partitioning
+        if (
+            partitioning is None
+            or partitioning.field != date_field
+            or partitioning.type_ != bigquery.TimePartitioningType.DAY
+        ):
+            problems.append(f"not partitioned by day on {date_field}")
+        if list(table.clustering_fields or []) != clustering_fields:
+            problems.append(f"not clustered on {clustering_fields}")
+
+        existing = {
+            field.name: _LEGACY_TYPES.get(field.field_type, field.field_type)
+            for field in table.schema
+        }
+        for field in schema:
+            field_type = _LEGACY_TYPES.get(field.field_type, field.field_type)
+            if field.name not in existing:
+                problems.append(f"{field.name} is missing")
+            elif existing[field.name] != field_type:
+                problems.append(
+                    f"{field.name} is {existing[field.name]}, not {field_type}"
+                )
+        return problems
+
     def send(
         self,
         data: pd.DataFrame,
         chunk_size: int = 10000,
         behavior: str = "append",
         progress_bar: bool = False,
+        method: str = "to_gbq",
     ) -> None:
         """
         sends the data (df parameter) into the
@@ -88,7 +400,21 @@ class GoogleBigQuery:
         progress_bar: do you want to see a progress bar in terminal
             type: bool
             default: False (no progress bar)
+        method: how the data is sent
+            __OPTIONS__
+            to_gbq: (default) pd.DataFrame.to_gbq in chunk_size row chunks
+            load: Parquet load job(s), see self.load()
+                  much faster for large frames, requires pyarrow
+                  (chunk_size and progress_bar are not used)
         """
+        if method == "load":
+            self.load(data, behavior=behavior)
+            return
+        if method != "to_gbq":
+            raise ValueError(
+                f"{method} is not a valid method. Try one of the following:"
+                " ['to_gbq', 'load']"
+            )
         try:
             data.to_gbq(
                 destination_table=f"{self._dataset}.{self._table}",
@@ -100,34 +426,666 @@ class GoogleBigQuery:
         except AttributeError as project_name_missing:
             raise AttributeError from project_name_missing
 
-    def read(self, query_string: str) -> pd.DataFrame:
+    def load(
+        self,
+        data: Any,
+        behavior: str = "append",
+        chunk_rows: Optional[int] = None,
+        max_workers: int = 4,
+    ) -> dict[str, Any]:
+        """
+        Loads data into the active GBQ table (self._table) & dataset
+        (self._dataset) with Parquet load jobs instead of to_gbq chunks
+
+        The data is converted to Arrow once and written to an in memory
+        Parquet file, then sent in a single load job. Very large data can
+        be split into chunk_rows row pieces loaded by parallel load jobs.
+        Requires pyarrow (pip install googlewrapper[arrow])
+
+        Returns (and saves as self.last_load) a dictionary with
+            rows, jobs, seconds and rows_per_second
+
+        :Params:
+        data: data to be inserted into GBQ
+            type: pd.DataFrame or pyarrow.Table
+        behavior: what to do if the table exists
+            __OPTIONS__
+            append: (default behavior) add to bottom of table
+            fail: fail, no import happens
+            replace: replace the table's data with data
+        chunk_rows: rows per load job, None sends everything in one job
+            the first chunk is loaded on its own, then the rest are
+            appended in parallel. With replace/fail the chunks go to a
+            staging table (same schema, partitioning and clustering as the
+            table) that is copied over the table in one job once every
+            chunk loaded, so a failed chunk leaves the table as it was
+            type: int
+            default: None
+        max_workers: load jobs running at the same time
+            type: int
+            default: 4
+        """
+        if behavior not in WRITE_DISPOSITIONS:
+            raise ValueError(
+                f"{behavior} is not a valid behavior."
+                f" Try one of the following: {list(WRITE_DISPOSITIONS)}"
+            )
+        table = self._conform(self._arrow_table(data))
+
+        started = time.perf_counter()
+        if chunk_rows is None or chunk_rows >= table.num_rows:
+            chunks = [table]
+        else:
+            chunks = [
+                table.slice(offset, chunk_rows)
+                for offset in range(0, table.num_rows, chunk_rows)
+            ]
+
+        destination = f"{self._project}.{self.full_table_name()}"
+        jobs = len(chunks)
+        if len(chunks) == 1 or behavior == "append":
+            self._load_chunks(
+                chunks, destination, WRITE_DISPOSITIONS[behavior], max_workers
+            )
+        else:
+            staging = self._staging_table(destination)
+            try:
+                self._load_chunks(
+                    chunks,
+                    staging,
+                    bigquery.WriteDisposition.WRITE_APPEND,
+                    max_workers,
+                )
+                self._client.copy_table(
+                    staging,
+                    destination,
+                    job_config=bigquery.CopyJobConfig(
+                        write_disposition=WRITE_DISPOSITIONS[behavior]
+                    ),
+                ).result()
+            finally:
+                self._client.delete_table(staging, not_found_ok=True)
+            jobs += 1
+
+        seconds = time.perf_counter() - started
+        self.last_load = {
+            "rows": table.num_rows,
+            "jobs": jobs,
+            "seconds": seconds,
+            "rows_per_second": table.num_rows / seconds if seconds else float("inf"),
+        }
+        return self.last_load
+
+    def _load_chunks(
+        self,
+        chunks: list[Any],
+        destination: str,
+        write_disposition: str,
+        max_workers: int,
+    ) -> None:
+        """
+        loads the first chunk with write_disposition (it sets the table up),
+        then appends the rest in parallel
+        """
+        self._load_job(chunks[0], write_disposition, destination=destination)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(
+                    pool.map(
+                        lambda chunk: self._load_job(
+                            chunk,
+                            bigquery.WriteDisposition.WRITE_APPEND,
+                            destination=destination,
+                        ),
+                        chunks[1:],
+                    )
+                )
+
+    def _staging_table(self, destination: str) -> str:
+        """
+        Returns the id of a table to load chunks into before they are
+        copied to destination. When destination exists the staging table
+        is created empty with its schema, partitioning and clustering
+        (the copy needs them to match), and expires after a day in case
+        it is not deleted. Otherwise the first load job creates it
+        """
+        staging = f"{destination}_staging_{uuid.uuid4().hex[:12]}"
+        try:
+            existing = self._client.get_table(destination)
+        except NotFound:
+            return staging
+        table = bigquery.Table(staging, schema=existing.schema)
+        table.time_partitioning = existing.time_partitioning
+        table.clustering_fields = existing.clustering_fields
+        table.expires = datetime.now(timezone.utc) + timedelta(days=1)
+        self._client.create_table(table)
+        return staging
+
+    def replace_day(self, data: Any, day: date) -> dict[str, Any]:
+        """
+        Replaces one day of the active table with data in a single
+        load job, written straight into the day's partition
+        (table$YYYYMMDD with WRITE_TRUNCATE)
+
+        Only that partition is touched, nothing is scanned or deleted
+        first, so running it again for the same day is safe and a daily
+        refresh only costs one day. If the table does not exist yet it is
+        created partitioned by day on Date. An existing table has to be
+        partitioned by day on Date (see self.create_table()).
+        Requires pyarrow (pip install googlewrapper[arrow])
+
+        Returns (and saves as self.last_load) a dictionary with
+            rows, jobs, seconds and rows_per_second
+
+        :Params:
+        data: the full day of data, every Date has to be day
+            (date for a "ga" table)
+            an empty data clears the day
+            type: pd.DataFrame or pyarrow.Table
+        day: the day (partition) to replace
+            type: datetime.date
+        """
+        if isinstance(day, datetime):
+            day = day.date()
+        table = self._conform(
+            self._date_column(self._arrow_table(data), self._date_field)
+        )
+        other_days = {
+            value
+            for value in table.column(self._date_field).unique().to_pylist()
+            if value != day
+        }
+        if other_days:
+            raise ValueError(
+                f"data has rows outside of {day}: {sorted(map(str, other_days))}"
+            )
+
+        started = time.perf_counter()
+        self._load_job(
+            table,
+            bigquery.WriteDisposition.WRITE_TRUNCATE,
+            destination=(
+                f"{self._project}.{self.full_table_name()}${day.strftime('%Y%m%d')}"
+            ),
+            partition_field=self._date_field,
+        )
+        seconds = time.perf_counter() - started
+        self.last_load = {
+            "rows": table.num_rows,
+            "jobs": 1,
+            "seconds": seconds,
+            "rows_per_second": table.num_rows / seconds if seconds else float("inf"),
+        }
+        return self.last_load
+
+    @staticmethod
+    def _arrow_table(data: Any) -> Any:
+        """pd.DataFrame or pyarrow.Table -> pyarrow.Table"""
+        pa = import_pyarrow()
+        if isinstance(data, pd.DataFrame):
+            return pa.Table.from_pandas(data, preserve_index=False)
+        return data
+
+    @staticmethod
+    def _date_column(table: Any, field: str = "Date") -> Any:
+        """
+        casts the date column of an Arrow table to date32 (BigQuery DATE)
+        it can be a timestamp (pd.to_datetime), a "YYYY-MM-DD" (GSC)
+        or a "YYYYMMDD" (GA) string
+        """
+        pa = import_pyarrow()
+        import pyarrow.compute as pc
+
+        if field not in table.column_names:
+            raise ValueError(f"data needs a {field} column")
+        column = table.column(field)
+        if pa.types.is_date32(column.type):
+            return table
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.strptime(
+                pc.replace_substring(column, "-", ""), format="%Y%m%d", unit="s"
+            )
+        return table.set_column(
+            table.column_names.index(field), field, column.cast(pa.date32())
+        )
+
+    def _conform(self, table: Any) -> Any:
+        """
+        casts the columns of an Arrow table to the schema set by
+        self.create_table(), does nothing when there is none
+        """
+        if self._schema is None:
+            return table
+        types = {field.name: field.field_type for field in self._schema}
+        extra = [name for name in table.column_names if name not in types]
+        if extra:
+            raise ValueError(f"{extra} are not part of {self.full_table_name()}")
+        for name in table.column_names:
+            if types[name] == "DATE":
+                table = self._date_column(table, name)
+                continue
+            column = table.column(name)
+            if column.type == _arrow_type(types[name]):
+                continue
+            table = table.set_column(
+                table.column_names.index(name),
+                name,
+                column.cast(_arrow_type(types[name])),
+            )
+        return table
+
+    def _load_job(
+        self,
+        table: Any,
+        write_disposition: str,
+        destination: Optional[str] = None,
+        partition_field: Optional[str] = None,
+    ) -> Any:
+        """
+        writes an Arrow table to an in memory Parquet file and loads it
+        into destination (default: the active table), waits for the job
+        partition_field makes a new table partitioned by day on that column
+        """
+        import_pyarrow()
+        import pyarrow.parquet as pq
+
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        buffer.seek(0)
+
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=write_disposition,
+        )
+        if partition_field:
+            job_config.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY, field=partition_field
+            )
+        job = self._client.load_table_from_file(
+            buffer,
+            destination or f"{self._project}.{self.full_table_name()}",
+            job_config=job_config,
+        )
+        return job.result()
+
+    def read_stream(
+        self,
+        query_string: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+        row_filter: Optional[str] = None,
+        max_streams: int = 4,
+        output: str = "arrow",
+        buffer_batches: int = 8,
+    ) -> Iterator[Any]:
+        """
+        Reads with the BigQuery Storage Read API, yielding the data
+        piece by piece instead of building one big pd.DataFrame
+
+        Reads the active table (self._dataset, self._table) directly,
+        or the results of query_string. Several streams are read at the
+        same time, and at most buffer_batches pieces are held in memory
+        while waiting for the caller, so memory stays bounded no matter
+        how big the table is.
+        Requires pip install googlewrapper[storage]
+
+        :Params:
+        query_string: (optional) query to run and read the results of
+            default: None (read the active table)
+            type: str
+        columns: (optional) only read these columns (table reads only)
+            type: list of strings
+        row_filter: (optional) SQL filter applied by BigQuery before
+            sending the rows (table reads only)
+            example: "Date = '2022-01-01' AND Clicks > 0"
+            type: str
+        max_streams: how many streams to read at the same time
+            type: int
+            default: 4
+        output: what each piece is
+            __OPTIONS__
+            arrow: (default) pyarrow.RecordBatch
+            pandas: pd.DataFrame
+        buffer_batches: pieces read ahead of the caller
+            type: int
+            default: 8
+        """
+        if output not in ["arrow", "pandas"]:
+            raise ValueError(
+                f"{output} is not a valid output. Try one of the following:"
+                " ['arrow', 'pandas']"
+            )
+        if query_string is not None and (columns or row_filter):
+            raise ValueError("columns and row_filter only apply to table reads")
+        import_pyarrow()
+        storage = _import_bigquery_storage()
+        session, read_client = self._read_session(
+            storage, query_string, columns, row_filter, max_streams
+        )
+        return self._stream_batches(session, read_client, output, buffer_batches)
+
+    def _read_session(
+        self,
+        storage: Any,
+        query_string: Optional[str],
+        columns: Optional[list[str]],
+        row_filter: Optional[str],
+        max_streams: int,
+    ) -> tuple[Any, Any]:
+        """creates the Storage Read API session for .read_stream()"""
+        if query_string is None:
+            table = bigquery.TableReference.from_string(
+                self.full_table_name(), default_project=self._project
+            )
+        else:
+            # query results are saved to a temporary table we can read
+            self._guard(query_string)
+            job = self._client.query(query_string, job_config=self._job_config())
+            job.result()
+            table = job.destination
+
+        read_options = storage.types.ReadSession.TableReadOptions(
+            selected_fields=columns or [], row_restriction=row_filter or ""
+        )
+        requested_session = storage.types.ReadSession(
+            table=(
+                f"projects/{table.project}/datasets/{table.dataset_id}"
+                f"/tables/{table.table_id}"
+            ),
+            data_format=storage.types.DataFormat.ARROW,
+            read_options=read_options,
+        )
+        read_client = storage.BigQueryReadClient(credentials=self.auth)
+        session = read_client.create_read_session(
+            parent=f"projects/{self._project}",
+            read_session=requested_session,
+            max_stream_count=max_streams,
+        )
+        return session, read_client
+
+    @staticmethod
+    def _stream_batches(
+        session: Any, read_client: Any, output: str, buffer_batches: int
+    ) -> Iterator[Any]:
+        """reads every stream of session in its own thread, yields the pages"""
+        if not session.streams:
+            return
+
+        out_queue: "queue.Queue[Any]" = queue.Queue(maxsize=buffer_batches)
+        stop = threading.Event()
+
+        def read_one(stream_name: str) -> None:
+            try:
+                pages = read_client.read_rows(stream_name).rows(session).pages
+                for page in pages:
+                    if not _put(out_queue, page.to_arrow(), stop):
+                        return
+            except Exception as error:  # handed to the caller's thread
+                _put(out_queue, error, stop)
+            finally:
+                _put(out_queue, _STREAM_DONE, stop)
+
+        pool = ThreadPoolExecutor(max_workers=len(session.streams))
+        for stream in session.streams:
+            pool.submit(read_one, stream.name)
+        try:
+            finished = 0
+            while finished < len(session.streams):
+                item = out_queue.get()
+                if item is _STREAM_DONE:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item.to_pandas() if output == "pandas" else item
+        finally:
+            stop.set()
+            pool.shutdown(wait=True)
+
+    def set_byte_budget(
+        self,
+        max_bytes: Optional[int] = None,
+        max_bytes_billed: Optional[int] = None,
+        action: str = "raise",
+    ) -> None:
+        """
+        Limits how much the queries run by this class can scan
+        (.read(), .read_stream() queries and .delete_day())
+
+        max_bytes is checked with a free dry run before each query, and
+        the estimate is added to self.query_log. max_bytes_billed is
+        passed to BigQuery with the job, which fails it without billing
+        if it would scan more.
+        Leave both as None to turn the budget off
+
+        :Params:
+        max_bytes: estimated bytes processed allowed per query
+            type: int
+            default: None (no check)
+        max_bytes_billed: bytes billed allowed per job
+            type: int
+            default: None (no limit)
+        action: what to do when a query is over max_bytes
+            __OPTIONS__
+            raise: (default) raise a ValueError, the query is not run
+            warn: warn and run the query anyway
+        """
+        if action not in ["raise", "warn"]:
+            raise ValueError(
+                f"{action} is not a valid action. Try one of the following:"
+                " ['raise', 'warn']"
+            )
+        self._max_bytes = max_bytes
+        self._max_bytes_billed = max_bytes_billed
+        self._budget_action = action
+
+    def estimate(
+        self, query_string: str, price_per_tib: float = ON_DEMAND_USD_PER_TIB
+    ) -> dict[str, Any]:
+        """
+        Dry runs query_string (nothing is billed) and returns what it
+        would scan. The estimate is added to self.query_log
+
+        Returns a dictionary with
+            query: the normalized query
+            statement_type: SELECT, DELETE, MERGE...
+            bytes_processed: estimated bytes the query reads
+            estimated_cost: on-demand price of bytes_processed in USD
+                (capacity/slot pricing is not estimated by a dry run)
+            referenced_tables: full names of the tables it reads
+            partitioned_on: {table: partition column} of the partitioned
+                tables (_PARTITIONTIME for ingestion time partitions)
+            table_bytes: size of all the referenced tables
+            scanned_fraction: bytes_processed / table_bytes, close to 1
+                means no partition or cluster pruning happened
+
+        :Params:
+        query_string: query to estimate
+            type: str
+        price_per_tib: on-demand USD per TiB
+            type: float
+            default: 6.25
+        """
+        return self._estimate(query_string, self._dry_run(query_string), price_per_tib)
+
+    def _estimate(
+        self,
+        query_string: str,
+        dry_run: Any,
+        price_per_tib: float = ON_DEMAND_USD_PER_TIB,
+    ) -> dict[str, Any]:
+        """builds (and logs) the self.estimate() result from a dry run job"""
+        bytes_processed = int(dry_run.total_bytes_processed or 0)
+        references = [str(table) for table in dry_run.referenced_tables or []]
+        partitioned_on = {}
+        table_bytes = 0
+        for reference in references:
+            table = self._client.get_table(reference)
+            table_bytes += int(table.num_bytes or 0)
+            if table.time_partitioning is not None:
+                partitioned_on[reference] = (
+                    table.time_partitioning.field or "_PARTITIONTIME"
+                )
+        estimate = {
+            "query": normalize_sql(query_string),
+            "statement_type": dry_run.statement_type,
+            "bytes_processed": bytes_processed,
+            "estimated_cost": bytes_processed / 1024**4 * price_per_tib,
+            "referenced_tables": references,
+            "partitioned_on": partitioned_on,
+            "table_bytes": table_bytes,
+            "scanned_fraction": (
+                bytes_processed / table_bytes if table_bytes else None
+            ),
+        }
+        self.query_log.append(
+            {
+                "time": datetime.now(),
+                **estimate,
+                "over_budget": self._max_bytes is not None
+                and bytes_processed > self._max_bytes,
+            }
+        )
+        return estimate
+
+    def _guard(self, query_string: str, dry_run: Any = None) -> None:
+        """checks query_string against the byte budget (self.set_byte_budget())"""
+        if self._max_bytes is None:
+            return
+        estimate = self._estimate(query_string, dry_run or self._dry_run(query_string))
+        if estimate["bytes_processed"] <= self._max_bytes:
+            return
+        message = (
+            f"query would process {estimate['bytes_processed']:,} bytes"
+            f" (${estimate['estimated_cost']:.2f}), over the budget of"
+            f" {self._max_bytes:,} bytes: {estimate['query'][:200]}"
+        )
+        if self._budget_action == "raise":
+            raise ValueError(message)
+        warnings.warn(message)
+
+    def _job_config(self) -> bigquery.QueryJobConfig:
+        """query job config with the per job max_bytes_billed, if set"""
+        return bigquery.QueryJobConfig(maximum_bytes_billed=self._max_bytes_billed)
+
+    def set_read_cache(
+        self,
+        path: Optional[str] = str(user_cache_dir() / "gbq_cache"),
+        max_bytes: int = 1024**3,
+    ) -> None:
+        """
+        Caches the results of self.read() on disk as compressed Parquet
+
+        Entries are keyed by the query (whitespace does not matter) and
+        the last modified time of every table it reads, so a cached
+        result is used until one of those tables changes. Each read
+        still runs a free dry run to find the tables. Queries using
+        CURRENT_DATE(), RAND() and similar functions are never cached.
+        Requires pyarrow (pip install googlewrapper[arrow])
+
+        :Params:
+        path: folder to save the results in, None turns caching off
+            type: str
+            default: gbq_cache in the user cache folder
+            (~/.cache/googlewrapper, see googlewrapper.cache.user_cache_dir)
+        max_bytes: size of the folder, least recently read results
+                   are removed past it
+            type: int
+            default: 1 GB
+        """
+        self._read_cache = ParquetCache(path, max_bytes) if path else None
+
+    def read(self, query_string: str, use_cache: bool = True) -> pd.DataFrame:
         """
         Read from GBQ using a query string
 
         Returns a pd.DataFrame
+
+        :Params:
+        query_string: query to run
+            type: str
+        use_cache: read from/save to the cache set with self.set_read_cache()
+            type: bool
+            default: True
         """
+        cache = self._read_cache if use_cache else None
+        # one dry run is shared by the cache and the byte budget
+        dry_run = (
+            self._dry_run(query_string)
+            if cache or self._max_bytes is not None
+            else None
+        )
+        cache_key = self._cache_key(query_string, dry_run) if cache else None
+        if cache and cache_key:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached.to_pandas()
+
+        self._guard(query_string, dry_run)
+        configuration = None
+        if self._max_bytes_billed is not None:
+            configuration = {
+                "query": {"maximumBytesBilled": str(self._max_bytes_billed)}
+            }
         queried_df = pd.read_gbq(
-            query=query_string, project_id=self._project, progress_bar_type="None"
+            query=query_string,
+            project_id=self._project,
+            progress_bar_type="None",
+            configuration=configuration,
         )
+        if cache and cache_key:
+            cache.set(cache_key, self._arrow_table(queried_df))
         return queried_df
 
+    def _dry_run(self, query_string: str) -> Any:
+        """runs query_string as a dry run (nothing is billed), returns the job"""
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        return self._client.query(query_string, job_config=job_config)
+
+    def _cache_key(self, query_string: str, dry_run: Any = None) -> Optional[str]:
+        """
+        hash of the normalized query and the last modified time of
+        every table it references, None if it should not be cached
+        dry_run: the query's dry run job, if it already ran
+        """
+        query = normalize_sql(query_string)
+        if _NON_DETERMINISTIC.search(query):
+            return None
+        tables = sorted(
+            str(reference)
+            for reference in (dry_run or self._dry_run(query_string)).referenced_tables
+        )
+        versions = [
+            f"{table}@{self._client.get_table(table).modified.isoformat()}"
+            for table in tables
+        ]
+        return hashlib.sha256("\n".join([query] + versions).encode()).hexdigest()
+
     def delete_day(self, date_to_delete: date, str_return: bool = False):
         """
         deletes the passed in day from the
         pre-determined table in GBQ
+
+        Date is compared directly so a table partitioned on Date
+        only scans that day. The bounds are plain strings, BigQuery reads
+        them as the column's type, so a DATE or a TIMESTAMP Date works
+        (a TIMESTAMP keeps the whole day, not only midnight).
+        To swap a day for new data in one job use .replace_day()
         """
+        if isinstance(date_to_delete, datetime):
+            date_to_delete = date_to_delete.date()
+        next_day = date_to_delete + timedelta(days=1)
         query_string = f"""
         DELETE
         FROM `{self._project}.{self._dataset}.{self._table}`
         WHERE
-        EXTRACT(Year FROM `Date`) = {date_to_delete.year}
-        AND
-        EXTRACT(Month FROM `Date`) = {date_to_delete.month}
-        AND
-        EXTRACT(Day FROM `Date`) = {date_to_delete.day}
+        `{self._date_field}` >= '{date_to_delete.strftime("%Y-%m-%d")}'
+        AND `{self._date_field}` < '{next_day.strftime("%Y-%m-%d")}'
         """
 
         if str_return:
             return query_string
 
-        return self._client.query(query_string)
+        self._guard(query_string)
+        return self._client.query(query_string, job_config=self._job_config())
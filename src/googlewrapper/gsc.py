@@ -1,16 +1,100 @@
 """API Wrapper for Google Search Console"""
 
 import datetime as dt
+import hashlib
+import multiprocessing
 import warnings
-from typing import Optional, Any, Union
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from collections.abc import MutableMapping
+from typing import Callable, Optional, Any, Union
+import numpy as np
 import pandas as pd
-from numpy import nan, ndarray
-
-# nan is used in the "_check_branded" method
-# probably can be removed, we just need to check
-# if a list is empty, I'm sure there is a better way
+from pandas.api.types import union_categoricals
 
 from googlewrapper.connect import Connection
+from googlewrapper.branded import BrandMatcher
+from googlewrapper.ctr import CTRAccumulator
+from googlewrapper.arrow import (
+    check_output_format,
+    gsc_ipc_from_json,
+    gsc_record_batch,
+    import_pyarrow,
+    init_gsc_decoder,
+    read_ipc_batch,
+)
+from googlewrapper.cube import GSCCube, missing_columns, rollup_error
+from googlewrapper.cache import TTLCache, user_cache_dir
+from googlewrapper.retention import ResultStore
+from googlewrapper.inspection import URLInspectionQueue
+
+# column dtypes used when compact output is turned on with .set_compact()
+COMPACT_DTYPES = {
+    "Clicks": "int32",
+    "Impressions": "int32",
+    "Ctr": "float32",
+    "Position": "float32",
+}
+COMPACT_DIMENSIONS = ["Query", "Page", "Country", "Device", "Searchappearance"]
+
+
+def compact_frame(gsc_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a cleaned GSC DataFrame to the compact schema
+        - dimension columns (Query, Page...) -> category
+        - Clicks, Impressions -> int32
+        - Ctr, Position -> float32
+
+    :Params:
+    gsc_df: DataFrame from GoogleSearchConsole.clean_resp()
+        type: pd.DataFrame
+    """
+    dtypes: dict[str, str] = {
+        col: "category" for col in COMPACT_DIMENSIONS if col in gsc_df.columns
+    }
+    dtypes.update({k: v for k, v in COMPACT_DTYPES.items() if k in gsc_df.columns})
+    return gsc_df.astype(dtypes)
+
+
+def count_rows(content: bytes) -> int:
+    """
+    Number of rows in a raw searchanalytics.query response, without
+    parsing the JSON
+
+    Every row has exactly one "clicks" key. A quote inside a JSON string
+    is always escaped, so '"clicks":' can only be a key, never part of
+    a query or page
+
+    :Params:
+    content: response body from the API
+        type: bytes
+    """
+    return content.count(b'"clicks":')
+
+
+def concat_pages(pages: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combines the pages of one API pull into a single DataFrame
+
+    Categorical columns are given one shared set of categories first,
+    otherwise pd.concat would turn them back into object strings
+
+    :Params:
+    pages: cleaned DataFrames, one per API response page
+        type: list of pd.DataFrame
+    """
+    if not pages:
+        return pd.DataFrame()
+    if len(pages) == 1:
+        return pages[0]
+    for col in pages[0].columns:
+        if isinstance(pages[0][col].dtype, pd.CategoricalDtype):
+            categories = union_categoricals(
+                [page[col] for page in pages], ignore_order=True
+            ).categories
+            for page in pages:
+                page[col] = page[col].cat.set_categories(categories)
+    return pd.concat(pages)
 
 
 class GoogleSearchConsole:
@@ -23,14 +107,33 @@ class GoogleSearchConsole:
             created from the Connection class by default
             no need to mess with this as long as your
             'client_secret.json' is in PATH
+    site_cache_ttl: seconds the list of sites from .all_sites()
+            is cached for (in memory and on disk), 0 turns it off
+            default: 3600 (1 hour)
+    site_cache_path: file the list of sites is cached in
+            default: gsc_sites.json in the user cache folder
+            (~/.cache/googlewrapper, see googlewrapper.cache.user_cache_dir)
+            each account (client id and token file) has its own entry
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        site_cache_ttl: float = 3600,
+        site_cache_path: Optional[str] = None,
+    ):
 
         # Google API Resourse Object created from
         # Connection class in .connect module
+        self._connection: Optional[Connection] = None
         self.auth = self.__auth()
 
+        # caches the sites().list() response, see .all_sites()
+        self._site_cache = TTLCache(
+            site_cache_path or str(user_cache_dir() / "gsc_sites.json"),
+            site_cache_ttl,
+        )
+        self._site_cache_key = self._account_key()
+
         # default values for dimensions and date values
         # start date is 7 days ago
         # end date is today
@@ -44,17 +147,47 @@ class GoogleSearchConsole:
         self._site_list: list[str] = self.all_sites()
         # assigned using .set_branded()
         self._branded_dict: dict[str, list[str]] = {}
+        self._brand_matchers: dict[str, BrandMatcher] = {}
         # assigned using .set_filters()
         self._filter: Optional[list[dict[str, str]]] = None
+        # assigned using .set_compact()
+        self._compact: bool = False
+        # assigned using .set_output_format()
+        self._output_format: str = "pandas"
+        # assigned using .set_sketches()
+        self._sketches: list[Any] = []
+        # assigned using .set_decode_workers()
+        self._decode_workers: int = 0
+        # assigned using .set_output_retention()
+        self._retain_output: bool = True
+        self._output_max_bytes: Optional[int] = None
+        self._spill_dir: Optional[str] = None
         # assigned in .get_data()
         self._current_site: str = ""
-        self.output: Optional[pd.DataFrame] = None
+        self.output: Optional[MutableMapping[str, Any]] = None
+        # the row_filter of the last pull, its rows can't be rolled up
+        self._last_row_filter: Optional[Union[str, Callable[[Any], Any]]] = None
+        # filled page by page in .get_data(), used by .ctr()
+        self.ctr_accumulator = CTRAccumulator()
         # assigned in .ctr()
         self.my_ctr: Optional[pd.DataFrame] = None
 
     def __auth(self):
         """Authenticates to Google"""
-        return Connection().gsc()
+        self._connection = Connection()
+        return self._connection.gsc()
+
+    def _account_key(self) -> str:
+        """
+        site cache key of the authenticated account, a hash of the
+        OAuth client id and the token file, so accounts and projects
+        sharing the cache file don't get each other's sites
+        """
+        connection = self._connection
+        client_id = getattr(connection and connection.credentials, "client_id", "")
+        token_path = connection.token_path if connection is not None else None
+        account = f"{client_id}|{token_path}".encode()
+        return f"sites-{hashlib.sha256(account).hexdigest()[:16]}"
 
     def __str__(self) -> str:
         if len(self._site_list) > 1:
@@ -165,13 +298,22 @@ class GoogleSearchConsole:
         """
         self._e_date = end_date
 
-    def set_branded(self, branded_dictionary: dict[str, list[str]]) -> None:
+    def set_branded(
+        self,
+        branded_dictionary: dict[str, list[str]],
+        word_boundary: bool = False,
+        ignore_case: bool = False,
+    ) -> None:
         """
         Assigns the self._branded_dict attribute.
         When 'query' is one of the dimensions in self._dims,
         these terms will set the 'Branded' column in the
         final DataFrame output to True.
 
+        A BrandMatcher is built once per site here, so every query
+        is checked against all branded terms in a single pass.
+        Terms are matched literally (not as regular expressions).
+
         This is not required and is None by default.
         This method and attribue have no effect if 'query' is not included in self._dims
 
@@ -180,16 +322,157 @@ class GoogleSearchConsole:
             type: dictionary
             keys: GSC url properties
             values: list of branded strings
+        word_boundary: (optional) only match terms that are whole words
+            type: bool
+            default: False
+        ignore_case: (optional) match terms regardless of case
+            type: bool
+            default: False
         """
         self._branded_dict = branded_dictionary
+        self._brand_matchers = {
+            site: BrandMatcher(
+                terms, word_boundary=word_boundary, ignore_case=ignore_case
+            )
+            for site, terms in branded_dictionary.items()
+            if isinstance(terms, (list, tuple, set))
+        }
+
+    def set_compact(self, compact: bool = True) -> None:
+        """
+        Assigns the self._compact attribute.
+        When True, DataFrames from self.get_data() use a smaller schema:
+            - Query, Page, Country, Device -> category
+              (one set of categories per site, shared by every page of the pull)
+            - Clicks, Impressions -> int32
+            - Ctr, Position -> float32
+
+        On page/query pulls this cuts memory use several times over,
+        since every repeated URL/query string is only stored once
+
+        By default this is False (object strings, int64 and float64)
+
+        :Params:
+        compact: use the compact schema or not
+            type: bool
+        """
+        self._compact = compact
 
-    def all_sites(self, site_filters: Optional[list[str]] = None) -> list[str]:
+    def set_output_format(self, output_format: str = "pandas") -> None:
+        """
+        Assigns the self._output_format attribute.
+        This controls what self.get_data() returns for each site
+
+        "pandas" (default): pd.DataFrame built with self.clean_resp()
+        "arrow": pyarrow.Table, each API page is decoded straight into a
+                 pyarrow.RecordBatch without going through pandas.
+                 Requires pyarrow (pip install googlewrapper[arrow])
+                 Use googlewrapper.arrow.write_parquet_dataset() to save it
+
+        :Params:
+        output_format: "pandas" or "arrow"
+            type: str
+        """
+        self._output_format = check_output_format(output_format)
+
+    def set_output_retention(
+        self,
+        retain: bool = True,
+        max_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        """
+        Controls how self.get_data() keeps results in self.output
+
+        By default every site's data is kept in memory until the next pull.
+        With max_bytes, self.output becomes a ResultStore: once the sites
+        in memory go over max_bytes, the oldest ones are written to Arrow
+        files in spill_dir and memory-mapped back when accessed (Arrow
+        output stays mapped, a pd.DataFrame is copied out of the file on
+        each access). Requires pyarrow (pip install googlewrapper[arrow])
+
+        With retain=False nothing is kept, self.output is None after the
+        pull and the data only lives in what .get_data() returns.
+        .ctr() still works, it does not need the raw rows
+
+        :Params:
+        retain: keep results in self.output or not
+            type: bool
+            default: True
+        max_bytes: (optional) memory budget for self.output
+            type: int
+            default: None (no limit)
+        spill_dir: (optional) folder for spilled results
+            type: str
+            default: a temporary folder
+        """
+        if max_bytes is not None:
+            import_pyarrow()
+        self._retain_output = retain
+        self._output_max_bytes = max_bytes
+        self._spill_dir = spill_dir
+
+    def set_decode_workers(self, workers: int = 0) -> None:
+        """
+        Assigns the self._decode_workers attribute.
+        When more than 0, self.get_data() decodes API pages (including the
+        branded check and dtype conversions) in a pool of this many
+        worker processes while the main process keeps requesting pages.
+        The main process does not parse the responses, the raw JSON bytes
+        go to the workers and pages come back as Arrow IPC bytes, so no
+        rows or DataFrames are pickled. The brand matchers are sent once
+        when each worker starts. Workers are started with "spawn", it is
+        not safe to fork while the page requests are running.
+        Requires pyarrow (pip install googlewrapper[arrow])
+
+        Worth it on large pulls with many cores, for small pulls the
+        cost of starting the processes is bigger than the savings
+
+        :Params:
+        workers: number of decode processes, 0 decodes in this process
+            type: int
+            default: 0
+        """
+        if workers:
+            import_pyarrow()
+        self._decode_workers = workers
+
+    def set_sketches(self, sketches: list[Any]) -> None:
+        """
+        Assigns the self._sketches attribute. Every page of data pulled
+        with self.get_data() (after row_filter, before columns) is fed into
+        these sketches, for all sites in self._site_list
+
+        Combined with .set_output_retention(retain=False) this gives
+        distinct counts and top queries/pages in a few KB of memory
+
+        :Example:
+            from googlewrapper.sketches import HyperLogLog, HeavyHitters
+            distinct_queries = HyperLogLog("Query")
+            top_queries = HeavyHitters("Query", weight="Clicks")
+            gsc.set_sketches([distinct_queries, top_queries])
+            gsc.get_data()
+            distinct_queries.count(), top_queries.top(25)
+
+        :Params:
+        sketches: objects from googlewrapper.sketches
+            (HyperLogLog, CountMinSketch, HeavyHitters)
+            type: list
+        """
+        self._sketches = list(sketches)
+
+    def all_sites(
+        self, site_filters: Optional[list[str]] = None, refresh: bool = False
+    ) -> list[str]:
         """
         returns a list of all verfied sites that you have in GSC.
 
         It will give you all properties by default, but can be
         filtered using the site_filters parameter.
 
+        The list comes from self.site_permissions(), which is cached
+        for site_cache_ttl seconds (see the class parameters)
+
         :Example:
             site_filters = ['example','test']
         This would only return properties that contain the word 'example' or 'test'
@@ -197,13 +480,14 @@ class GoogleSearchConsole:
         :Params:
         site_filters: (optional) strings to include if found in property urls
             type: list
+        refresh: (optional) skip the cache and ask the API
+            type: bool
+            default: False
         """
-        site_list = self.auth.sites().list().execute()
         clean_list: list[str] = [
-            s["siteUrl"]
-            for s in site_list["siteEntry"]
-            if s["permissionLevel"] != "siteUnverifiedUser"
-            and s["siteUrl"][:4] == "http"
+            site
+            for site, permission in self.site_permissions(refresh).items()
+            if permission != "siteUnverifiedUser" and site[:4] == "http"
         ]
         if isinstance(site_filters, list):
             return [
@@ -213,9 +497,71 @@ class GoogleSearchConsole:
             ]
         return clean_list
 
+    def site_permissions(self, refresh: bool = False) -> dict[str, str]:
+        """
+        returns a dictionary of every site in GSC
+            keys: site urls
+            values: permission level (ex. 'siteOwner', 'siteUnverifiedUser')
+
+        Served from the site cache when it is fresh,
+        otherwise calls sites().list() and refreshes the cache
+
+        :Params:
+        refresh: (optional) skip the cache and ask the API
+            type: bool
+            default: False
+        """
+        permissions: Optional[dict[str, str]] = None
+        if not refresh:
+            permissions = self._site_cache.get(self._site_cache_key)
+        if permissions is None:
+            site_list = self.auth.sites().list().execute()
+            permissions = {
+                s["siteUrl"]: s["permissionLevel"]
+                for s in site_list.get("siteEntry", [])
+            }
+            self._site_cache.set(self._site_cache_key, permissions)
+        return permissions
+
+    def invalidate_site_cache(self) -> None:
+        """
+        Clears the cached list of sites (memory and disk)
+        the next .all_sites() call will ask the API
+        """
+        self._site_cache.invalidate(self._site_cache_key)
+
+    def url_inspection_queue(
+        self, db_path: str = "./credentials/url_inspection.db", **kwargs: Any
+    ) -> URLInspectionQueue:
+        """
+        Returns a URLInspectionQueue using this connection
+        add urls with .add(site, urls), then inspect them with .run()
+        the queue and results are saved in db_path between runs
+
+        Unlike the caches (see googlewrapper.cache.user_cache_dir) the
+        file is kept per working directory on purpose, next to the
+        account's token in ./credentials: it holds inspection results
+        that can't be pulled again, and each project/account works
+        through its own queue
+
+        :Params:
+        db_path: SQLite file for the queue and results
+            type: str
+            default: './credentials/url_inspection.db'
+        **kwargs: passed to URLInspectionQueue
+            (ex. daily_quota, minute_quota, recheck_days, max_workers)
+        """
+        if self._connection is not None and self._connection.credentials is not None:
+            kwargs.setdefault("thread_http", self._connection.thread_http())
+        return URLInspectionQueue(self.auth, db_path, **kwargs)
+
     def _build_request(
-        self, agg_type: str = "auto", limit: int = 25000, start_row: int = 0
-    ) -> dict[Any, Any]:
+        self,
+        agg_type: str = "auto",
+        limit: int = 25000,
+        start_row: int = 0,
+        raw: bool = False,
+    ) -> Any:
         """
         Creates a dictionary object that will be used in the API request.
         This dicionary object contains specific attributes necessary for
@@ -247,6 +593,8 @@ class GoogleSearchConsole:
             defaults 25000
         start_row: (optional) where to start, if need more than 25,000
             defaults 0
+        raw: (optional) return the response body (bytes) without parsing it
+            defaults False
         """
 
         request_data = {
@@ -259,9 +607,9 @@ class GoogleSearchConsole:
             "dimensionFilterGroups": [{"filters": self._filter}],
         }
 
-        return self._execute_request(request_data)
+        return self._execute_request(request_data, raw)
 
-    def _execute_request(self, request: dict[Any, Any]) -> dict[Any, Any]:
+    def _execute_request(self, request: dict[Any, Any], raw: bool = False) -> Any:
         """
         Executes a searchAnalytics.query request based on the
         dictionary created in self._build_request()
@@ -269,23 +617,36 @@ class GoogleSearchConsole:
         This method should not be called directly.
 
         Returns an dictionary of GSC response rows.
+        (or the response body as bytes when raw is True)
 
         :Params:
         request: dictionary created from the self._build_request() method
             type: dict
+        raw: skip parsing the JSON, see self.set_decode_workers()
+            type: bool
         """
-        gsc_query_result: dict[Any, Any] = (
-            self.auth.searchanalytics()
-            .query(siteUrl=self._current_site, body=request)
-            .execute()
+        query = self.auth.searchanalytics().query(
+            siteUrl=self._current_site, body=request
         )
+        if raw:
+            query.postproc = lambda resp, content: content
+        gsc_query_result = query.execute()
 
         return gsc_query_result
 
-    def clean_resp(self, data: dict[Any, Any]) -> pd.DataFrame:
+    def clean_resp(
+        self,
+        data: dict[Any, Any],
+        row_filter: Optional[Union[str, Callable[[pd.DataFrame], Any]]] = None,
+    ) -> pd.DataFrame:
         """
         Takes raw response, and cleans the data into a pd.Dataframe
 
+        Columns are built straight from the response rows, and the
+        row_filter is applied before the more expensive steps
+        (branded check, date conversion, compact dtypes) so rows that
+        are filtered out are never fully cleaned
+
         Returns a pd.DataFrame
             columns: self._dims
             rows: GSC data from API request
@@ -293,14 +654,22 @@ class GoogleSearchConsole:
         :Params:
         data: response dictionary from self._execute_request()
             type: dictionary
+        row_filter: (optional) rows to keep, see self.get_data()
+            type: str (pd.DataFrame.eval expression) or callable
         """
-        raw_df = pd.DataFrame(data["rows"])
+        rows = data["rows"]
+        count = len(rows)
+        columns: dict[str, Any] = {
+            name.capitalize(): np.fromiter(
+                (r[name] for r in rows), dtype=np.float64, count=count
+            )
+            for name in ["clicks", "impressions", "ctr", "position"]
+        }
+        keys = list(zip(*(r["keys"] for r in rows))) or [()] * len(self._dims)
+        for dim, values in zip(self._dims, keys):
+            columns[dim.capitalize()] = np.array(values, dtype=object)
+        raw_df = pd.DataFrame(columns)
         raw_df.index.name = "idx"
-        keys = raw_df["keys"].apply(pd.Series)
-        keys.columns = self._dims
-        raw_df = raw_df.merge(keys, how="left", on="idx")
-        raw_df.drop(columns="keys", inplace=True)
-        raw_df.columns = raw_df.columns.str.capitalize()
 
         # branded check
         if isinstance(self._branded_dict, dict) and "Query" in raw_df.columns:
@@ -314,32 +683,142 @@ class GoogleSearchConsole:
             int
         )
 
-        return raw_df
+        if self._compact:
+            raw_df = compact_frame(raw_df)
+
+        # local filter on the finished page, same as with decode workers
+        return self._filter_rows(raw_df, row_filter)
+
+    @staticmethod
+    def _filter_rows(
+        raw_df: pd.DataFrame,
+        row_filter: Optional[Union[str, Callable[[Any], Any]]] = None,
+    ) -> pd.DataFrame:
+        """Keeps the rows of a finished page matching row_filter"""
+        if row_filter is None:
+            return raw_df
+        if isinstance(row_filter, str):
+            mask = raw_df.eval(row_filter)
+        else:
+            mask = row_filter(raw_df)
+        return raw_df.loc[np.asarray(mask, dtype=bool)]
+
+    def _decode_page(
+        self,
+        data: dict[Any, Any],
+        row_filter: Optional[Union[str, Callable[[Any], Any]]] = None,
+    ) -> Any:
+        """
+        Decodes one API response page in the active output format
+        pd.DataFrame (self.clean_resp()) or pyarrow.RecordBatch
 
-    def _check_branded(self, query_list: pd.Series) -> pd.Series:
+        :Params:
+        data: response dictionary from self._execute_request()
+            type: dictionary
+        row_filter: (optional) rows to keep, see self.get_data()
+        """
+        if self._output_format == "arrow":
+            if isinstance(row_filter, str):
+                raise ValueError(
+                    "Arrow output only accepts a callable row_filter"
+                    " (RecordBatch -> boolean mask)"
+                )
+            batch = gsc_record_batch(
+                data["rows"],
+                self._dims,
+                self._brand_matchers.get(self._current_site),
+                self._compact,
+            )
+            if row_filter is not None:
+                batch = batch.filter(row_filter(batch))
+            return batch
+        return self.clean_resp(data, row_filter)
+
+    def _from_ipc(
+        self,
+        buffer: bytes,
+        row_filter: Optional[Union[str, Callable[[Any], Any]]] = None,
+    ) -> Any:
+        """
+        Turns a page decoded by a worker process (Arrow IPC bytes)
+        into the active output format, then applies the row_filter
+        the same way self._decode_page() does
+        """
+        batch = read_ipc_batch(buffer)
+        if self._output_format == "arrow":
+            if isinstance(row_filter, str):
+                raise ValueError(
+                    "Arrow output only accepts a callable row_filter"
+                    " (RecordBatch -> boolean mask)"
+                )
+            if row_filter is not None:
+                batch = batch.filter(row_filter(batch))
+            return batch
+
+        raw_df = batch.to_pandas()
+        raw_df.index.name = "idx"
+        if "Date" in raw_df.columns:
+            raw_df["Date"] = pd.to_datetime(raw_df["Date"])
+        return self._filter_rows(raw_df, row_filter)
+
+    def _keep_page(
+        self, page: Any, pages: list[Any], columns: Optional[list[str]]
+    ) -> None:
+        """Feeds a decoded page to the CTR curve and sketches, then keeps it"""
+        self.ctr_accumulator.add(page)
+        for sketch in self._sketches:
+            sketch.update(page)
+        pages.append(self._project(page, columns))
+
+    @staticmethod
+    def _project(page: Any, columns: Optional[list[str]]) -> Any:
+        """Keeps only the requested columns of a decoded page"""
+        if columns is None:
+            return page
+        if isinstance(page, pd.DataFrame):
+            return page[columns]
+        return page.select(columns)
+
+    def _combine_pages(self, pages: list[Any]) -> Any:
+        """Combines the decoded pages of one site"""
+        if self._output_format == "arrow":
+            pa = import_pyarrow()
+            if not pages:
+                return pa.table({})
+            return pa.Table.from_batches(pages)
+        return concat_pages(pages)
+
+    def _check_branded(self, query_list: pd.Series) -> Union[bool, pd.Series]:
         """
         Takes in a pd.Series of queries (from self.clean_resp())
         and returns a pd.Series of booleans on if the
         query contains any word from the self._branded_dict
 
+        Uses the BrandMatcher built for the current site in self.set_branded()
+
         :Params:
         query_list: 'queries' from GSC API request
             type: pd.Series
         """
-        try:
-            branded_list: list[str] = self._branded_dict[self._current_site]
-        except KeyError:
-            return False
-        if branded_list in [nan, [], [""]]:
+        matcher = self._brand_matchers.get(self._current_site)
+        if not matcher:
             return False
-        return pd.Series(query_list).str.contains("|".join(branded_list), na=False)
+        return matcher.classify(query_list)
 
-    def get_data(self) -> Union[dict[Any, Any], pd.DataFrame]:
+    def get_data(
+        self,
+        columns: Optional[list[str]] = None,
+        row_filter: Optional[Union[str, Callable[[Any], Any]]] = None,
+    ) -> Union[MutableMapping[str, Any], pd.DataFrame]:
         """
         Main method to access data.
         Loops through the self._site_list
         calls self._build_request() -> self._execute_request()
 
+        Pages of 25,000 rows are pulled until a page comes back short.
+        The next page is requested in the background while the
+        current one is being cleaned
+
         cleans the response using self.clean_resp()
 
         Creates a dictionary named 'gsc_analytics_data'
@@ -349,6 +828,27 @@ class GoogleSearchConsole:
         Once all properties have been accounted for the attribute
         'self.output' is assigned the value of 'gsc_analytics_data'
 
+        With .set_output_format("arrow") the values are pyarrow.Tables
+
+        columns and row_filter are applied to each page as it is decoded,
+        so rows and columns you don't need are never kept.
+        self.ctr_accumulator sees the filtered rows before projection
+
+        :Params:
+        columns: (optional) columns to keep, in this order
+            type: list of strings
+            example: ["Page", "Query", "Clicks"]
+        row_filter: (optional) rows to keep
+            type: str - a pd.DataFrame.eval expression
+                        example: "Impressions > 10 and Position <= 20"
+                  callable - takes the page (pd.DataFrame, or
+                        pyarrow.RecordBatch for arrow output)
+                        and returns a boolean mask
+                        example: lambda df: df["Page"].str.contains("/blog/")
+            the filter runs on the finished page (Date is a datetime,
+            or a date for arrow output, and Branded is set), with or
+            without .set_decode_workers()
+
         this final dictionary of 'gsc_analytics_data' is returned.
         """
         # check to make sure self._site_list is
@@ -364,44 +864,158 @@ class GoogleSearchConsole:
         except TypeError:
             raise TypeError("Please make sure your site list is list like")
 
-        gsc_analytics_data = {}
-        for site_name in self._site_list:
-            self._current_site = site_name
-            start = 0
-            row_limit = 25000
-            temp_df = pd.DataFrame()
-            # loop through the api grabbing the maximum rows possible
-            while True:
-                # get the data from the api
-                response = self._build_request(limit=row_limit, start_row=start)
-                # if rows is in response.keys, we have data from the API
-                if "rows" in response.keys():
-                    cleaned_df = self.clean_resp(response)
-                    temp_df = temp_df.append(cleaned_df)
+        gsc_analytics_data: MutableMapping[str, Any] = {}
+        if self._output_max_bytes is not None:
+            gsc_analytics_data = ResultStore(self._output_max_bytes, self._spill_dir)
+        self.ctr_accumulator = CTRAccumulator()
+        # one background thread requests the next page while we decode the
+        # current one, only one request is ever in flight at a time
+        # with .set_decode_workers() pages are decoded in worker processes
+        decoder: Any = nullcontext()
+        if self._decode_workers:
+            decoder = ProcessPoolExecutor(
+                max_workers=self._decode_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_gsc_decoder,
+                initargs=(self._dims, self._brand_matchers, self._compact),
+            )
+        with ThreadPoolExecutor(max_workers=1) as prefetcher, decoder as pool:
+            for site_name in self._site_list:
+                self._current_site = site_name
+                start = 0
+                row_limit = 25000
+                pages: list[Any] = []
+                decoding: list[Future[bytes]] = []
+                # with workers the responses are not parsed here, see
+                # .set_decode_workers()
+                raw = pool is not None
+                next_page: Optional[Future[Any]] = prefetcher.submit(
+                    self._build_request, limit=row_limit, start_row=start, raw=raw
+                )
+                # loop through the api grabbing the maximum rows possible
+                while next_page is not None:
+                    response = next_page.result()
+                    if raw:
+                        row_count = count_rows(response)
+                    else:
+                        row_count = len(response.get("rows", []))
+                    # if there are no rows, we have pulled the max rows
+                    if not row_count:
+                        break
+                    # a full page means there could be more rows, ask for them now
+                    # a short page is the last one, no need to ask for an empty page
                     start += row_limit
-                # if not, we have pulled the max rows, we need to break/go to next property
-                else:
-                    break
-            # assign the temp_df (current_site_df) to our final dict
-            gsc_analytics_data[site_name] = temp_df
+                    next_page = None
+                    if row_count >= row_limit:
+                        next_page = prefetcher.submit(
+                            self._build_request,
+                            limit=row_limit,
+                            start_row=start,
+                            raw=raw,
+                        )
+                    if pool is None:
+                        cleaned_df = self._decode_page(response, row_filter)
+                        self._keep_page(cleaned_df, pages, columns)
+                    else:
+                        decoding.append(
+                            pool.submit(gsc_ipc_from_json, response, site_name)
+                        )
+                # collect pages decoded by the workers, in order
+                for decoded in decoding:
+                    cleaned_df = self._from_ipc(decoded.result(), row_filter)
+                    self._keep_page(cleaned_df, pages, columns)
+                # assign the temp_df (current_site_df) to our final dict
+                temp_df = self._combine_pages(pages)
+                gsc_analytics_data[site_name] = temp_df
 
         # declare the data as output and save to class
-        # this could be large, could have memory issues, need to
-        # look into this
-        self.output = gsc_analytics_data
+        # this could be large, see .set_output_retention() to limit it
+        self.output = gsc_analytics_data if self._retain_output else None
+        self._last_row_filter = row_filter
 
         # if we only have one site we are pulling for, we can just return the
         # df, no need to have it sent as a dictionary
         if len(gsc_analytics_data.keys()) == 1:
-            return temp_df
+            return gsc_analytics_data[self._site_list[0]]
 
         return gsc_analytics_data
 
+    def rollup(self, dimensions: list[str]) -> Union[dict[Any, Any], pd.DataFrame, Any]:
+        """
+        Used after we have called .get_data()
+        Returns the data aggregated to a coarser set of dimensions
+
+        When the last .get_data() pull can be rolled up exactly
+        (see googlewrapper.cube.rollup_error) the answer is built locally
+        with a GSCCube, no API call needed. Otherwise (ex. dropping "query",
+        which would leave out anonymized queries, a pull made with
+        columns that left out Clicks, Impressions or Position, or a pull
+        made with a row_filter, which would only total the rows kept)
+        the data is pulled from the API with these dimensions instead.
+        Either way self.output, self._dims, self.ctr_accumulator and the
+        sketches (.set_sketches()) are left as they were.
+
+        Returns the same shape as .get_data()
+
+        :Params:
+        dimensions: dimensions to aggregate by
+            type: list
+            example: ["page"]
+        """
+        if self.output and self._can_rollup(dimensions):
+            rolled = {
+                site: GSCCube(site_df, self._dims).rollup(dimensions)
+                for site, site_df in self.output.items()
+            }
+            if len(rolled) == 1:
+                return list(rolled.values())[0]
+            return rolled
+
+        # can not be answered locally, pull it without losing the current data
+        # the sketches only follow pulls made with .get_data()
+        current = (
+            self._dims,
+            self.output,
+            self.ctr_accumulator,
+            self._sketches,
+            self._last_row_filter,
+        )
+        self._dims = dimensions
+        self._sketches = []
+        try:
+            return self.get_data()
+        finally:
+            (
+                self._dims,
+                self.output,
+                self.ctr_accumulator,
+                self._sketches,
+                self._last_row_filter,
+            ) = current
+
+    def _can_rollup(self, dimensions: list[str]) -> bool:
+        """True when every site in self.output can be rolled up locally"""
+        if not self.output or self._last_row_filter is not None:
+            return False
+        if rollup_error(self._dims, dimensions) is not None:
+            return False
+        return not any(
+            missing_columns(
+                list(getattr(site_df, "column_names", site_df.columns)), self._dims
+            )
+            for site_df in self.output.values()
+        )
+
     def ctr(self) -> dict[str, pd.DataFrame]:
         """
         Used after we have called .get_data()
         Calulcates a custom click curve for the given data that you have pulled
 
+        The curve is built from self.ctr_accumulator, which is filled
+        page by page while .get_data() runs, so the raw rows do not need
+        to be kept around. For curves by Device or Country use
+        self.ctr_accumulator.curves("Device") / .curve(device="MOBILE")
+
         Returns
         a dictionary with the following keys:
             - "all"
@@ -423,7 +1037,7 @@ class GoogleSearchConsole:
             and will thus inflate your numbers if we don't separate them
             declare branded queries using .set_branded()
         """
-        if not self.output:
+        if not self.ctr_accumulator:
             raise AttributeError("Please run .get_data() prior to running .ctr()")
 
         if "query" not in self._dims:
@@ -440,61 +1054,14 @@ class GoogleSearchConsole:
                 " It is reccomented to assign brand words to ensure accurate CTR numbers."
             )
 
-        # declare function to group by position and get CTR
-        def calculate_ctr(gsc_df: pd.DataFrame, col: str) -> pd.DataFrame:
-            """
-            this groups by position and gives us our CTR
-
-            df: type: pd.DataFrame
-                data from the .get_data() formated as a pd.DataFrame
-                this will group all sites in self._site_list together
-            col: type: str
-                is the string name of the column to groupby
-                normally this should be 'Pos'
-                as declared in .ctr() scope
-            """
-            ctr = gsc_df.groupby(col).sum()
-            ctr["CTR"] = ctr["Clicks"] / ctr["Impressions"]
-
-            if self._branded_dict:
-                return ctr.drop(columns="Branded")
-
-            return ctr
-
-        # create the dataframe from response dictionary - .get_data() response
-        response_df = pd.DataFrame()
-        for site_name in self.output:
-            response_df = response_df.append(self.output[site_name])
-        # create the rounded position column
-        response_df["Pos"] = response_df["Position"].round(0)
-
-        # we only want to consider those queries in the top 100 positions
-        # also, we only want Clicks, Impressions, and Pos, the rest doesn't matter
-        if self._branded_dict:
-            response_df = response_df.loc[response_df["Pos"] <= 100][
-                ["Clicks", "Impressions", "Pos", "Branded"]
-            ].copy()
-        else:
-            response_df = response_df.loc[response_df["Pos"] <= 100][
-                ["Clicks", "Impressions", "Pos"]
-            ].copy()
-
         # create the first dictionary object including all data
-        ctr_data = {"all": calculate_ctr(response_df, "Pos")}
+        ctr_data = {"all": self.ctr_accumulator.curve()}
 
-        # if Branded is in the columns we will separate the click curves into
+        # if we have branded terms we will separate the click curves into
         # Branded vs Non-Branded and return both as well
         if self._branded_dict:
-            # use that function to get our custom CTR
-            ctr_b = calculate_ctr(
-                response_df.loc[response_df["Branded"] is True].copy(), "Pos"
-            )
-            ctr_nb = calculate_ctr(
-                response_df.loc[response_df["Branded"] is False].copy(), "Pos"
-            )
-
-            ctr_data["branded"] = ctr_b
-            ctr_data["non-branded"] = ctr_nb
+            ctr_data["branded"] = self.ctr_accumulator.curve(branded=True)
+            ctr_data["non-branded"] = self.ctr_accumulator.curve(branded=False)
 
         self.my_ctr = ctr_data
 
@@ -0,0 +1,368 @@
+"""Quota aware bulk URL Inspection for Google Search Console"""
+
+import datetime as dt
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import zip_longest
+from typing import Any, Iterable, Optional
+
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from .connect import ThreadLocalHttp
+
+# columns saved from each inspection result
+RESULT_FIELDS = {
+    "verdict": ("indexStatusResult", "verdict"),
+    "coverage_state": ("indexStatusResult", "coverageState"),
+    "indexing_state": ("indexStatusResult", "indexingState"),
+    "robots_txt_state": ("indexStatusResult", "robotsTxtState"),
+    "page_fetch_state": ("indexStatusResult", "pageFetchState"),
+    "last_crawl_time": ("indexStatusResult", "lastCrawlTime"),
+    "google_canonical": ("indexStatusResult", "googleCanonical"),
+    "user_canonical": ("indexStatusResult", "userCanonical"),
+    "mobile_verdict": ("mobileUsabilityResult", "verdict"),
+    "rich_results_verdict": ("richResultsResult", "verdict"),
+}
+
+
+class _MinuteLimiter:
+    """Blocks until a call is allowed under `limit` calls per 60 seconds"""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._calls: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) < self.limit:
+                    self._calls.append(now)
+                    return
+                sleep_for = 60 - (now - self._calls[0])
+            time.sleep(sleep_for)
+
+
+class URLInspectionQueue:
+    """
+    Persistent queue of URLs to run through the URL Inspection API
+    (urlInspection.index.inspect), stored in a local SQLite file
+
+    URLs are added with .add(), then .run() inspects as many as the
+    quota allows. Each property has its own daily and per minute quota,
+    so .run() interleaves properties and keeps every property's per
+    minute quota busy at the same time. Anything not inspected stays
+    queued for the next run (ex. tomorrow, once the daily quota resets).
+
+    URLs inspected within recheck_days are skipped when added again.
+    Results are saved in the same file, see .results()
+
+    Created with GoogleSearchConsole.url_inspection_queue()
+
+    Parameters
+    service: searchconsole v1 resource object (GoogleSearchConsole().auth)
+    db_path: SQLite file for the queue and results
+        default: "url_inspection.db"
+    daily_quota: inspections per property per day
+        default: 2000
+    minute_quota: inspections per property per minute
+        default: 600
+    recheck_days: skip URLs inspected less than this many days ago
+        default: 7
+    max_workers: inspections running at the same time
+        default: 8
+    thread_http: ThreadLocalHttp from Connection.thread_http()
+        without it requests are sent one at a time
+    language_code: language for the inspection messages
+        default: "en-US"
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        db_path: str = "url_inspection.db",
+        daily_quota: int = 2000,
+        minute_quota: int = 600,
+        recheck_days: float = 7,
+        max_workers: int = 8,
+        thread_http: Optional[ThreadLocalHttp] = None,
+        language_code: str = "en-US",
+    ) -> None:
+        self.service = service
+        self.db_path = db_path
+        self.daily_quota = daily_quota
+        self.minute_quota = minute_quota
+        self.recheck_days = recheck_days
+        self.max_workers = max_workers if thread_http is not None else 1
+        self.thread_http = thread_http
+        self.language_code = language_code
+        self._db = sqlite3.connect(db_path)
+        self.__create_tables()
+
+    def __repr__(self) -> str:
+        return f"<URLInspectionQueue {self.db_path} pending={self.pending()}>"
+
+    def __create_tables(self) -> None:
+        result_columns = ", ".join(f"{name} TEXT" for name in RESULT_FIELDS)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                "site TEXT, url TEXT, added REAL, last_error TEXT,"
+                " PRIMARY KEY (site, url)) WITHOUT ROWID"
+            )
+            # queue files made before last_error was added
+            queue_columns = [
+                row[1] for row in self._db.execute("PRAGMA table_info(queue)")
+            ]
+            if "last_error" not in queue_columns:
+                self._db.execute("ALTER TABLE queue ADD COLUMN last_error TEXT")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                f"site TEXT, url TEXT, inspected REAL, {result_columns}, error TEXT,"
+                " PRIMARY KEY (site, url)) WITHOUT ROWID"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "site TEXT, day TEXT, calls INTEGER, PRIMARY KEY (site, day)"
+                ") WITHOUT ROWID"
+            )
+
+    @staticmethod
+    def _today() -> str:
+        # quotas reset at midnight Pacific time, UTC-8 is close enough
+        now = dt.datetime.now(dt.timezone.utc) - dt.timedelta(hours=8)
+        return now.strftime("%Y-%m-%d")
+
+    def add(self, site: str, urls: Iterable[str]) -> int:
+        """
+        Queues urls for a GSC property
+
+        Returns the number of urls added (already queued URLs and URLs
+        inspected within recheck_days are skipped)
+
+        :Params:
+        site: GSC property the urls belong to
+            type: str
+            example: "sc-domain:example.com"
+        urls: full urls to inspect
+            type: list of strings
+        """
+        cutoff = time.time() - self.recheck_days * 86400
+        recent = {
+            row[0]
+            for row in self._db.execute(
+                "SELECT url FROM results WHERE site = ? AND inspected >= ?"
+                " AND error IS NULL",
+                (site, cutoff),
+            )
+        }
+        now = time.time()
+        new_rows = [
+            (site, url, now) for url in dict.fromkeys(urls) if url not in recent
+        ]
+        with self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO queue (site, url, added) VALUES (?, ?, ?)",
+                new_rows,
+            )
+            return self._db.total_changes - before
+
+    def pending(self, site: Optional[str] = None) -> int:
+        """number of urls waiting to be inspected (for one site or all)"""
+        if site is None:
+            return int(self._db.execute("SELECT COUNT(*) FROM queue").fetchone()[0])
+        return int(
+            self._db.execute(
+                "SELECT COUNT(*) FROM queue WHERE site = ?", (site,)
+            ).fetchone()[0]
+        )
+
+    def remaining_quota(self, site: str) -> int:
+        """inspections left today for a site"""
+        used = self._db.execute(
+            "SELECT calls FROM usage WHERE site = ? AND day = ?", (site, self._today())
+        ).fetchone()
+        return max(self.daily_quota - (used[0] if used else 0), 0)
+
+    def _plan(self, limit: Optional[int]) -> list[tuple[str, str]]:
+        """
+        Picks the (site, url) pairs to inspect this run:
+        oldest urls first, up to each site's remaining daily quota,
+        interleaved across sites so every site's minute quota is used
+        """
+        per_site = []
+        for (site,) in self._db.execute("SELECT DISTINCT site FROM queue").fetchall():
+            rows = self._db.execute(
+                "SELECT site, url FROM queue WHERE site = ? ORDER BY added LIMIT ?",
+                (site, self.remaining_quota(site)),
+            ).fetchall()
+            per_site.append(rows)
+        plan = [pair for group in zip_longest(*per_site) for pair in group if pair]
+        return plan[:limit] if limit is not None else plan
+
+    def _inspect(self, site: str, url: str, limiter: _MinuteLimiter) -> dict[str, Any]:
+        limiter.wait()
+        request = (
+            self.service.urlInspection()
+            .index()
+            .inspect(
+                body={
+                    "inspectionUrl": url,
+                    "siteUrl": site,
+                    "languageCode": self.language_code,
+                }
+            )
+        )
+        http = self.thread_http.get() if self.thread_http is not None else None
+        response: dict[str, Any] = request.execute(http=http)
+        return response
+
+    def _record(self, site: str, url: str, response: Any, error: Optional[str]) -> None:
+        values: dict[str, Any] = {name: None for name in RESULT_FIELDS}
+        if response is not None:
+            result = response.get("inspectionResult", {})
+            for name, (section, field) in RESULT_FIELDS.items():
+                values[name] = result.get(section, {}).get(field)
+        columns = ["site", "url", "inspected", *RESULT_FIELDS, "error"]
+        row = [site, url, time.time(), *values.values(), error]
+        with self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO results ({', '.join(columns)})"
+                f" VALUES ({', '.join('?' * len(columns))})",
+                row,
+            )
+            self._db.execute(
+                "DELETE FROM queue WHERE site = ? AND url = ?", (site, url)
+            )
+
+    def _queue_error(self, site: str, url: str, error: str) -> None:
+        """saves why a url that stays queued could not be inspected"""
+        with self._db:
+            self._db.execute(
+                "UPDATE queue SET last_error = ? WHERE site = ? AND url = ?",
+                (error, site, url),
+            )
+
+    def _count_call(self, site: str) -> None:
+        with self._db:
+            self._db.execute(
+                "INSERT INTO usage VALUES (?, ?, 1) ON CONFLICT (site, day)"
+                " DO UPDATE SET calls = calls + 1",
+                (site, self._today()),
+            )
+
+    def run(self, limit: Optional[int] = None) -> int:
+        """
+        Inspects queued urls until the queue is empty, every site is out
+        of daily quota, or limit urls have been inspected
+
+        Returns the number of urls inspected
+
+        Any other error than an API error (ex. a timeout) stops the run:
+        requests not sent yet are cancelled, the ones already running are
+        saved, then the error is raised. The url stays queued with the
+        error in .queued()
+
+        :Params:
+        limit: (optional) most urls to inspect in this run
+            type: int
+        """
+        plan = self._plan(limit)
+        limiters = {site: _MinuteLimiter(self.minute_quota) for site, _ in plan}
+        out_of_quota: set[str] = set()
+        inspected = 0
+        failure: Optional[Exception] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._inspect, site, url, limiters[site]): (site, url)
+                for site, url in plan
+            }
+            # results are written from this thread only (sqlite connection)
+            for future in as_completed(futures):
+                site, url = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    response = future.result()
+                except HttpError as error:
+                    self._count_call(site)
+                    status = int(error.resp.status)
+                    if status == 429 or site in out_of_quota:
+                        # quota used up, keep the url queued for next time
+                        out_of_quota.add(site)
+                        for other, pair in futures.items():
+                            if pair[0] == site:
+                                other.cancel()
+                        self._queue_error(site, url, str(error))
+                    elif status < 500:
+                        # the url itself is the problem, don't retry it
+                        self._record(site, url, None, str(error))
+                    else:
+                        self._queue_error(site, url, str(error))
+                    continue
+                except Exception as error:
+                    # keep the url queued, send nothing new and save what
+                    # is already running before raising
+                    self._count_call(site)
+                    self._queue_error(site, url, repr(error))
+                    if failure is None:
+                        failure = error
+                        for other in futures:
+                            other.cancel()
+                    continue
+                self._count_call(site)
+                self._record(site, url, response, None)
+                inspected += 1
+
+        if failure is not None:
+            raise failure
+        return inspected
+
+    def results(self, site: Optional[str] = None) -> pd.DataFrame:
+        """
+        Returns the saved inspection results as a pd.DataFrame
+        "inspected" is the time of the inspection
+
+        :Params:
+        site: (optional) only this GSC property
+            type: str
+        """
+        query = "SELECT * FROM results"
+        params: tuple[str, ...] = ()
+        if site is not None:
+            query += " WHERE site = ?"
+            params = (site,)
+        results = pd.read_sql_query(query, self._db, params=params)
+        results["inspected"] = pd.to_datetime(results["inspected"], unit="s")
+        return results
+
+    def queued(self, site: Optional[str] = None) -> pd.DataFrame:
+        """
+        Returns the urls waiting to be inspected as a pd.DataFrame
+        "last_error" is why the last attempt failed (None if not tried yet)
+
+        :Params:
+        site: (optional) only this GSC property
+            type: str
+        """
+        query = "SELECT * FROM queue"
+        params: tuple[str, ...] = ()
+        if site is not None:
+            query += " WHERE site = ?"
+            params = (site,)
+        queued = pd.read_sql_query(query + " ORDER BY added", self._db, params=params)
+        queued["added"] = pd.to_datetime(queued["added"], unit="s")
+        return queued
+
+    def close(self) -> None:
+        """Closes the SQLite file"""
+        self._db.close()
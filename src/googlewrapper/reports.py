@@ -11,6 +11,7 @@ from .gsc import GoogleSearchConsole
 from .sheets import GoogleSheets
 
 # standard library
+import copy
 import datetime as dt
 from typing import Optional
 
@@ -85,30 +86,52 @@ class WeeklyReport:
         self.ga_data = pd.DataFrame()
         self.google_objects = {}
 
+        # one connection to each API, every view/site gets a copy
+        # so it keeps its own settings and results
+        self._ga = None
+        self._gsc = None
+        # GA data pulled for every view at once in .from_dict()
+        self._ga_views = {}
+
     def __print_dates(self):
         print(f"\n\n -- Data between {self.week_start} and {self.week_end} --\n")
 
+    def _ga_for(self, view):
+        """a GoogleAnalytics object for view, on the shared connection"""
+        if self._ga is None:
+            self._ga = GoogleAnalytics(view)
+
+            ga_metrics = ["pageviews", "sessions"]
+            self._ga.set_metrics(ga_metrics)
+            ga_dims = ["channelGrouping"]
+            self._ga.set_dimensions(ga_dims)
+            # sets the GA to be organic traffic only
+            organic_filter = [
+                ("channelGrouping", False, "EXACT", "Organic Search", True)
+            ]
+            self._ga.set_dimension_filters(organic_filter)
+
+            self._ga.set_start_date(self.week_start)
+            self._ga.set_end_date(self.week_end)
+        ga = copy.copy(self._ga)
+        ga.set_view(view)
+        return ga
+
     def process(self, view, site):
 
-        ga = GoogleAnalytics(view)
-        gsc = GoogleSearchConsole()
+        ga = self._ga_for(view)
+        if self._gsc is None:
+            self._gsc = GoogleSearchConsole()
+        gsc = copy.copy(self._gsc)
 
         if self.output:
             print(site)
 
         # GA
-        ga_metrics = ["pageviews", "sessions"]
-        ga.set_metrics(ga_metrics)
-        ga_dims = ["channelGrouping"]
-        ga.set_dimensions(ga_dims)
-        # sets the GA to be organic traffic only
-        organic_filter = [("channelGrouping", False, "EXACT", "Organic Search", True)]
-        ga.set_dimension_filters(organic_filter)
-
-        ga.set_start_date(self.week_start)
-        ga.set_end_date(self.week_end)
-
-        current_ga_data = ga.build_request()
+        if view in self._ga_views:
+            current_ga_data = self._ga_views.pop(view)
+        else:
+            current_ga_data = ga.build_request()
 
         pageviews = current_ga_data["pageviews"].values[0]
         sessions = current_ga_data["sessions"].values[0]
@@ -155,6 +178,11 @@ class WeeklyReport:
         if not isinstance(data, dict):
             raise TypeError("data needs to be a dictionary format")
 
+        # pull GA for every view at the same time
+        if data:
+            ga = self._ga_for(next(iter(data.values())))
+            self._ga_views = ga.multi_view(list(data.values()))
+
         google_data = pd.DataFrame()
         # loop through the data and pull each of the points
         # if self.output == True, it will print to console
@@ -0,0 +1,152 @@
+"""Memory bounded storage for pulled results"""
+
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+
+from .arrow import import_pyarrow
+
+
+def result_size(value: Any) -> int:
+    """bytes used by a pd.DataFrame or pyarrow.Table"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return int(getattr(value, "nbytes", 0))
+
+
+class ResultStore(MutableMapping):  # type: ignore[type-arg]
+    """
+    Dictionary of results (site -> pd.DataFrame or pyarrow.Table)
+    that keeps its memory use under a budget
+
+    When the results in memory go over max_bytes, the oldest ones are
+    written to uncompressed Arrow IPC files in spill_dir and dropped from
+    memory. Reading a spilled key memory-maps its file back, so it looks
+    like a normal dictionary to the caller. A pyarrow.Table stays
+    memory-mapped, a pd.DataFrame is rebuilt from the mapped file on
+    every access (a copy, keep it in a variable instead of reading the
+    key over and over).
+    Spill files are removed when the key is deleted or the store goes away.
+
+    Spilling requires pyarrow (pip install googlewrapper[arrow])
+
+    Parameters
+    max_bytes: memory budget for results kept in memory
+        None keeps everything in memory (a plain dict)
+        type: int
+    spill_dir: folder to write spilled results to
+        default: a new temporary folder
+        type: str
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int] = None, spill_dir: Optional[str] = None
+    ) -> None:
+        if max_bytes is not None:
+            import_pyarrow()
+        self.max_bytes = max_bytes
+        self._spill_root = spill_dir
+        self._spill_dir: Optional[Path] = None
+        self._memory: OrderedDict[Any, Any] = OrderedDict()
+        self._spilled: dict[Any, tuple[Path, bool]] = {}
+        self._keys: list[Any] = []
+        self._spill_count = 0
+        # bytes of each result in memory, and their running total
+        self._sizes: dict[Any, int] = {}
+        self._memory_bytes = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<ResultStore keys={len(self)} in_memory={len(self._memory)} "
+            f"spilled={len(self._spilled)} bytes={self.memory_bytes}>"
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        """bytes of the results currently held in memory"""
+        return self._memory_bytes
+
+    def spilled(self) -> list[Any]:
+        """keys that are currently on disk"""
+        return list(self._spilled)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if key in self:
+            del self[key]
+        self._keys.append(key)
+        self._memory[key] = value
+        self._sizes[key] = result_size(value)
+        self._memory_bytes += self._sizes[key]
+        self._enforce_budget()
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self._memory:
+            return self._memory[key]
+        if key in self._spilled:
+            return self._load(*self._spilled[key])
+        raise KeyError(key)
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self._keys:
+            raise KeyError(key)
+        self._keys.remove(key)
+        if key in self._memory:
+            del self._memory[key]
+            self._memory_bytes -= self._sizes.pop(key)
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            spilled[0].unlink(missing_ok=True)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._memory or key in self._spilled
+
+    def _enforce_budget(self) -> None:
+        """spills the oldest results until we are under the budget"""
+        if self.max_bytes is None:
+            return
+        while self._memory and self.memory_bytes > self.max_bytes:
+            key, value = self._memory.popitem(last=False)
+            self._memory_bytes -= self._sizes.pop(key)
+            self._spilled[key] = self._spill(value)
+
+    def _spill(self, value: Any) -> tuple[Path, bool]:
+        """writes value to an Arrow IPC file, returns (path, was_pandas)"""
+        pa = import_pyarrow()
+        if self._spill_dir is None:
+            if self._spill_root is not None:
+                Path(self._spill_root).mkdir(parents=True, exist_ok=True)
+            self._spill_dir = Path(
+                tempfile.mkdtemp(prefix="googlewrapper-", dir=self._spill_root)
+            )
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+
+        was_pandas = isinstance(value, pd.DataFrame)
+        table = pa.Table.from_pandas(value) if was_pandas else value
+        self._spill_count += 1
+        path = self._spill_dir / f"{self._spill_count}.arrow"
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return path, was_pandas
+
+    @staticmethod
+    def _load(path: Path, was_pandas: bool) -> Any:
+        """
+        memory-maps a spilled file back in, a pd.DataFrame is copied
+        out of the mapped file
+        """
+        pa = import_pyarrow()
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        return table.to_pandas() if was_pandas else table
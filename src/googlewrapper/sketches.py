@@ -0,0 +1,362 @@
+"""Streaming sketches (distinct counts and heavy hitters) for Search Console data
+
+Sketches are fed page by page while GoogleSearchConsole.get_data() runs
+(see GoogleSearchConsole.set_sketches), use a fixed amount of memory,
+and can be merged and saved as JSON across days, sites and runs
+"""
+
+import base64
+from typing import Any, Union
+
+import numpy as np
+import pandas as pd
+
+Columns = Union[str, list[str]]
+
+
+def _as_list(columns: Columns) -> list[str]:
+    return [columns] if isinstance(columns, str) else list(columns)
+
+
+def _frame(data: Any, columns: list[str]) -> pd.DataFrame:
+    """the needed columns of a pd.DataFrame or pyarrow RecordBatch/Table"""
+    if isinstance(data, pd.DataFrame):
+        return data[columns]
+    return data.select(columns).to_pandas()
+
+
+def _hash64(data: pd.DataFrame, hash_key: str = "0123456789123456") -> np.ndarray:
+    """64 bit hash of every row (all columns together)"""
+    hashes = pd.util.hash_pandas_object(data, index=False, hash_key=hash_key)
+    result: np.ndarray = hashes.to_numpy(dtype=np.uint64)
+    return result
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """int.bit_length() for an array of uint64 (exact, 32 bits at a time)"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    high_len = np.where(high > 0, np.floor(np.log2(np.maximum(high, 1))) + 33, 0)
+    low_len = np.where(low > 0, np.floor(np.log2(np.maximum(low, 1))) + 1, 0)
+    return np.where(high_len > 0, high_len, low_len).astype(np.int64)
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+
+def _decode(text: str, dtype: Any) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate (HyperLogLog) of one or more columns
+
+    Uses 2**precision bytes of memory, the standard error is
+    about 1.04 / sqrt(2**precision) (0.8% for the default of 14)
+
+    Parameters
+    columns: column(s) to count distinct values of
+        type: str or list of str
+        example: "Query" or ["Page", "Query"]
+    precision: number of index bits, between 4 and 18
+        type: int
+        default: 14 (16KB)
+    """
+
+    def __init__(self, columns: Columns = "Query", precision: int = 14) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError("precision needs to be between 4 and 18")
+        self.columns = _as_list(columns)
+        self.precision = precision
+        self._registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def __repr__(self) -> str:
+        return f"<HyperLogLog columns={self.columns} estimate={self.count()}>"
+
+    def update(self, data: Any) -> None:
+        """
+        Adds the rows of a page of data
+
+        :Params:
+        data: GSC data
+            type: pd.DataFrame (or pyarrow RecordBatch/Table)
+        """
+        if len(data) == 0:
+            return
+        hashes = _hash64(_frame(data, self.columns))
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        rank = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self._registers, index, rank)
+
+    def count(self) -> int:
+        """estimated number of distinct values"""
+        size = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size**2 / np.sum(2.0 ** -self._registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if estimate <= 2.5 * size and zeros:
+            # small range correction (linear counting)
+            estimate = size * np.log(size / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Adds another sketch into this one (in place), returns self"""
+        if other.precision != self.precision or other.columns != self.columns:
+            raise ValueError("Can only merge sketches with the same columns/precision")
+        np.maximum(self._registers, other._registers, out=self._registers)
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON serializable copy of the sketch"""
+        return {
+            "type": "HyperLogLog",
+            "columns": self.columns,
+            "precision": self.precision,
+            "registers": _encode(self._registers),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "HyperLogLog":
+        """Rebuilds a sketch saved with .to_dict()"""
+        sketch = cls(data["columns"], data["precision"])
+        sketch._registers = _decode(data["registers"], np.uint8)
+        return sketch
+
+
+class CountMinSketch:
+    """
+    Approximate totals of a metric for any value of one or more columns
+    (Count-Min). Estimates are never too low, and are too high by at most
+    total_weight * e / width with probability 1 - exp(-depth)
+
+    Parameters
+    columns: column(s) that make up the key
+        type: str or list of str
+    weight: metric column to add up
+        type: str
+        default: "Clicks"
+    width: counters per row
+        type: int
+        default: 16384
+    depth: number of rows (hash functions)
+        type: int
+        default: 4
+    """
+
+    def __init__(
+        self,
+        columns: Columns = "Query",
+        weight: str = "Clicks",
+        width: int = 2**14,
+        depth: int = 4,
+    ) -> None:
+        self.columns = _as_list(columns)
+        self.weight = weight
+        self.width = width
+        self.depth = depth
+        self._table = np.zeros((depth, width), dtype=np.int64)
+
+    def __repr__(self) -> str:
+        return (
+            f"<CountMinSketch columns={self.columns} weight={self.weight} "
+            f"total={self.total}>"
+        )
+
+    @property
+    def total(self) -> int:
+        """total weight added"""
+        return int(self._table[0].sum())
+
+    def _hash_key(self, row: int) -> str:
+        return f"{row:016d}"
+
+    def _positions(self, keys: pd.DataFrame) -> list[np.ndarray]:
+        return [
+            (_hash64(keys, self._hash_key(row)) % np.uint64(self.width)).astype(
+                np.int64
+            )
+            for row in range(self.depth)
+        ]
+
+    def update(self, data: Any) -> None:
+        """
+        Adds the rows of a page of data
+
+        :Params:
+        data: GSC data
+            type: pd.DataFrame (or pyarrow RecordBatch/Table)
+        """
+        if len(data) == 0:
+            return
+        frame = _frame(data, self.columns + [self.weight])
+        weights = frame[self.weight].to_numpy(dtype=np.int64)
+        for row, positions in enumerate(self._positions(frame[self.columns])):
+            np.add.at(self._table[row], positions, weights)
+
+    def estimate(self, *key: Any) -> int:
+        """
+        estimated total weight of one key
+
+        :Example:
+            sketch.estimate("oreo cookies")
+            sketch.estimate("https://www.oreo.com/", "oreo cookies")
+        """
+        keys = pd.DataFrame([key], columns=self.columns)
+        positions = self._positions(keys)
+        return int(min(self._table[row, pos[0]] for row, pos in enumerate(positions)))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """Adds another sketch into this one (in place), returns self"""
+        if (other.width, other.depth, other.columns) != (
+            self.width,
+            self.depth,
+            self.columns,
+        ):
+            raise ValueError("Can only merge sketches with the same columns/size")
+        self._table += other._table
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON serializable copy of the sketch"""
+        return {
+            "type": "CountMinSketch",
+            "columns": self.columns,
+            "weight": self.weight,
+            "width": self.width,
+            "depth": self.depth,
+            "table": _encode(self._table),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "CountMinSketch":
+        """Rebuilds a sketch saved with .to_dict()"""
+        sketch = cls(data["columns"], data["weight"], data["width"], data["depth"])
+        sketch._table = _decode(data["table"], np.int64).reshape(
+            sketch.depth, sketch.width
+        )
+        return sketch
+
+
+class HeavyHitters:
+    """
+    Top values of a column by a metric, in bounded memory
+    (weighted Misra-Gries, the mergeable form of SpaceSaving)
+
+    At most `capacity` counters are kept. Every value whose true total
+    is above max_error is guaranteed to be kept, and its kept total is
+    at most max_error below the true total
+
+    Parameters
+    column: column to find the top values of
+        type: str
+        default: "Query"
+    weight: metric column to rank by
+        type: str
+        default: "Clicks"
+    capacity: number of counters kept
+        type: int
+        default: 1000
+    """
+
+    def __init__(
+        self, column: str = "Query", weight: str = "Clicks", capacity: int = 1000
+    ) -> None:
+        self.column = column
+        self.weight = weight
+        self.capacity = capacity
+        self._counts = pd.Series(dtype=np.int64)
+        self.max_error = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<HeavyHitters column={self.column} weight={self.weight} "
+            f"counters={len(self._counts)} max_error={self.max_error}>"
+        )
+
+    def _combine(self, counts: pd.Series, error: int) -> None:
+        """merges exact or summarized counts, then trims to capacity"""
+        merged = self._counts.add(counts, fill_value=0).astype(np.int64)
+        self.max_error += error
+        if len(merged) > self.capacity:
+            cutoff = int(
+                np.partition(merged.to_numpy(), -(self.capacity + 1))[
+                    -(self.capacity + 1)
+                ]
+            )
+            merged = merged - cutoff
+            merged = merged[merged > 0]
+            self.max_error += cutoff
+        self._counts = merged
+
+    def update(self, data: Any) -> None:
+        """
+        Adds the rows of a page of data
+
+        :Params:
+        data: GSC data
+            type: pd.DataFrame (or pyarrow RecordBatch/Table)
+        """
+        if len(data) == 0:
+            return
+        frame = _frame(data, [self.column, self.weight])
+        counts = frame.groupby(self.column, observed=True, sort=False)[
+            self.weight
+        ].sum()
+        counts.index = counts.index.astype(object)
+        self._combine(counts[counts > 0], 0)
+
+    def top(self, n: int = 10) -> pd.DataFrame:
+        """
+        Returns the top n values
+
+        columns:
+            <weight>: kept total (never too high)
+            "upper_bound": the most the true total could be
+        """
+        top = self._counts.nlargest(n)
+        result = top.to_frame(self.weight)
+        result.index.name = self.column
+        result["upper_bound"] = result[self.weight] + self.max_error
+        return result
+
+    def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+        """Adds another sketch into this one (in place), returns self"""
+        if (other.column, other.weight) != (self.column, self.weight):
+            raise ValueError("Can only merge sketches with the same column/weight")
+        self._combine(other._counts, other.max_error)
+        return self
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON serializable copy of the sketch"""
+        return {
+            "type": "HeavyHitters",
+            "column": self.column,
+            "weight": self.weight,
+            "capacity": self.capacity,
+            "max_error": self.max_error,
+            "counts": [[k, int(v)] for k, v in self._counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "HeavyHitters":
+        """Rebuilds a sketch saved with .to_dict()"""
+        sketch = cls(data["column"], data["weight"], data["capacity"])
+        sketch.max_error = data["max_error"]
+        sketch._counts = pd.Series({k: v for k, v in data["counts"]}, dtype=np.int64)
+        return sketch
+
+
+SKETCH_TYPES: dict[str, Any] = {
+    "HyperLogLog": HyperLogLog,
+    "CountMinSketch": CountMinSketch,
+    "HeavyHitters": HeavyHitters,
+}
+
+
+def sketch_from_dict(data: dict[str, Any]) -> Any:
+    """Rebuilds any sketch saved with .to_dict()"""
+    return SKETCH_TYPES[data["type"]].from_dict(data)
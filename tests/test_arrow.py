@@ -0,0 +1,89 @@
+import pytest
+
+from googlewrapper.branded import BrandMatcher
+
+pa = pytest.importorskip("pyarrow")
+
+from googlewrapper.arrow import (  # noqa: E402
+    check_output_format,
+    ga_table,
+    gsc_record_batch,
+    write_parquet_dataset,
+)
+
+GSC_ROWS = [
+    {
+        "keys": ["oreo cookies", "2022-01-01"],
+        "clicks": 3.0,
+        "impressions": 10.0,
+        "ctr": 0.3,
+        "position": 1.5,
+    },
+    {
+        "keys": ["milk", "2022-01-02"],
+        "clicks": 0.0,
+        "impressions": 4.0,
+        "ctr": 0.0,
+        "position": 7.0,
+    },
+]
+
+
+class TestArrow:
+    def test_gsc_record_batch(self):
+        batch = gsc_record_batch(GSC_ROWS, ["query", "date"], BrandMatcher(["oreo"]))
+        assert batch.schema.names == [
+            "Clicks",
+            "Impressions",
+            "Ctr",
+            "Position",
+            "Query",
+            "Date",
+            "Branded",
+        ]
+        assert batch.column("Clicks").type == pa.int64()
+        assert batch.column("Date").type == pa.date32()
+        assert batch.column("Branded").to_pylist() == [True, False]
+
+    def test_gsc_compact(self):
+        batch = gsc_record_batch(GSC_ROWS, ["query", "date"], compact=True)
+        assert batch.column("Impressions").type == pa.int32()
+        assert pa.types.is_dictionary(batch.column("Query").type)
+
+    def test_ga_table(self):
+        response = {
+            "reports": [
+                {
+                    "columnHeader": {
+                        "dimensions": ["ga:date"],
+                        "metricHeader": {
+                            "metricHeaderEntries": [
+                                {"name": "ga:sessions", "type": "INTEGER"},
+                                {"name": "ga:bounceRate", "type": "PERCENT"},
+                            ]
+                        },
+                    },
+                    "data": {
+                        "rows": [
+                            {
+                                "dimensions": ["20220101"],
+                                "metrics": [{"values": ["5", "12.5"]}],
+                            }
+                        ]
+                    },
+                }
+            ]
+        }
+        table = ga_table(response)
+        assert table.column_names == ["date", "sessions", "bounceRate"]
+        assert table.column("sessions").to_pylist() == [5]
+
+    def test_check_output_format(self):
+        assert check_output_format("Arrow") == "arrow"
+        with pytest.raises(ValueError):
+            check_output_format("polars")
+
+    def test_write_parquet_dataset(self, tmp_path):
+        batch = gsc_record_batch(GSC_ROWS, ["query", "date"])
+        write_parquet_dataset([batch], str(tmp_path), ["Date"])
+        assert len(list(tmp_path.glob("Date=*"))) == 2
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from googlewrapper.branded import BrandMatcher
+
+
+class TestBrandMatcher:
+    def test_literal(self):
+        matcher = BrandMatcher(["oreo", "nabisco"])
+        assert matcher.contains("buy oreos online")
+        assert matcher.contains("nabisco snacks")
+        assert not matcher.contains("chocolate cookies")
+
+    def test_overlapping_terms(self):
+        matcher = BrandMatcher(["she", "he", "hers", "his"])
+        assert matcher.contains("ushers")
+        assert not matcher.contains("ash")
+
+    def test_metacharacters_are_literal(self):
+        matcher = BrandMatcher(["c++", "a.b"])
+        assert matcher.contains("learn c++ fast")
+        assert not matcher.contains("learn c fast")
+        assert not matcher.contains("axb")
+
+    def test_word_boundary(self):
+        matcher = BrandMatcher(["oreo"], word_boundary=True)
+        assert matcher.contains("oreo cookies")
+        assert matcher.contains("double-oreo")
+        assert not matcher.contains("oreos")
+        assert not matcher.contains("choreo")
+
+    def test_ignore_case(self):
+        assert not BrandMatcher(["Oreo"]).contains("oreo")
+        assert BrandMatcher(["Oreo"], ignore_case=True).contains("OREO cakes")
+
+    def test_classify(self):
+        queries = pd.Series(["oreo", None, "milk", "oreo"], index=[3, 4, 5, 6])
+        result = BrandMatcher(["oreo"]).classify(queries)
+        assert result.tolist() == [True, False, False, True]
+        assert result.index.tolist() == [3, 4, 5, 6]
+
+    def test_empty(self):
+        matcher = BrandMatcher(["", ""])
+        assert not matcher
+        assert not matcher.contains("anything")
@@ -0,0 +1,35 @@
+import json
+import time
+
+from googlewrapper.cache import TTLCache, user_cache_dir
+
+
+class TestTTLCache:
+    def test_round_trip(self, tmp_path):
+        cache = TTLCache(str(tmp_path / "cache.json"), ttl=60)
+        assert cache.get("sites") is None
+        cache.set("sites", {"https://a.com/": "siteOwner"})
+        assert cache.get("sites") == {"https://a.com/": "siteOwner"}
+        assert "sites" in json.loads((tmp_path / "cache.json").read_text())
+
+    def test_expired(self, tmp_path):
+        cache = TTLCache(str(tmp_path / "cache.json"), ttl=0.01)
+        cache.set("sites", ["a"])
+        time.sleep(0.02)
+        assert cache.get("sites") is None
+
+    def test_invalidate(self, tmp_path):
+        cache = TTLCache(str(tmp_path / "cache.json"), ttl=60)
+        cache.set("sites", ["a"])
+        cache.invalidate("sites")
+        assert TTLCache(str(tmp_path / "cache.json"), ttl=60).get("sites") is None
+
+    def test_disabled(self, tmp_path):
+        cache = TTLCache(str(tmp_path / "cache.json"), ttl=0)
+        cache.set("sites", ["a"])
+        assert cache.get("sites") is None
+
+
+def test_user_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert user_cache_dir() == tmp_path / "googlewrapper"
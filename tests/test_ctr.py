@@ -0,0 +1,50 @@
+import json
+
+import pandas as pd
+
+from googlewrapper.ctr import CTRAccumulator
+
+
+def sample_df():
+    return pd.DataFrame(
+        {
+            "Clicks": [10, 5, 1, 0, 3],
+            "Impressions": [100, 50, 20, 10, 30],
+            "Position": [1.2, 0.8, 2.4, 150.0, 1.0],
+            "Device": ["MOBILE", "DESKTOP", "MOBILE", "MOBILE", "MOBILE"],
+            "Branded": [True, False, False, False, True],
+        }
+    )
+
+
+class TestCTRAccumulator:
+    def test_curve(self):
+        acc = CTRAccumulator()
+        acc.add(sample_df())
+        curve = acc.curve()
+        assert curve.index.tolist() == [1, 2]
+        assert curve.loc[1, "Clicks"] == 18
+        assert curve.loc[1, "Impressions"] == 180
+        assert curve.loc[2, "CTR"] == 1 / 20
+
+    def test_segments(self):
+        acc = CTRAccumulator()
+        acc.add(sample_df())
+        assert acc.curve(branded=True).loc[1, "Impressions"] == 130
+        assert acc.curve(branded=False).loc[1, "Impressions"] == 50
+        assert acc.curve(device="MOBILE", branded=False).index.tolist() == [2]
+        assert set(acc.curves("device")) == {"MOBILE", "DESKTOP"}
+
+    def test_merge_and_serialize(self):
+        first, second = CTRAccumulator(), CTRAccumulator()
+        first.add(sample_df())
+        second.add(sample_df().iloc[:2])
+        combined = first + second
+        assert combined.curve().loc[1, "Impressions"] == 330
+        restored = CTRAccumulator.from_dict(json.loads(json.dumps(combined.to_dict())))
+        assert restored.curve().equals(combined.curve())
+
+    def test_empty(self):
+        acc = CTRAccumulator()
+        acc.add(pd.DataFrame(columns=["Clicks", "Impressions", "Position"]))
+        assert not acc
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from googlewrapper.cube import GSCCube, missing_columns, rollup_error
+
+
+def sample_df():
+    return pd.DataFrame(
+        {
+            "Clicks": [1, 2, 3, 4],
+            "Impressions": [10, 30, 20, 40],
+            "Ctr": [0.1, 0.0667, 0.15, 0.1],
+            "Position": [2.0, 4.0, 1.0, 3.0],
+            "Page": ["/a", "/a", "/b", "/b"],
+            "Date": pd.to_datetime(["2022-01-01", "2022-01-02"] * 2),
+        }
+    )
+
+
+class TestGSCCube:
+    def test_rollup(self):
+        cube = GSCCube(sample_df(), ["page", "date"])
+        pages = cube.rollup(["page"]).set_index("Page")
+        assert pages.loc["/a", "Clicks"] == 3
+        assert pages.loc["/a", "Impressions"] == 40
+        assert pages.loc["/a", "Position"] == pytest.approx((2 * 10 + 4 * 30) / 40)
+        assert pages.loc["/b", "Ctr"] == pytest.approx(7 / 60)
+
+    def test_inexact_rollups(self):
+        assert rollup_error(["page", "date"], ["date"]) is not None
+        assert rollup_error(["query", "device"], ["device"]) is not None
+        assert rollup_error(["page", "query", "date"], ["page", "query"]) is None
+        cube = GSCCube(sample_df(), ["page", "date"])
+        assert not cube.can_rollup(["date"])
+        with pytest.raises(ValueError):
+            cube.rollup(["date"])
+        assert cube.rollup(["date"], strict=False)["Impressions"].sum() == 100
+        with pytest.raises(ValueError):
+            cube.rollup(["query"], strict=False)
+
+    def test_missing_columns(self):
+        projected = sample_df()[["Page", "Date", "Clicks"]]
+        assert missing_columns(list(projected.columns), ["page", "date"]) == [
+            "Impressions",
+            "Position",
+        ]
+        with pytest.raises(ValueError, match="Impressions"):
+            GSCCube(projected, ["page", "date"])
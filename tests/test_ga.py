@@ -0,0 +1,336 @@
+import datetime as dt
+import threading
+import time
+
+import pytest
+
+from googlewrapper.connect import ThreadLocalHttp
+from googlewrapper.ga import (
+    GoogleAnalytics,
+    _is_additive,
+    join_reports,
+    merge_reports,
+)
+
+FLOAT_METRICS = {"bounceRate", "avgSessionDuration"}
+
+
+class FakeCredentials:
+    def authorize(self, http):
+        return http
+
+
+class FakeRequest:
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, http=None):
+        requests = self.body["reportRequests"]
+        if len(requests) > 5:
+            raise ValueError("batchGet takes at most 5 reportRequests")
+        if len({r["viewId"] for r in requests}) > 1:
+            raise ValueError("reportRequests need the same viewId")
+        with self.service.lock:
+            self.service.calls.append(self.body)
+            self.service.running += 1
+            self.service.max_running = max(
+                self.service.max_running, self.service.running
+            )
+        try:
+            time.sleep(self.service.delay)
+            return {"reports": [self.service.report(r) for r in requests]}
+        finally:
+            with self.service.lock:
+                self.service.running -= 1
+
+
+class FakeService:
+    """answers reports().batchGet() with n_rows of made up data per report"""
+
+    def __init__(self, n_rows=3, max_unsampled_days=None):
+        self.n_rows = n_rows
+        self.max_unsampled_days = max_unsampled_days
+        self.calls = []
+        # seconds each call takes, and the most calls seen running at once
+        self.delay = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def reports(self):
+        return self
+
+    def batchGet(self, body):
+        return FakeRequest(self, body)
+
+    def report(self, request):
+        metrics = [m["expression"] for m in request["metrics"]]
+        dims = [d["name"] for d in request["dimensions"]]
+        start = int(request.get("pageToken") or 0)
+        end = min(start + request.get("pageSize", 100000), self.n_rows)
+        rows = [
+            {
+                "dimensions": [f"{d[3:]}-{i}" for d in dims],
+                "metrics": [
+                    {"values": [str((i + 1) * (r + 1)) for _ in metrics]}
+                    for r, _ in enumerate(request["dateRanges"])
+                ],
+            }
+            for i in range(start, end)
+        ]
+        report = {
+            "columnHeader": {
+                "dimensions": dims,
+                "metricHeader": {
+                    "metricHeaderEntries": [
+                        {
+                            "name": m,
+                            "type": "PERCENT" if m[3:] in FLOAT_METRICS else "INTEGER",
+                        }
+                        for m in metrics
+                    ]
+                },
+            },
+            "data": {"rows": rows, "rowCount": self.n_rows},
+        }
+        if end < self.n_rows:
+            report["nextPageToken"] = str(end)
+        date_range = request["dateRanges"][0]
+        days = (
+            dt.date.fromisoformat(date_range["endDate"])
+            - dt.date.fromisoformat(date_range["startDate"])
+        ).days + 1
+        if self.max_unsampled_days and days > self.max_unsampled_days:
+            report["data"]["samplesReadCounts"] = ["1000"]
+            report["data"]["samplingSpaceSizes"] = ["5000"]
+        return report
+
+
+@pytest.fixture
+def ga(monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(GoogleAnalytics, "_GoogleAnalytics__auth", lambda self: service)
+    return GoogleAnalytics("123")
+
+
+class TestGoogleAnalytics:
+    def test_build_request(self, ga):
+        ga.set_metrics(["sessions", "bounceRate"])
+        ga.set_dimensions(["date"])
+        df = ga.build_request()
+        assert list(df.columns) == ["date", "sessions", "bounceRate"]
+        assert df["sessions"].tolist() == [1, 2, 3]
+        assert df["bounceRate"].dtype == float
+
+    def test_batch_pull(self, ga):
+        for i in range(6):
+            ga.set_metrics([f"metric{i}"])
+            ga.queue_request(f"report{i}")
+        ga.set_view("456")
+        ga.queue_request("other_view")
+
+        reports = ga.batch_pull()
+        assert list(reports) == [f"report{i}" for i in range(6)] + ["other_view"]
+        assert list(reports["report4"].columns) == ["organic", "metric4"]
+        # 6 reports for view 123 take 2 calls, view 456 needs its own
+        assert [len(c["reportRequests"]) for c in ga.auth.calls] == [5, 1, 1]
+        assert ga.batch_pull() == {}
+
+    def test_pagination(self, ga):
+        ga.auth.n_rows = 23
+        df = ga.build_request(size=2)
+        assert df["organic"].tolist() == [f"organic-{i}" for i in range(23)]
+        # first page, then the other 11 pages 5 at a time
+        assert [len(c["reportRequests"]) for c in ga.auth.calls] == [1, 5, 5, 1]
+
+    def test_pagination_threads(self, ga):
+        ga.auth.n_rows = 10
+        ga._thread_http = ThreadLocalHttp(FakeCredentials())
+        df = ga.build_request(size=1)
+        assert df["pageviews"].tolist() == list(range(1, 11))
+
+    def test_two_date_ranges(self, ga):
+        ga.set_metrics(["sessions", "bounceRate"])
+        ga.set_dimensions(["date"])
+        body = ga.build_request(pull=False)
+        body["reportRequests"][0]["dateRanges"].append(
+            {"startDate": "2022-01-01", "endDate": "2022-01-07"}
+        )
+        df = ga.pull(body)
+        assert list(df.columns) == [
+            "date",
+            "sessions",
+            "bounceRate",
+            "sessions_1",
+            "bounceRate_1",
+        ]
+        assert df["sessions_1"].dtype == "int64"
+
+    def test_empty_report(self, ga):
+        ga.auth.n_rows = 0
+        df = ga.build_request()
+        assert list(df.columns) == ["organic", "pageviews"]
+        assert df.empty
+
+    def test_sampled_report_is_split(self, ga):
+        ga.auth.max_unsampled_days = 2
+        ga.set_metrics(["sessions", "bounceRate"])
+        ga.set_start_date(dt.date(2022, 1, 1))
+        ga.set_end_date(dt.date(2022, 1, 8))
+        with pytest.warns(UserWarning, match="bounceRate"):
+            df = ga.build_request()
+        # 4 unsampled windows of 2 days, every row found in each of them
+        assert df["sessions"].tolist() == [4, 8, 12]
+        assert df["bounceRate"].isna().all()
+        windows = [c["reportRequests"][0]["dateRanges"][0] for c in ga.auth.calls]
+        assert {"startDate": "2022-01-07", "endDate": "2022-01-08"} in windows
+        # 8 days, 2 x 4 days, 4 x 2 days
+        assert len(ga.auth.calls) == 7
+
+        # the other pages of a sampled report are never requested, only
+        # the 4 unsampled windows are paged (first page + 1 batch each)
+        ga.auth.calls.clear()
+        ga.auth.n_rows = 25
+        ga.set_metrics(["sessions"])
+        assert len(ga.build_request(size=10)) == 25
+        assert len(ga.auth.calls) == 3 + 4 * 2
+
+    def test_sampling_split_off(self, ga):
+        ga.auth.max_unsampled_days = 2
+        ga.set_sampling_split(False)
+        ga.build_request()
+        assert len(ga.auth.calls) == 1
+
+    def test_multi_view(self, ga):
+        ga._thread_http = ThreadLocalHttp(FakeCredentials())
+        reports = ga.multi_view(["1", "2", "3"])
+        assert list(reports) == ["1", "2", "3"]
+        assert sorted(c["reportRequests"][0]["viewId"] for c in ga.auth.calls) == [
+            "1",
+            "2",
+            "3",
+        ]
+        combined = ga.multi_view(["1", "2"], combine=True)
+        assert combined["view"].tolist() == ["1"] * 3 + ["2"] * 3
+        assert ga.view_id == "123"
+
+    def test_multi_view_bounded(self, ga):
+        ga._thread_http = ThreadLocalHttp(FakeCredentials())
+        ga.auth.n_rows = 12
+        ga.auth.max_unsampled_days = 4
+        ga.auth.delay = 0.01
+        ga.set_request_workers(3)
+        reports = ga.multi_view([str(i) for i in range(4)], size=2)
+        assert all(len(df) == 12 for df in reports.values())
+        # views, sampling splits and pages all share the 3 workers
+        assert ga.auth.max_running <= 3
+
+    def test_wide_request_is_split(self, ga):
+        ga.set_metrics([f"metric{i}" for i in range(23)])
+        ga.set_dimensions(["date", "deviceCategory"])
+        body = ga.build_request(pull=False)
+        assert [len(r["metrics"]) for r in body["reportRequests"]] == [10, 10, 3]
+
+        df = ga.pull(body)
+        assert list(df.columns) == ["date", "deviceCategory"] + [
+            f"metric{i}" for i in range(23)
+        ]
+        assert len(df) == 3
+        # the 3 pieces fit in one batchGet
+        assert len(ga.auth.calls) == 1
+
+    def test_too_many_dimensions(self, ga):
+        ga.set_dimensions([f"dimension{i}" for i in range(8)])
+        with pytest.raises(ValueError):
+            ga.build_request()
+
+    def test_comparison(self, ga):
+        ga.set_metrics(["sessions"])
+        ga.set_dimensions(["date"])
+        ga.set_start_date(dt.date(2022, 1, 8))
+        ga.set_end_date(dt.date(2022, 1, 14))
+        ga.set_comparison()
+        df = ga.build_request()
+
+        date_ranges = ga.auth.calls[0]["reportRequests"][0]["dateRanges"]
+        assert date_ranges[1] == {"startDate": "2022-01-01", "endDate": "2022-01-07"}
+        assert len(ga.auth.calls) == 1
+        assert list(df.columns) == [
+            "date",
+            "sessions",
+            "sessions_previous",
+            "sessions_change",
+            "sessions_pct_change",
+        ]
+        assert df["sessions_previous"].tolist() == [2, 4, 6]
+        assert df["sessions_change"].tolist() == [-1, -2, -3]
+        assert df["sessions_pct_change"].tolist() == [-0.5, -0.5, -0.5]
+
+        ga.clear_comparison()
+        assert list(ga.build_request().columns) == ["date", "sessions"]
+
+
+def test_merge_reports_keeps_unique_rows():
+    header = {
+        "dimensions": ["ga:date"],
+        "metricHeader": {
+            "metricHeaderEntries": [{"name": "ga:users", "type": "INTEGER"}]
+        },
+    }
+    reports = [
+        {
+            "columnHeader": header,
+            "data": {"rows": [{"dimensions": [d], "metrics": [{"values": ["5"]}]}]},
+        }
+        for d in ["20220101", "20220102"]
+    ]
+    merged = merge_reports(reports)
+    assert [r["dimensions"] for r in merged["data"]["rows"]] == [
+        ["20220101"],
+        ["20220102"],
+    ]
+    entries = merged["columnHeader"]["metricHeader"]["metricHeaderEntries"]
+    assert entries[0]["type"] == "INTEGER"
+
+
+def test_currency_ratios_are_not_additive():
+    for name in [
+        "ga:revenuePerTransaction",
+        "ga:costPerTransaction",
+        "ga:revenuePerUser",
+        "ga:CPC",
+        "ga:RPC",
+        "ga:adsenseECPM",
+        "ga:pageValue",
+    ]:
+        assert not _is_additive({"name": name, "type": "CURRENCY"}), name
+    for name in ["ga:transactionRevenue", "ga:adCost", "ga:goalValueAll"]:
+        assert _is_additive({"name": name, "type": "CURRENCY"}), name
+    assert _is_additive({"name": "ga:sessions", "type": "INTEGER"})
+    assert not _is_additive({"name": "ga:users", "type": "INTEGER"})
+
+
+def test_join_reports_fills_missing_rows():
+    def report(metric, keys):
+        return {
+            "columnHeader": {
+                "dimensions": ["ga:date"],
+                "metricHeader": {
+                    "metricHeaderEntries": [{"name": metric, "type": "INTEGER"}]
+                },
+            },
+            "data": {
+                "rows": [
+                    {"dimensions": [k], "metrics": [{"values": ["7"]}]} for k in keys
+                ]
+            },
+        }
+
+    joined = join_reports(
+        [report("ga:sessions", ["a", "b"]), report("ga:goalCompletionsAll", ["b", "c"])]
+    )
+    values = {
+        r["dimensions"][0]: r["metrics"][0]["values"] for r in joined["data"]["rows"]
+    }
+    assert values == {"a": ["7", "0"], "b": ["7", "7"], "c": ["0", "7"]}
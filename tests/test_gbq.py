@@ -0,0 +1,386 @@
+import datetime as dt
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from googlewrapper import gbq
+from googlewrapper.cache import ParquetCache, user_cache_dir
+from googlewrapper.gbq import GoogleBigQuery
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+class FakeCredentials:
+    project_id = "my-project"
+
+
+class FakeJob:
+    def __init__(self, result=None, referenced_tables=(), total_bytes_processed=0):
+        self._result = result
+        self.referenced_tables = list(referenced_tables)
+        self.total_bytes_processed = total_bytes_processed
+        self.statement_type = "SELECT"
+
+    def result(self):
+        return self._result
+
+
+class FakeClient:
+    """records the jobs GoogleBigQuery sends instead of calling GBQ"""
+
+    def __init__(self, credentials=None):
+        self.loads = []
+        self.configs = []
+        self.copies = []
+        self.deleted = []
+        # a load job of this many rows raises
+        self.fail_rows = None
+        self.queries = []
+        self.tables = {}
+        self.bytes_processed = 0
+        self._lock = threading.Lock()
+
+    def load_table_from_file(self, file_obj, destination, job_config=None):
+        table = pq.read_table(file_obj)
+        if table.num_rows == self.fail_rows:
+            raise RuntimeError("load job failed")
+        with self._lock:
+            self.loads.append(
+                (str(destination), job_config.write_disposition, table.num_rows)
+            )
+            self.configs.append((job_config, table))
+        return FakeJob()
+
+    def get_table(self, table):
+        if str(table) not in self.tables:
+            raise NotFound(str(table))
+        return self.tables[str(table)]
+
+    def create_table(self, table):
+        self.tables[str(table.reference)] = table
+        return table
+
+    def copy_table(self, source, destination, job_config=None):
+        self.copies.append((source, destination, job_config.write_disposition))
+        return FakeJob()
+
+    def delete_table(self, table, not_found_ok=False):
+        self.deleted.append(str(table))
+        self.tables.pop(str(table), None)
+
+    def query(self, query_string, job_config=None):
+        self.queries.append((query_string, job_config))
+        return FakeJob(
+            total_bytes_processed=self.bytes_processed,
+            referenced_tables=[
+                bigquery.TableReference.from_string(t) for t in self.tables
+            ],
+        )
+
+
+class FakePage:
+    def __init__(self, batch):
+        self.batch = batch
+
+    def to_arrow(self):
+        return self.batch
+
+
+class FakeStream:
+    def __init__(self, name, batches):
+        self.name = name
+        self.batches = batches
+
+    def rows(self, session=None):
+        return self
+
+    @property
+    def pages(self):
+        return [FakePage(b) for b in self.batches]
+
+
+class FakeSession:
+    def __init__(self, streams):
+        self.streams = streams
+
+
+class FakeReadClient:
+    """Storage Read API client serving 3 streams of 2 batches"""
+
+    sessions = []
+
+    def __init__(self, credentials=None):
+        self.streams = {
+            f"stream{s}": FakeStream(
+                f"stream{s}",
+                [pa.record_batch({"Clicks": [s * 10 + b] * 2}) for b in range(2)],
+            )
+            for s in range(3)
+        }
+
+    def create_read_session(self, parent, read_session, max_stream_count):
+        self.sessions.append(read_session)
+        return FakeSession(list(self.streams.values())[:max_stream_count])
+
+    def read_rows(self, name):
+        return self.streams[name]
+
+
+@pytest.fixture
+def bq(monkeypatch):
+    monkeypatch.setattr(
+        GoogleBigQuery, "_GoogleBigQuery__auth", lambda self, file: FakeCredentials()
+    )
+    monkeypatch.setattr(gbq.bigquery, "Client", FakeClient)
+    client = GoogleBigQuery()
+    client.set_dataset("seo")
+    client.set_table("gsc")
+    return client
+
+
+class TestGoogleBigQuery:
+    def test_load_single_job(self, bq):
+        df = pd.DataFrame({"Clicks": range(10), "Page": ["a"] * 10})
+        stats = bq.load(df)
+        assert bq._client.loads == [("my-project.seo.gsc", "WRITE_APPEND", 10)]
+        assert stats["rows"] == 10
+        assert stats["jobs"] == 1
+        assert stats["rows_per_second"] > 0
+
+    def test_load_chunks_replace(self, bq):
+        table = pa.table({"Clicks": list(range(25))})
+        stats = bq.load(table, behavior="replace", chunk_rows=10)
+        client = bq._client
+        # every chunk goes to a staging table, copied over the table at the end
+        staging = client.loads[0][0]
+        assert staging.startswith("my-project.seo.gsc_staging_")
+        assert sorted(load[2] for load in client.loads) == [5, 10, 10]
+        assert {load[:2] for load in client.loads} == {(staging, "WRITE_APPEND")}
+        assert client.copies == [(staging, "my-project.seo.gsc", "WRITE_TRUNCATE")]
+        assert client.deleted == [staging]
+        assert stats["jobs"] == 4
+
+    def test_load_chunks_replace_failure(self, bq):
+        bq.create_table("gsc")
+        bq._client.fail_rows = 5
+        with pytest.raises(RuntimeError):
+            bq.load(
+                pa.table({"Clicks": list(range(25))}), behavior="replace", chunk_rows=10
+            )
+        client = bq._client
+        # the table is not touched, the staging copy of it is removed
+        assert client.copies == []
+        assert {load[0] for load in client.loads} == set(client.deleted)
+        staging = client.deleted[0]
+        assert staging not in client.tables
+        assert "my-project.seo.gsc" in client.tables
+
+    def test_send_load_method(self, bq):
+        bq.send(pd.DataFrame({"Clicks": [1]}), behavior="fail", method="load")
+        assert bq._client.loads[0][1] == "WRITE_EMPTY"
+        with pytest.raises(ValueError):
+            bq.send(pd.DataFrame({"Clicks": [1]}), method="csv")
+
+    def test_read_stream(self, bq, monkeypatch):
+        storage = pytest.importorskip("google.cloud.bigquery_storage")
+        monkeypatch.setattr(storage, "BigQueryReadClient", FakeReadClient)
+
+        batches = list(
+            bq.read_stream(columns=["Clicks"], row_filter="Clicks > 0", max_streams=3)
+        )
+        clicks = sorted(v for b in batches for v in b.column("Clicks").to_pylist())
+        assert clicks == sorted([s * 10 + b for s in range(3) for b in range(2)] * 2)
+
+        session = FakeReadClient.sessions[-1]
+        assert session.table == "projects/my-project/datasets/seo/tables/gsc"
+        assert list(session.read_options.selected_fields) == ["Clicks"]
+        assert session.read_options.row_restriction == "Clicks > 0"
+
+        frames = bq.read_stream(output="pandas", max_streams=1)
+        assert [len(df) for df in frames] == [2, 2]
+
+    def test_replace_day(self, bq):
+        df = pd.DataFrame(
+            {"Date": pd.to_datetime(["2022-01-02"] * 3), "Clicks": [1, 2, 3]}
+        )
+        stats = bq.replace_day(df, dt.date(2022, 1, 2))
+        assert stats["rows"] == 3
+        assert bq._client.loads == [
+            ("my-project.seo.gsc$20220102", "WRITE_TRUNCATE", 3)
+        ]
+        job_config, table = bq._client.configs[0]
+        assert job_config.time_partitioning.field == "Date"
+        assert table.schema.field("Date").type == pa.date32()
+
+        with pytest.raises(ValueError, match="2022-01-03"):
+            bq.replace_day(
+                pd.DataFrame({"Date": ["2022-01-02", "2022-01-03"]}),
+                dt.date(2022, 1, 2),
+            )
+
+    def test_delete_day_prunes_partition(self, bq):
+        for field_type in ["DATE", "TIMESTAMP"]:
+            bq.create_table("gsc", schema=[bigquery.SchemaField("Date", field_type)])
+            query = bq.delete_day(dt.date(2022, 1, 2), str_return=True)
+            # untyped bounds compare to a DATE or a TIMESTAMP Date,
+            # and keep every time of the day for a TIMESTAMP
+            assert "`Date` >= '2022-01-02'" in query
+            assert "`Date` < '2022-01-03'" in query
+            assert "DATE '" not in query
+            assert "EXTRACT" not in query
+            bq._client.tables.clear()
+
+    def test_create_gsc_table(self, bq):
+        table = bq.create_table("gsc")
+        assert table.time_partitioning.field == "Date"
+        assert table.clustering_fields == ["Site", "Page", "Query"]
+        assert bq.validate_table("gsc") == []
+        # an existing table is validated instead of created again
+        assert bq.create_table("gsc") is table
+
+        # loads are cast to the schema
+        df = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(["2022-01-01"]),
+                "Site": ["a.com"],
+                "Clicks": pd.Series([3], dtype="int32"),
+            }
+        )
+        bq.load(df)
+        loaded = bq._client.configs[0][1]
+        assert loaded.schema.field("Date").type == pa.date32()
+        assert loaded.schema.field("Clicks").type == pa.int64()
+        with pytest.raises(ValueError, match="Other"):
+            bq.load(pd.DataFrame({"Other": [1]}))
+
+    def test_create_ga_table(self, bq):
+        df = pd.DataFrame(
+            {"date": ["20220101"], "deviceCategory": ["mobile"], "sessions": [3]}
+        )
+        with pytest.raises(ValueError):
+            bq.create_table("ga")
+        table = bq.create_table("ga", data=df)
+        assert table.time_partitioning.field == "date"
+        assert table.clustering_fields == ["view", "deviceCategory"]
+        assert {f.name: f.field_type for f in table.schema}["sessions"] == "INT64"
+
+        bq.replace_day(df, dt.date(2022, 1, 1))
+        assert bq._client.loads[-1][0] == "my-project.seo.gsc$20220101"
+
+    def test_validate_table(self, bq):
+        bq._client.tables["my-project.seo.gsc"] = bigquery.Table(
+            "my-project.seo.gsc",
+            schema=[
+                bigquery.SchemaField("Date", "TIMESTAMP"),
+                bigquery.SchemaField("Clicks", "INTEGER"),
+            ],
+        )
+        problems = bq.validate_table("gsc")
+        assert "not partitioned by day on Date" in problems
+        assert "Date is TIMESTAMP, not DATE" in problems
+        assert "Page is missing" in problems
+        assert not any(p.startswith("Clicks") for p in problems)
+        with pytest.raises(ValueError, match="does not match"):
+            bq.create_table("gsc")
+
+    def test_read_cache_default_path(self, bq):
+        bq.set_read_cache()
+        assert bq._read_cache.path == user_cache_dir() / "gbq_cache"
+        bq.set_read_cache(None)
+        assert bq._read_cache is None
+
+    def test_read_cache(self, bq, monkeypatch, tmp_path):
+        reads = []
+
+        def read_gbq(query, **kwargs):
+            reads.append(query)
+            return pd.DataFrame({"Clicks": [len(reads)]})
+
+        monkeypatch.setattr(gbq.pd, "read_gbq", read_gbq, raising=False)
+        table = bigquery.Table("my-project.seo.gsc")
+        table._properties["lastModifiedTime"] = "1000"
+        bq._client.tables["my-project.seo.gsc"] = table
+        bq.set_read_cache(str(tmp_path))
+
+        assert bq.read("SELECT Clicks FROM seo.gsc")["Clicks"][0] == 1
+        # same query, reformatted, comes from the cache
+        assert bq.read("SELECT  Clicks\nFROM seo.gsc;")["Clicks"][0] == 1
+        assert len(reads) == 1
+        # the table changed
+        table._properties["lastModifiedTime"] = "2000"
+        assert bq.read("SELECT Clicks FROM seo.gsc")["Clicks"][0] == 2
+        # never cached
+        bq.read("SELECT CURRENT_DATE() FROM seo.gsc")
+        bq.read("SELECT CURRENT_DATE() FROM seo.gsc")
+        assert len(reads) == 4
+        assert bq._client.queries[0][1].dry_run
+
+    def test_estimate(self, bq):
+        bq.create_table("gsc")
+        bq._client.tables["my-project.seo.gsc"]._properties["numBytes"] = "4000"
+        bq._client.bytes_processed = 1024**4
+
+        estimate = bq.estimate("SELECT  *  FROM seo.gsc")
+        assert estimate["query"] == "SELECT * FROM seo.gsc"
+        assert estimate["estimated_cost"] == 6.25
+        assert estimate["referenced_tables"] == ["my-project.seo.gsc"]
+        assert estimate["partitioned_on"] == {"my-project.seo.gsc": "Date"}
+        assert bq.query_log[-1]["bytes_processed"] == 1024**4
+
+    def test_byte_budget(self, bq, monkeypatch):
+        monkeypatch.setattr(
+            gbq.pd,
+            "read_gbq",
+            lambda query, **kwargs: pd.DataFrame({"configuration": [kwargs]}),
+            raising=False,
+        )
+        bq._client.bytes_processed = 5000
+        bq.set_byte_budget(max_bytes=1000, max_bytes_billed=2000)
+        with pytest.raises(ValueError, match="5,000 bytes"):
+            bq.read("SELECT * FROM seo.gsc")
+        with pytest.raises(ValueError):
+            bq.delete_day(dt.date(2022, 1, 1))
+        assert bq.query_log[-1]["over_budget"]
+        # nothing but the dry runs was sent
+        assert all(config.dry_run for _, config in bq._client.queries)
+
+        bq.set_byte_budget(max_bytes=1000, max_bytes_billed=2000, action="warn")
+        with pytest.warns(UserWarning):
+            df = bq.read("SELECT * FROM seo.gsc")
+        assert df["configuration"][0]["configuration"] == {
+            "query": {"maximumBytesBilled": "2000"}
+        }
+        with pytest.warns(UserWarning):
+            bq.delete_day(dt.date(2022, 1, 1))
+        assert bq._client.queries[-1][1].maximum_bytes_billed == 2000
+
+        with pytest.raises(ValueError):
+            bq.set_byte_budget(action="ignore")
+
+
+class TestParquetCache:
+    def test_lru_eviction(self, tmp_path):
+        table = pa.table({"x": list(range(1000))})
+        cache = ParquetCache(str(tmp_path), max_bytes=10**9)
+        for key in "abc":
+            cache.set(key, table)
+        size = cache.size() // 3
+
+        cache = ParquetCache(str(tmp_path), max_bytes=size * 3)
+        past = time.time() - 100
+        for age, key in enumerate("abc"):
+            os.utime(tmp_path / f"{key}.parquet", (past + age, past + age))
+        assert cache.get("a").equals(table)
+        cache.set("d", table)
+        # b was read the longest time ago
+        assert cache.get("b") is None
+        assert all(cache.get(key) is not None for key in "acd")
+        cache.invalidate()
+        assert cache.size() == 0
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from googlewrapper.gsc import compact_frame, concat_pages
+
+
+def page(queries):
+    return pd.DataFrame(
+        {
+            "Clicks": [1] * len(queries),
+            "Impressions": [10] * len(queries),
+            "Ctr": [0.1] * len(queries),
+            "Position": [2.5] * len(queries),
+            "Query": queries,
+        }
+    )
+
+
+class TestCompactSchema:
+    def test_dtypes(self):
+        compact = compact_frame(page(["a", "b"]))
+        assert compact["Query"].dtype == "category"
+        assert compact["Clicks"].dtype == "int32"
+        assert compact["Position"].dtype == "float32"
+
+    def test_pages_share_categories(self):
+        combined = concat_pages(
+            [compact_frame(page(["a", "b"])), compact_frame(page(["c", "a"]))]
+        )
+        assert combined["Query"].dtype == "category"
+        assert sorted(combined["Query"].cat.categories) == ["a", "b", "c"]
+        assert combined["Query"].tolist() == ["a", "b", "c", "a"]
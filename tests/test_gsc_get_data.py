@@ -0,0 +1,200 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from googlewrapper.gsc import GoogleSearchConsole
+from googlewrapper.sketches import CountMinSketch
+
+SITE = "https://a.com/"
+
+
+class FakeRequest:
+    """mimics googleapiclient's HttpRequest, the body goes through postproc"""
+
+    def __init__(self, body):
+        self.body = body
+        self.postproc = lambda resp, content: json.loads(content)
+
+    def execute(self):
+        return self.postproc(None, json.dumps(self.body).encode())
+
+
+class FakeService:
+    """answers searchanalytics().query() with n_rows rows per site"""
+
+    def __init__(self, n_rows=3):
+        self.n_rows = n_rows
+        self.calls = []
+        self.threads = set()
+
+    def sites(self):
+        return self
+
+    def list(self):
+        return FakeRequest(
+            {"siteEntry": [{"siteUrl": SITE, "permissionLevel": "siteOwner"}]}
+        )
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        self.calls.append((siteUrl, body["startRow"], list(body["dimensions"])))
+        self.threads.add(threading.current_thread().name)
+        start = body["startRow"]
+        end = min(start + body["rowLimit"], self.n_rows)
+        rows = [
+            {
+                "keys": [self.key(dim, i) for dim in body["dimensions"]],
+                "clicks": 1,
+                "impressions": 10,
+                "ctr": 0.1,
+                "position": 2.0,
+            }
+            for i in range(start, end)
+        ]
+        return FakeRequest({"rows": rows} if rows else {})
+
+    @staticmethod
+    def key(dim, i):
+        if dim == "date":
+            return f"2022-01-0{i % 3 + 1}"
+        if dim == "query":
+            return f"brand {i % 5}" if i % 2 else f"query {i % 5}"
+        return f"/{dim}-{i}"
+
+
+@pytest.fixture
+def gsc(monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(
+        GoogleSearchConsole, "_GoogleSearchConsole__auth", lambda self: service
+    )
+    return GoogleSearchConsole(site_cache_ttl=0)
+
+
+class TestGetData:
+    def test_pages_in_order(self, gsc):
+        gsc.auth.n_rows = 50_001
+        df = gsc.get_data()
+        assert df["Page"].tolist() == [f"/page-{i}" for i in range(50_001)]
+        # a short page is the last one, no empty page is requested
+        assert [start for _, start, _ in gsc.auth.calls] == [0, 25_000, 50_000]
+        # pages are requested in the background
+        assert threading.current_thread().name not in gsc.auth.threads
+
+    def test_full_last_page(self, gsc):
+        gsc.auth.n_rows = 25_000
+        assert len(gsc.get_data()) == 25_000
+        assert [start for _, start, _ in gsc.auth.calls] == [0, 25_000]
+
+    def test_decode_workers(self, gsc):
+        pytest.importorskip("pyarrow")
+        gsc.auth.n_rows = 30_000
+        gsc.set_dimensions(["query", "date"])
+        gsc.set_branded({SITE: ["brand"]})
+        serial = gsc.get_data()
+
+        gsc.set_decode_workers(1)
+        pooled = gsc.get_data()
+        # the Date resolution can differ between pandas versions
+        pd.testing.assert_frame_equal(
+            serial.reset_index(drop=True).astype({"Date": "datetime64[ns]"}),
+            pooled.reset_index(drop=True).astype({"Date": "datetime64[ns]"}),
+        )
+        assert pooled["Branded"].sum() == 15_000
+
+    def test_row_filter_same_with_workers(self, gsc):
+        pytest.importorskip("pyarrow")
+        gsc.auth.n_rows = 12
+        gsc.set_dimensions(["query", "date"])
+        gsc.set_branded({SITE: ["brand"]})
+        filters = ["Date >= '2022-01-02'", lambda df: df["Branded"]]
+        inline = [gsc.get_data(row_filter=f) for f in filters]
+
+        gsc.set_decode_workers(1)
+        for row_filter, expected in zip(filters, inline):
+            pooled = gsc.get_data(row_filter=row_filter)
+            pd.testing.assert_frame_equal(
+                expected.reset_index(drop=True).astype({"Date": "datetime64[ns]"}),
+                pooled.reset_index(drop=True).astype({"Date": "datetime64[ns]"}),
+            )
+        assert len(inline[0]) == 8
+        assert inline[1]["Branded"].all() and len(inline[1]) == 6
+
+    def test_rollup_fallback_skips_sketches(self, gsc):
+        gsc.set_dimensions(["query", "date"])
+        clicks = CountMinSketch("Query")
+        gsc.set_sketches([clicks])
+        gsc.get_data()
+        assert clicks.total == 3
+
+        # dropping query can not be rolled up locally, it is pulled again
+        dates = gsc.rollup(["date"])
+        assert gsc.auth.calls[-1][2] == ["date"]
+        assert len(dates) == 3
+        assert clicks.total == 3
+        assert gsc._dims == ["query", "date"]
+
+    def test_rollup_after_projection(self, gsc):
+        gsc.set_dimensions(["page", "query", "date"])
+        gsc.get_data(columns=["Page", "Query", "Date", "Clicks"])
+        calls = len(gsc.auth.calls)
+
+        # Impressions and Position were not kept, ask the API
+        rolled = gsc.rollup(["page", "query"])
+        assert len(gsc.auth.calls) == calls + 1
+        assert "Impressions" in rolled.columns
+
+    def test_rollup_after_row_filter(self, gsc):
+        gsc.set_dimensions(["page", "query", "date"])
+        gsc.get_data(row_filter="Page != '/page-0'")
+        calls = len(gsc.auth.calls)
+
+        # the filtered rows would give wrong totals, ask the API
+        rolled = gsc.rollup(["page", "query"])
+        assert len(gsc.auth.calls) == calls + 1
+        assert rolled["Clicks"].sum() == 3
+        assert gsc._last_row_filter == "Page != '/page-0'"
+
+    def test_rollup_local(self, gsc):
+        gsc.set_dimensions(["page", "query", "date"])
+        gsc.get_data()
+        calls = len(gsc.auth.calls)
+        rolled = gsc.rollup(["page", "query"])
+        assert len(gsc.auth.calls) == calls
+        assert rolled["Clicks"].sum() == 3
+
+
+def test_site_cache_per_account(monkeypatch, tmp_path):
+    def auth_as(client_id, site):
+        def auth(self):
+            self._connection = SimpleNamespace(
+                credentials=SimpleNamespace(client_id=client_id),
+                token_path=tmp_path / client_id / "search_console.dat",
+            )
+            service = FakeService()
+            service.list = lambda: FakeRequest(
+                {"siteEntry": [{"siteUrl": site, "permissionLevel": "siteOwner"}]}
+            )
+            return service
+
+        monkeypatch.setattr(GoogleSearchConsole, "_GoogleSearchConsole__auth", auth)
+
+    cache_path = str(tmp_path / "gsc_sites.json")
+    auth_as("one", "https://one.com/")
+    assert GoogleSearchConsole(site_cache_path=cache_path).all_sites() == [
+        "https://one.com/"
+    ]
+    # another account sharing the cache file gets its own sites
+    auth_as("two", "https://two.com/")
+    assert GoogleSearchConsole(site_cache_path=cache_path).all_sites() == [
+        "https://two.com/"
+    ]
+    auth_as("one", "https://changed.com/")
+    assert GoogleSearchConsole(site_cache_path=cache_path).all_sites() == [
+        "https://one.com/"
+    ]
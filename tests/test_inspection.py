@@ -0,0 +1,103 @@
+import socket
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from googlewrapper.inspection import URLInspectionQueue
+
+
+class FakeRequest:
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, http=None):
+        url = self.body["inspectionUrl"]
+        self.service.calls.append((self.body["siteUrl"], url))
+        status = self.service.errors.get(url)
+        if isinstance(status, Exception):
+            raise status
+        if status is not None:
+            raise HttpError(httplib2.Response({"status": status}), b"error")
+        return {
+            "inspectionResult": {
+                "indexStatusResult": {"verdict": "PASS", "coverageState": "Indexed"}
+            }
+        }
+
+
+class FakeService:
+    def __init__(self, errors=None):
+        self.calls = []
+        self.errors = errors or {}
+
+    def urlInspection(self):
+        return self
+
+    def index(self):
+        return self
+
+    def inspect(self, body):
+        return FakeRequest(self, body)
+
+
+class TestURLInspectionQueue:
+    def test_run_and_results(self, tmp_path):
+        queue = URLInspectionQueue(FakeService(), str(tmp_path / "q.db"))
+        assert queue.add("sc-domain:a.com", ["https://a.com/1", "https://a.com/2"]) == 2
+        assert queue.add("sc-domain:a.com", ["https://a.com/1"]) == 0
+        assert queue.run() == 2
+        assert queue.pending() == 0
+        results = queue.results()
+        assert list(results["verdict"]) == ["PASS", "PASS"]
+        assert queue.remaining_quota("sc-domain:a.com") == 1998
+        # inspected within recheck_days, so not queued again
+        assert queue.add("sc-domain:a.com", ["https://a.com/1"]) == 0
+
+    def test_daily_quota_and_interleave(self, tmp_path):
+        service = FakeService()
+        queue = URLInspectionQueue(service, str(tmp_path / "q.db"), daily_quota=2)
+        queue.add("a", [f"https://a.com/{i}" for i in range(3)])
+        queue.add("b", [f"https://b.com/{i}" for i in range(3)])
+        assert queue.run() == 4
+        assert [site for site, _ in service.calls] == ["a", "b", "a", "b"]
+        assert queue.pending("a") == 1
+        assert queue.run() == 0
+
+    def test_errors(self, tmp_path):
+        service = FakeService({"https://a.com/404": "404", "https://a.com/500": "500"})
+        queue = URLInspectionQueue(service, str(tmp_path / "q.db"))
+        queue.add("a", ["https://a.com/ok", "https://a.com/404", "https://a.com/500"])
+        assert queue.run() == 1
+        # server errors stay queued, bad requests are recorded
+        assert queue.pending() == 1
+        results = queue.results().set_index("url")
+        assert results.loc["https://a.com/404", "error"] is not None
+
+    def test_rate_limited_site_stops(self, tmp_path):
+        service = FakeService({"https://a.com/0": "429"})
+        queue = URLInspectionQueue(service, str(tmp_path / "q.db"))
+        queue.add("a", ["https://a.com/0"])
+        queue.add("b", ["https://b.com/0"])
+        assert queue.run() == 1
+        assert queue.pending("a") == 1
+        assert queue.pending("b") == 0
+
+    def test_other_error_stays_queued(self, tmp_path):
+        service = FakeService({"https://a.com/1": socket.timeout("timed out")})
+        queue = URLInspectionQueue(service, str(tmp_path / "q.db"))
+        queue.add("a", [f"https://a.com/{i}" for i in range(4)])
+        with pytest.raises(socket.timeout):
+            queue.run()
+        # the url that failed is kept with its error, the inspections that
+        # were already sent are saved
+        queued = queue.queued("a").set_index("url")
+        assert "timed out" in queued.loc["https://a.com/1", "last_error"]
+        inspected = len(queue.results())
+        assert inspected == len(service.calls) - 1
+        assert queue.pending() == 4 - inspected
+        # the next run picks the url up again
+        service.errors = {}
+        assert queue.run() == 4 - inspected
+        assert queue.queued().empty
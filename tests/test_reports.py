@@ -0,0 +1,18 @@
+from googlewrapper.ga import GoogleAnalytics
+from googlewrapper.reports import WeeklyReport
+
+from .test_ga import FakeService
+
+
+def test_each_view_gets_its_own_ga(monkeypatch):
+    service = FakeService()
+    monkeypatch.setattr(GoogleAnalytics, "_GoogleAnalytics__auth", lambda self: service)
+    report = WeeklyReport(output=False)
+    first = report._ga_for("1")
+    second = report._ga_for("2")
+    # google_objects keeps each site's settings and results
+    assert (first.view_id, second.view_id) == ("1", "2")
+    first.build_request()
+    assert second.raw_data == {}
+    # on one connection
+    assert first.auth is second.auth
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from googlewrapper.retention import ResultStore
+
+pytest.importorskip("pyarrow")
+
+
+def frame(rows):
+    return pd.DataFrame(
+        {"Clicks": range(rows), "Page": [f"/page-{i}" for i in range(rows)]}
+    )
+
+
+class TestResultStore:
+    def test_spills_oldest(self, tmp_path):
+        store = ResultStore(max_bytes=50_000, spill_dir=str(tmp_path))
+        store["a"] = frame(1000)
+        store["b"] = frame(1000)
+        assert store.spilled() == ["a"]
+        assert list(store) == ["a", "b"]
+        assert store["a"].equals(frame(1000))
+        assert store.memory_bytes <= 50_000
+
+    def test_delete_removes_file(self, tmp_path):
+        store = ResultStore(max_bytes=1, spill_dir=str(tmp_path))
+        store["a"] = frame(10)
+        assert list(tmp_path.rglob("*.arrow"))
+        del store["a"]
+        assert not list(tmp_path.rglob("*.arrow"))
+        assert len(store) == 0
+
+    def test_creates_spill_dir(self, tmp_path):
+        spill_dir = tmp_path / "not" / "there"
+        store = ResultStore(max_bytes=1, spill_dir=str(spill_dir))
+        store["a"] = frame(10)
+        assert list(spill_dir.rglob("*.arrow"))
+
+    def test_memory_bytes_running_total(self, tmp_path):
+        store = ResultStore(max_bytes=10**9, spill_dir=str(tmp_path))
+        store["a"] = frame(100)
+        store["b"] = frame(200)
+        assert store.memory_bytes == sum(
+            int(frame(n).memory_usage(deep=True).sum()) for n in [100, 200]
+        )
+        store["a"] = frame(200)
+        del store["b"]
+        assert store.memory_bytes == int(frame(200).memory_usage(deep=True).sum())
+
+    def test_no_budget(self):
+        store = ResultStore()
+        store["a"] = frame(1000)
+        assert store.spilled() == []
+        assert dict(store)["a"].shape == (1000, 2)
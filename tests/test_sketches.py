@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from googlewrapper.sketches import (
+    CountMinSketch,
+    HeavyHitters,
+    HyperLogLog,
+    sketch_from_dict,
+)
+
+
+def pages():
+    rng = np.random.default_rng(1)
+    queries = [f"query {i}" for i in rng.zipf(1.5, 100_000) % 20_000]
+    data = pd.DataFrame({"Query": queries, "Clicks": rng.integers(0, 5, len(queries))})
+    return [page for _, page in data.groupby(np.arange(len(data)) // 25_000)], data
+
+
+class TestSketches:
+    def test_hyperloglog(self):
+        page_list, data = pages()
+        first, second = HyperLogLog(), HyperLogLog()
+        for page in page_list[:2]:
+            first.update(page)
+        for page in page_list[2:]:
+            second.update(page)
+        merged = first.merge(second)
+        assert (
+            abs(merged.count() - data["Query"].nunique()) / data["Query"].nunique()
+            < 0.05
+        )
+        restored = sketch_from_dict(json.loads(json.dumps(merged.to_dict())))
+        assert restored.count() == merged.count()
+
+    def test_count_min(self):
+        page_list, data = pages()
+        sketch = CountMinSketch()
+        for page in page_list:
+            sketch.update(page)
+        true = data.groupby("Query")["Clicks"].sum()
+        top = true.idxmax()
+        assert true[top] <= sketch.estimate(top) <= true[top] + 0.01 * sketch.total
+        assert sketch.total == data["Clicks"].sum()
+
+    def test_heavy_hitters(self):
+        page_list, data = pages()
+        sketch = HeavyHitters(capacity=100)
+        for page in page_list:
+            sketch.update(page)
+        true = data.groupby("Query")["Clicks"].sum().nlargest(5)
+        top = sketch.top(5)
+        assert list(top.index) == list(true.index)
+        assert (top["Clicks"] <= true).all()
+        assert (top["upper_bound"] >= true).all()
+        restored = sketch_from_dict(json.loads(json.dumps(sketch.to_dict())))
+        assert restored.top(5).equals(top)